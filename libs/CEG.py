@@ -28,6 +28,7 @@ Zone E: Erroneous treatment
 
 SYNTAX:
         fig, ax, zone, zone_index = clarke_error_grid(ref_values, pred_values, title_string)
+        zone, zone_codes = clarke_zones(ref_values, pred_values)     (classification only, no plotting)
 
 INPUT:
         ref_values          List of n reference values.
@@ -41,6 +42,7 @@ OUTPUT:
                             [count_A, count_B, count_C, count_D, count_E]
         zone_index          List of lists containing indices of points in each zone.
                             [indices_A, indices_B, indices_C, indices_D, indices_E]
+        zone_codes          uint8 array with the zone of every point (0=A, 1=B, 2=C, 3=D, 4=E).
 
 EXAMPLE:
         import matplotlib.pyplot as plt # Import pyplot for showing the plot
@@ -78,16 +80,104 @@ References:
 Modified to use Figure and Axes objects.
 '''
 
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 
-def clarke_error_grid(ref_values, pred_values, ax):
+ZONE_LABELS = ['A', 'B', 'C', 'D', 'E']
+
+def clarke_zones(ref_values, pred_values):
+    """
+    Classifies reference/prediction pairs into Clarke Error Grid zones without plotting.
+
+    Args:
+        ref_values (list or array-like): Reference glucose values.
+        pred_values (list or array-like): Predicted glucose values.
+
+    Returns:
+        tuple: (zone, zone_codes)
+            zone (numpy.ndarray): Count of points in each zone [A, B, C, D, E].
+            zone_codes (numpy.ndarray): uint8 zone of every point (0=A, 1=B, 2=C, 3=D, 4=E).
+    """
+    r = np.asarray(ref_values, dtype=float)
+    p = np.asarray(pred_values, dtype=float)
+
+    assert (len(r) == len(p)), \
+        "Unequal number of values (reference : {}) (prediction : {})".format(len(r), len(p))
+
+    # Zone A: within 20% of the reference, or both values in the hypoglycemic range
+    zone_a = ((r <= 70) & (p <= 70)) | ((p <= 1.2 * r) & (p >= 0.8 * r))
+    # Zone E: one value hyperglycemic and the other hypoglycemic
+    zone_e = ((r >= 180) & (p <= 70)) | ((r <= 70) & (p >= 180))
+    # Zone C: overcorrection
+    zone_c = (((r >= 70) & (r <= 290)) & (p >= r + 110)) | \
+             (((r >= 130) & (r <= 180)) & (p <= (7/5) * r - 182))
+    # Zone D: failure to detect
+    zone_d = ((r >= 240) & (p >= 70) & (p <= 180)) | \
+             ((r <= 175/3) & (p <= 180) & (p >= 70)) | \
+             (((r > 175/3) & (r < 70)) & (p >= (6/5) * r))
+
+    # Everything else is zone B; masks are applied in reverse order of precedence (A, E, C, D)
+    zone_codes = np.ones(len(r), dtype=np.uint8)
+    zone_codes[zone_d] = 3
+    zone_codes[zone_c] = 2
+    zone_codes[zone_e] = 4
+    zone_codes[zone_a] = 0
+
+    zone = np.bincount(zone_codes, minlength=5)
+
+    return zone, zone_codes
+
+
+def plot_glucose_pairs(ax, ref_values, pred_values, mode='auto', max_points=20000, bins=200, limit=400):
+    """
+    Draws reference/prediction pairs either as a scatter or, for large point counts,
+    as a 2D histogram so memory and draw time depend on the bin count only.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes to draw on.
+        ref_values (array-like): Reference glucose values (x-axis).
+        pred_values (array-like): Predicted glucose values (y-axis).
+        mode (str): 'scatter', 'density' or 'auto' (density above max_points).
+        max_points (int): Point count above which 'auto' switches to density.
+        bins (int): Number of histogram bins along each axis.
+        limit (float): Upper limit of both axes (mg/dl). In density mode values beyond it
+            are counted in the edge bins rather than dropped.
+
+    Returns:
+        str: The mode that was used.
+    """
+    if mode == 'auto':
+        mode = 'density' if len(ref_values) > max_points else 'scatter'
+
+    if mode == 'scatter':
+        ax.scatter(ref_values, pred_values, marker='o', color='red', s=8, label="Data Points")
+    elif mode == 'density':
+        ref_values = np.clip(np.asarray(ref_values, dtype=float), 0, limit)
+        pred_values = np.clip(np.asarray(pred_values, dtype=float), 0, limit)
+        counts, _, _ = np.histogram2d(ref_values, pred_values, bins=bins, range=[[0, limit], [0, limit]])
+        counts = np.ma.masked_equal(counts.T, 0)
+        image = ax.imshow(counts, origin='lower', extent=[0, limit, 0, limit], cmap='Reds',
+                          norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)), interpolation='nearest', aspect='auto')
+        ax.figure.colorbar(image, ax=ax, fraction=0.046, pad=0.04, label='Readings per bin')
+    else:
+        raise ValueError("Invalid mode. Use 'scatter', 'density' or 'auto'.")
+
+    return mode
+
+
+def clarke_error_grid(ref_values, pred_values, ax, zone_codes=None, mode='auto', max_points=20000, bins=200):
     """
     Generates a Clarke Error Grid plot using Matplotlib's Figure and Axes objects.
 
     Args:
         ref_values (list or array-like): Reference glucose values.
         pred_values (list or array-like): Predicted glucose values.
-        title_string (str): Title for the plot.
+        ax (matplotlib.axes.Axes): Axes to draw on.
+        zone_codes (numpy.ndarray, optional): Zones from clarke_zones, computed if not given.
+        mode (str): 'scatter', 'density' or 'auto' (density above max_points points).
+        max_points (int): Point count above which 'auto' draws a 2D histogram.
+        bins (int): Number of histogram bins along each axis in density mode.
 
     Returns:
         tuple: (fig, ax, zone, zone_index)
@@ -97,21 +187,25 @@ def clarke_error_grid(ref_values, pred_values, ax):
             zone_index (list of lists): Indices of points in each zone.
     """
 
-    # Checking to see if the lengths of the reference and prediction arrays are the same
-    assert (len(ref_values) == len(pred_values)), \
-        "Unequal number of values (reference : {}) (prediction : {})".format(len(ref_values), len(pred_values))
+    if zone_codes is None:
+        zone, zone_codes = clarke_zones(ref_values, pred_values)
+    else:
+        zone = np.bincount(zone_codes, minlength=5)
+
+    ref_values = np.asarray(ref_values, dtype=float)
+    pred_values = np.asarray(pred_values, dtype=float)
 
     # Checks to see if the values are within the normal physiological range, otherwise it gives a warning
-    if max(ref_values) > 400 or max(pred_values) > 400:
+    if len(ref_values) and (ref_values.max() > 400 or pred_values.max() > 400):
         print("Input Warning: the maximum reference value {} or the maximum prediction value {} exceeds the normal "
-              "physiological range of glucose (<400 mg/dl)".format(max(ref_values), max(pred_values)))
-    if min(ref_values) < 0 or min(pred_values) < 0:
+              "physiological range of glucose (<400 mg/dl)".format(ref_values.max(), pred_values.max()))
+    if len(ref_values) and (ref_values.min() < 0 or pred_values.min() < 0):
         print("Input Warning: the minimum reference value {} or the minimum prediction value {} is less than 0 mg/dl"
-              .format(min(ref_values),  min(pred_values)))
+              .format(ref_values.min(), pred_values.min()))
 
 
-    # Scatter plot of the data
-    ax.scatter(ref_values, pred_values, marker='o', color='red', s=8, label="Data Points")
+    # Scatter plot of the data, or its density for large point counts
+    plot_glucose_pairs(ax, ref_values, pred_values, mode, max_points, bins)
 
     # Set up plot labels and title
     # ax.set_title(title_string + " Clarke Error Grid")
@@ -179,58 +273,7 @@ def clarke_error_grid(ref_values, pred_values, ax):
     ax.text(30, 370, "E", fontsize=15)  # Upper E
     ax.text(370, 15, "E", fontsize=15)  # Lower E
 
-    # Initialize zone counters and lists for indices
-    zone = [0] * 5  # A, B, C, D, E
-    
-    # Lists to store indices of points falling into each zone
-    indicesSZ_A, indicesSZ_B = [], [] 
-    indicesHZ_C, indicesHZ_D, indicesHZ_E = [], [], []
-
-    # Iterate through each data point to determine its zone
-    for i in range(len(ref_values)):
-        r, p = ref_values[i], pred_values[i] # Current reference and prediction values
-
-        # Zone A: Clinically accurate
-        # Points are in Zone A if they are within 20% of the reference value,
-        # or if both reference and prediction are <= 70 mg/dL (hypoglycemic range).
-        if (r <= 70 and p <= 70) or (p <= 1.2 * r and p >= 0.8 * r):
-            zone[0] += 1
-            indicesSZ_A.append(i)
-        
-        # Zone E: Erroneous treatment
-        # Points are in Zone E if one value is in the hyperglycemic range (>= 180)
-        # and the other is in the hypoglycemic range (<= 70), indicating a dangerous misclassification.
-        elif (r >= 180 and p <= 70) or (r <= 70 and p >= 180):
-            zone[4] += 1
-            indicesHZ_E.append(i)
-
-        # Zone C: Overcorrection
-        # These conditions define regions where the prediction would lead to overcorrection.
-        # (r >= 70 and r <= 290 and p >= r + 110): Prediction is significantly higher than reference.
-        # (r >= 130 and r <= 180 and p <= (7/5)*r - 182): Prediction is significantly lower in a specific range.
-        elif ((r >= 70 and r <= 290) and p >= r + 110) or \
-             ((r >= 130 and r <= 180) and (p <= (7/5)*r - 182)): # This is equivalent to p <= 1.4*r - 182
-            zone[2] += 1
-            indicesHZ_C.append(i)
-            
-        # Zone D: Failure to detect
-        # These conditions define regions where clinically significant deviations are missed.
-        # (r >= 240 and (p >= 70 and p <= 180)): High reference, but prediction is in acceptable/low range.
-        # (r <= 175/3 and p >= 70 and p <= 180): Low reference, prediction in acceptable range. (175/3 is approx 58.33)
-        # ((r > 175/3 and r < 70) and p >= (6/5)*r): Reference is low-ish, prediction is higher but still potentially missing hypoglycemia.
-        elif (r >= 240 and (p >= 70 and p <= 180)) or \
-             (r <= 175/3 and p <= 180 and p >= 70) or \
-             ((r > 175/3 and r < 70) and p >= (6/5)*r): # This is p >= 1.2*r
-            zone[3] += 1
-            indicesHZ_D.append(i)
-            
-        # Zone B: Clinically acceptable (all other points)
-        # If a point doesn't fall into A, C, D, or E, it's classified as Zone B.
-        else:
-            zone[1] += 1
-            indicesSZ_B.append(i)
-
-    zone_indices = [indicesSZ_A, indicesSZ_B, indicesHZ_C, indicesHZ_D, indicesHZ_E]
+    zone_indices = [np.flatnonzero(zone_codes == k) for k in range(5)]
 
     return ax, zone, zone_indices
 
@@ -0,0 +1,170 @@
+'''
+PARKES (CONSENSUS) ERROR GRID ANALYSIS      PEG.py
+
+The Parkes Error Grid, like the Clarke Error Grid, shows the clinical significance of the differences
+between a blood glucose measurement and a reference measurement. Its zones were defined by consensus
+of 100 clinicians and, unlike the Clarke grid, are bounded by continuous polylines. This module
+implements the grid for type 1 diabetes.
+
+Zone A: No effect on clinical action
+Zone B: Altered clinical action, little or no effect on clinical outcome
+Zone C: Altered clinical action, likely to affect clinical outcome
+Zone D: Altered clinical action, could have significant medical risk
+Zone E: Altered clinical action, could have dangerous consequences
+
+SYNTAX:
+        zone, zone_codes = parkes_zones(ref_values, pred_values)     (classification only, no plotting)
+        ax, zone, zone_index = parkes_error_grid(ref_values, pred_values, ax)
+
+OUTPUT:
+        zone                Counts of values in each zone [count_A, count_B, count_C, count_D, count_E].
+        zone_codes          uint8 array with the zone of every point (0=A, 1=B, 2=C, 3=D, 4=E).
+        zone_index          Indices of points in each zone [indices_A, ..., indices_E].
+
+References:
+[1]     Parkes, JL. et al. (2000). "A new consensus error grid to evaluate the clinical significance
+        of inaccuracies in the measurement of blood glucose." Diabetes Care 23(8), pp. 1143-1148.
+[2]     Pfutzner, A. et al. (2013). "Technical aspects of the Parkes error grid."
+        Journal of Diabetes Science and Technology 7(5), pp. 1275-1281.
+'''
+
+import numpy as np
+
+from libs.CEG import plot_glucose_pairs
+
+LIMIT = 550
+
+# Upper (above the diagonal) and lower (below the diagonal) boundaries of zones A-D, type 1 diabetes [2]
+BOUNDARIES = {
+    'A': ([(0, 50), (30, 50), (140, 170), (280, 380), (430, 550)],
+          [(50, 0), (50, 30), (170, 145), (385, 300), (550, 450)]),
+    'B': ([(0, 60), (30, 60), (50, 80), (70, 110), (260, 550)],
+          [(120, 0), (120, 30), (260, 130), (550, 250)]),
+    'C': ([(0, 100), (25, 100), (50, 125), (80, 215), (125, 550)],
+          [(250, 0), (250, 40), (550, 150)]),
+    'D': ([(0, 150), (35, 155), (50, 550)],
+          []),
+}
+
+
+def _zone_polygon(upper, lower):
+    """Closes the region between an upper and a lower boundary through the corners of the grid."""
+    lower = lower if lower else [(LIMIT, 0)]
+    return np.array(upper + [(LIMIT, LIMIT)] + lower[::-1] + [(0, 0)], dtype=float)
+
+
+def points_in_polygon(x, y, polygon, chunk_size=1_000_000):
+    """
+    Even-odd ray casting test of many points against one polygon, vectorised over
+    points and edges and processed in chunks to bound memory.
+
+    Args:
+        x, y (numpy.ndarray): Point coordinates.
+        polygon (numpy.ndarray): (n_vertices, 2) array of polygon vertices.
+
+    Returns:
+        numpy.ndarray: Boolean mask of the points inside the polygon.
+    """
+    xi, yi = polygon[:, 0], polygon[:, 1]
+    xj, yj = np.roll(xi, -1), np.roll(yi, -1)
+    sloped = yj != yi
+    slope = np.divide(xj - xi, yj - yi, out=np.zeros_like(xi), where=sloped)
+
+    inside = np.zeros(len(x), dtype=bool)
+    for start in range(0, len(x), chunk_size):
+        px = x[start:start + chunk_size, None]
+        py = y[start:start + chunk_size, None]
+        crosses = ((yi > py) != (yj > py)) & (px < slope * (py - yi) + xi)
+        inside[start:start + chunk_size] = np.count_nonzero(crosses, axis=1) % 2 == 1
+
+    return inside
+
+
+def parkes_zones(ref_values, pred_values):
+    """
+    Classifies reference/prediction pairs into Parkes Error Grid (type 1) zones without plotting.
+
+    Args:
+        ref_values (list or array-like): Reference glucose values.
+        pred_values (list or array-like): Predicted glucose values.
+
+    Returns:
+        tuple: (zone, zone_codes)
+            zone (numpy.ndarray): Count of points in each zone [A, B, C, D, E].
+            zone_codes (numpy.ndarray): uint8 zone of every point (0=A, 1=B, 2=C, 3=D, 4=E).
+    """
+    r = np.asarray(ref_values, dtype=float)
+    p = np.asarray(pred_values, dtype=float)
+
+    assert (len(r) == len(p)), \
+        "Unequal number of values (reference : {}) (prediction : {})".format(len(r), len(p))
+
+    # Values beyond the grid are classified on its edge
+    r = np.clip(r, 0, LIMIT - 1e-6)
+    p = np.clip(p, 0, LIMIT - 1e-6)
+
+    # Zones are nested, so test from the innermost region outwards and only pass on the
+    # points not yet placed (most readings settle in A); outside D is zone E
+    zone_codes = np.full(len(r), 4, dtype=np.uint8)
+    undecided = np.arange(len(r))
+    for code, label in enumerate(['A', 'B', 'C', 'D']):
+        inside = points_in_polygon(r[undecided], p[undecided], _zone_polygon(*BOUNDARIES[label]))
+        zone_codes[undecided[inside]] = code
+        undecided = undecided[~inside]
+
+    zone = np.bincount(zone_codes, minlength=5)
+
+    return zone, zone_codes
+
+
+def parkes_error_grid(ref_values, pred_values, ax, zone_codes=None, mode='auto', max_points=20000, bins=200):
+    """
+    Generates a Parkes Error Grid (type 1) plot on the given Axes.
+
+    Args:
+        ref_values (list or array-like): Reference glucose values.
+        pred_values (list or array-like): Predicted glucose values.
+        ax (matplotlib.axes.Axes): Axes to draw on.
+        zone_codes (numpy.ndarray, optional): Zones from parkes_zones, computed if not given.
+        mode (str): 'scatter', 'density' or 'auto' (density above max_points points).
+        max_points (int): Point count above which 'auto' draws a 2D histogram.
+        bins (int): Number of histogram bins along each axis in density mode.
+
+    Returns:
+        tuple: (ax, zone, zone_index)
+            ax (matplotlib.axes.Axes): The axes object.
+            zone (numpy.ndarray): Count of points in each zone [A, B, C, D, E].
+            zone_index (list of arrays): Indices of points in each zone.
+    """
+    if zone_codes is None:
+        zone, zone_codes = parkes_zones(ref_values, pred_values)
+    else:
+        zone = np.bincount(zone_codes, minlength=5)
+
+    plot_glucose_pairs(ax, np.asarray(ref_values, dtype=float), np.asarray(pred_values, dtype=float),
+                       mode, max_points, bins, limit=LIMIT)
+
+    ax.set_xlabel("Reference Glucose Concentration (mg/dl)")
+    ax.set_ylabel("Predicted Glucose Concentration (mg/dl)")
+    ticks = list(range(0, LIMIT + 1, 100))
+    ax.set_xticks(ticks)
+    ax.set_yticks(ticks)
+    ax.set_facecolor('white')
+    ax.set_xlim([0, LIMIT])
+    ax.set_ylim([0, LIMIT])
+    ax.set_aspect('equal', adjustable='box')
+
+    ax.plot([0, LIMIT], [0, LIMIT], ':', c='black')
+    for upper, lower in BOUNDARIES.values():
+        for line in (upper, lower):
+            if line:
+                ax.plot(*zip(*line), '-', c='black')
+
+    # Zone labels
+    for label, (x, y) in zip("ABBCCDDE", [(320, 320), (220, 370), (330, 200), (95, 270), (400, 130),
+                                           (44, 300), (470, 50), (10, 480)]):
+        ax.text(x, y, label, fontsize=15)
+
+    zone_indices = [np.flatnonzero(zone_codes == k) for k in range(5)]
+
+    return ax, zone, zone_indices
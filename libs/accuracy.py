@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from libs.CEG import clarke_zones, ZONE_LABELS
+
+
+def pair_measurements(df, window=5, reference='BGM', measure='CGM'):
+    """
+    Matches every reference reading (finger-stick) to the nearest sensor reading of the
+    same patient within `window` minutes using a sorted as-of join, instead of requiring
+    both values to land on the same row.
+    :param df: DataFrame with 'pID', 'Time', reference and measure columns
+    :param window: Maximum time difference in minutes between paired readings
+    :param reference: Column with the reference readings
+    :param measure: Column with the readings to evaluate
+    :return: DataFrame with pID, Time, reference, measure and 'Offset' (measure time - reference time, minutes)
+    """
+    data = df[['pID', 'Time', reference, measure]]
+    data = data.assign(Time=pd.to_datetime(data['Time']))
+
+    ref = data.loc[data[reference].notna(), ['pID', 'Time', reference]].sort_values('Time')
+    sensor = data.loc[data[measure].notna(), ['pID', 'Time', measure]].sort_values('Time')
+    sensor = sensor.assign(_sensor_time=sensor['Time'])
+
+    pairs = pd.merge_asof(ref, sensor, on='Time', by='pID', direction='nearest',
+                          tolerance=pd.Timedelta(minutes=window))
+    pairs = pairs.dropna(subset=[measure])
+    pairs['Offset'] = (pairs.pop('_sensor_time') - pairs['Time']).dt.total_seconds() / 60
+
+    return pairs.sort_values(['pID', 'Time']).reset_index(drop=True)
+
+
+def get_accuracy_measures(pairs, by='pID', reference='BGM', measure='CGM', zone_codes=None):
+    """
+    Accuracy of the sensor against the reference for every group in one grouped reduction.
+    :param pairs: DataFrame returned by pair_measurements (optionally with extra category columns)
+    :param by: Column (or list of columns) to group by, e.g. 'pID' or a profile category
+    :param zone_codes: Optional zone codes of the pairs; default is their 'zone' column (see get_classified_pairs)
+                       or, without one, their Clarke zones
+    :return: DataFrame indexed by group with n, MAD, MARD (%), bias and the % of pairs in each zone.
+             Pairs with a non-positive reference are left out of MARD
+    """
+    ref = pairs[reference].values.astype(float)
+    diff = pairs[measure].values.astype(float) - ref
+    if zone_codes is None:
+        zone_codes = pairs['zone'].values if 'zone' in pairs else clarke_zones(ref, pairs[measure].values)[1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ard = np.where(ref > 0, 100 * np.abs(diff) / ref, np.nan)
+    frame = pd.DataFrame({'AD': np.abs(diff), 'ARD': ard, 'bias': diff})
+    for k, label in enumerate(ZONE_LABELS):
+        frame['Zone ' + label] = 100 * (zone_codes == k)
+    keys = [pairs[b].values for b in ([by] if isinstance(by, str) else by)]
+
+    grouped = frame.groupby(keys)
+    table = grouped.mean().rename(columns={'AD': 'MAD', 'ARD': 'MARD'})
+    table.insert(0, 'n', grouped.size())
+    table.index.names = [by] if isinstance(by, str) else by
+
+    return table
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Keeps the first and last points and, from each of n_out - 2 equal buckets, the point
+    forming the largest triangle with the point kept from the previous bucket and the
+    mean of the next bucket. Loops over buckets only; each bucket is vectorised.
+    :param x: Sorted x values (finite)
+    :param y: y values (finite)
+    :param n_out: Number of points to keep
+    :return: Indices of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for k in range(n_out - 2):
+        start, end = edges[k], edges[k + 1]
+        next_end = edges[k + 2] if k + 2 < len(edges) else n
+        cx, cy = x[end:next_end].mean(), y[end:next_end].mean()
+
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = start + np.argmax(area)
+        kept[k + 1] = a
+
+    return kept
+
+
+def minmax_downsample(x, y, n_buckets):
+    """
+    Keeps the minimum and maximum of each of n_buckets equal buckets, so every peak
+    (e.g. a bolus) survives at pixel resolution. Fully vectorised.
+    :param x: Sorted x values
+    :param y: y values (finite)
+    :param n_buckets: Number of buckets (about the width of the plot in pixels)
+    :return: Sorted indices of the kept points
+    """
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    starts = np.linspace(0, n, n_buckets, endpoint=False).astype(np.int64)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.r_[starts, n]))
+    order = np.lexsort((y, bucket))
+    counts = np.bincount(bucket, minlength=n_buckets)
+    first = np.cumsum(counts) - counts
+
+    return np.unique(np.r_[order[first], order[first + counts - 1]])
+
+
+def downsample_series(x, y, n_out, max_gap=None, method='lttb', segments=None):
+    """
+    Downsamples a gappy time series for plotting. NaN readings and jumps in x larger than
+    `max_gap` split the series into segments; the first and last point of every segment
+    are always kept and a NaN is inserted between segments so the line still breaks there.
+    :param x: Sorted x values (e.g. minutes)
+    :param y: y values, NaN for missing readings
+    :param n_out: Approximate number of points to keep
+    :param max_gap: Largest x step treated as continuous (None: only NaN readings split segments)
+    :param method: 'lttb' or 'minmax'
+    :param segments: Optional (first, last) arrays with the first and last index (inclusive) of known valid
+                     segments, e.g. from src.dataset.segments; they are used instead of scanning y and x for gaps
+    :return: Indices into x/y of the kept points and a boolean mask marking where a NaN break follows
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if segments is not None:
+        first, last = (np.asarray(v, dtype=np.int64) for v in segments)
+        counts = last - first + 1
+        segment = np.repeat(np.arange(len(counts)), counts)
+        valid = first[segment] + np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+        breaks = np.r_[False, segment[1:] != segment[:-1]]
+    else:
+        valid = np.flatnonzero(np.isfinite(y))
+        # Segment id of every valid point: it changes after a NaN reading or a time jump
+        breaks = np.r_[False, np.diff(valid) > 1]
+        if max_gap is not None:
+            breaks |= np.r_[False, np.diff(x[valid]) > max_gap]
+        segment = np.cumsum(breaks)
+    if len(valid) == 0:
+        return valid, np.zeros(0, dtype=bool)
+
+    if method == 'lttb':
+        chosen = lttb(x[valid], y[valid], n_out)
+    elif method == 'minmax':
+        chosen = minmax_downsample(x[valid], y[valid], max(n_out // 2, 1))
+    else:
+        raise ValueError("Invalid method. Use 'lttb' or 'minmax'.")
+
+    first = np.flatnonzero(np.r_[True, breaks[1:]])
+    last = np.r_[first[1:] - 1, len(valid) - 1]
+    chosen = np.unique(np.r_[chosen, first, last])
+
+    gap_after = np.r_[segment[chosen][1:] != segment[chosen][:-1], False]
+    return valid[chosen], gap_after
+
+
+def with_breaks(x, y, gap_after):
+    """
+    Inserts a NaN after every point flagged in gap_after so plotted lines break there.
+    :return: The x and y arrays with the breaks inserted
+    """
+    positions = np.flatnonzero(gap_after) + 1
+    x = np.insert(np.asarray(x), positions, np.asarray(x)[positions - 1])
+    y = np.insert(np.asarray(y, dtype=float), positions, np.nan)
+    return x, y
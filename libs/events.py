@@ -0,0 +1,109 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from libs.glycaemic import to_minutes, _runs
+
+# Per-row 0/1 event columns of OhioT1DM and the colour of their spans in the plots
+EVENT_COLUMNS = {'sleep': 'slateblue', 'exercise': 'orange', 'hypo_event': 'crimson'}
+
+
+def get_event_intervals(times, flags, res=5):
+    """
+    Run-length encodes a per-row event flag into intervals. A run ends at the first unflagged
+    row or at a time gap larger than 1.5 * res.
+    :param times: Timestamps of the rows in time order
+    :param flags: Event values aligned with times; values > 0 mark the event
+    :param res: Sampling interval in minutes
+    :return: Start and end (datetime64) of every interval; the end is one interval after the last flagged row
+    """
+    times = np.asarray(times)
+    if not np.issubdtype(times.dtype, np.datetime64):
+        times = pd.to_datetime(times).values
+    flags = np.nan_to_num(np.asarray(flags, dtype=float)) > 0
+    starts, ends = _runs(flags, to_minutes(times), res)
+    return times[starts], times[ends] + np.timedelta64(res, 'm')
+
+
+def build_event_table(df, columns=None, res=5):
+    """
+    Function to turn the per-row event columns of every patient into an interval table
+    :param df: DataFrame with 'pID', 'Time' and event columns, each patient's rows in time order
+    :param columns: Event columns (default: those of EVENT_COLUMNS present in df)
+    :return: DataFrame with pID, event, start and end (datetime64) columns, sorted by patient, event and start
+    """
+    columns = [c for c in EVENT_COLUMNS if c in df.columns] if columns is None else columns
+    frames = []
+    for pID, df_ind in df.groupby('pID', sort=False, observed=True):
+        times = df_ind['Time'].values
+        for event in columns:
+            start, end = get_event_intervals(times, df_ind[event].values, res)
+            frames.append(pd.DataFrame({'pID': pID, 'event': event, 'start': start, 'end': end}))
+    if not frames:
+        return pd.DataFrame({'pID': [], 'event': [], 'start': pd.to_datetime([]), 'end': pd.to_datetime([])})
+
+    table = pd.concat(frames, ignore_index=True)
+    return table.sort_values(['pID', 'event', 'start'], kind='stable').reset_index(drop=True)
+
+
+class EventIndex:
+    """
+    Sorted index of an event table for range queries. For every patient and event the intervals are kept
+    sorted by start together with the running maximum of their ends, so the intervals overlapping a range
+    are found with two binary searches.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.events = list(dict.fromkeys(table['event']))
+        self._index = {}
+        for (pID, event), group in table.groupby(['pID', 'event'], sort=False, observed=True):
+            group = group.sort_values('start', kind='stable')
+            start, end = to_minutes(group['start'].values), to_minutes(group['end'].values)
+            self._index[pID, event] = (start, end, np.maximum.accumulate(end), group.index.values)
+
+    def query(self, pID, start=None, end=None, events=None):
+        """
+        Function to get the intervals of a patient overlapping a time range
+        :param start: Start of the range in minutes since the epoch (None: unbounded)
+        :param end: End of the range in minutes since the epoch (None: unbounded)
+        :param events: Events to include (default: all)
+        :return: Rows of the event table
+        """
+        rows = []
+        for event in (self.events if events is None else events):
+            if (pID, event) not in self._index:
+                continue
+            starts, ends, max_end, index = self._index[pID, event]
+            lo = 0 if start is None else np.searchsorted(max_end, start, side='right')
+            hi = len(starts) if end is None else np.searchsorted(starts, end, side='left')
+            keep = slice(lo, hi) if start is None else lo + np.flatnonzero(ends[lo:hi] > start)
+            rows.append(index[keep])
+        return self.table.loc[np.concatenate(rows) if rows else []]
+
+
+def save_event_table(table, path):
+    with open(path, 'wb') as f:
+        pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_event_table(path, data=None, source_path=None, res=5):
+    """
+    Function to load the event table saved at path, rebuilding (and saving) it from data when it is
+    missing or older than source_path (the glucose file it was built from)
+    :param data: DataFrame to build the table from
+    :return: The event table
+    """
+    if os.path.exists(path) and (source_path is None or os.path.getmtime(path) >= os.path.getmtime(source_path)):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    if data is None:
+        raise FileNotFoundError("No up-to-date event table at {}".format(path))
+    table = build_event_table(data, res=res)
+    try:
+        save_event_table(table, path)
+    except OSError as e:
+        print(f"Could not save event table to {path}: {e}")
+    return table
@@ -0,0 +1,316 @@
+import numpy as np
+import pandas as pd
+
+
+def to_minutes(times):
+    """
+    Converts timestamps to float minutes since the epoch.
+    :param times: Timestamps in any format understood by pd.to_datetime
+    :return: A float64 numpy array
+    """
+    times = np.asarray(times)
+    if not np.issubdtype(times.dtype, np.datetime64):
+        times = pd.to_datetime(times).values
+    return times.astype('datetime64[ns]').astype(np.int64) / 6e10
+
+
+def _nan_mean(values):
+    values = values[~np.isnan(values)]
+    return np.mean(values) if len(values) else np.nan
+
+
+def _nan_std(values):
+    values = values[~np.isnan(values)]
+    return np.std(values) if len(values) else np.nan
+
+
+def get_lagged_values(times, values, lags, tolerance=2.5, groups=None):
+    """
+    Pairs every reading with the reading recorded `lag` minutes earlier using a sorted
+    join on the time index, so gaps, duplicated rows and concatenated files do not shift
+    the pairing the way a fixed row offset does.
+    :param times: Timestamps of the readings
+    :param values: Readings aligned with `times`
+    :param lags: Lag or list of lags in minutes
+    :param tolerance: Maximum distance in minutes between t - lag and the matched reading
+    :param groups: Optional patient IDs; readings are only paired within the same group
+    :return: Array of shape (len(lags), len(values)), NaN where no reading matches
+    """
+    t = to_minutes(times)
+    v = np.asarray(values, dtype=float)
+    lags = np.atleast_1d(np.asarray(lags, dtype=float))
+    n = len(t)
+    if n == 0:
+        return np.empty((len(lags), 0))
+
+    if groups is not None:
+        # Shift each group onto its own stretch of the time axis, far enough apart
+        # that no lag can reach into a neighbouring group
+        codes = pd.factorize(np.asarray(groups))[0]
+        t = t - t.min()
+        t = t + codes * (t.max() + lags.max() + tolerance + 1)
+
+    order = np.argsort(t, kind='stable')
+    t_sorted, v_sorted = t[order], v[order]
+
+    target = t[None, :] - lags[:, None]
+    right = np.searchsorted(t_sorted, target)
+    left = np.clip(right - 1, 0, n - 1)
+    right = np.clip(right, 0, n - 1)
+
+    dist_left = np.abs(target - t_sorted[left])
+    dist_right = np.abs(t_sorted[right] - target)
+    nearest = np.where(dist_right < dist_left, right, left)
+    dist = np.minimum(dist_left, dist_right)
+
+    return np.where(dist <= tolerance, v_sorted[nearest], np.nan)
+
+
+def get_lag_measures(df, hours=(1, 2, 4, 24), tolerance=2.5):
+    """
+    Computes MODD and CONGA-n for several lags in a single pass.
+    MODD is the mean absolute difference between readings 24 h apart. CONGA-n is the standard deviation of the
+    signed difference between readings n hours apart (McDonnell et al.); versions before the timestamp-aligned
+    lags took the SD of the absolute difference, so CONGA values reported by them are not comparable.
+    :param df: DataFrame with 'Time' and 'CGM' columns (and optionally 'pID')
+    :param hours: CONGA lags in hours; MODD always uses the 24 h lag
+    :param tolerance: Maximum timing error in minutes when matching lagged readings
+    :return: Dictionary {'CONGA<n>': value, ..., 'MODD': value}
+    """
+    hours = list(hours)
+    lags = hours if 24 in hours else hours + [24]
+    groups = df['pID'].values if 'pID' in df else None
+    cgm = df['CGM'].values.astype(float)
+
+    lagged = get_lagged_values(df['Time'].values, cgm, np.asarray(lags) * 60, tolerance, groups)
+    diff = cgm[None, :] - lagged
+
+    measures = {}
+    for h, d in zip(lags, diff):
+        if h in hours:
+            measures['CONGA{:g}'.format(h)] = _nan_std(d)
+    measures['MODD'] = _nan_mean(np.abs(diff[lags.index(24)]))
+
+    return measures
+
+
+def get_glucose_risk(glucose, measure):
+    """
+    Kovatchev low/high blood glucose risk of each reading.
+    :param glucose: Glucose value or array of values (mg/dL)
+    :param measure: 'LBGI' for the hypoglycaemic risk, anything else for the hyperglycaemic risk
+    :return: Risk value(s) with the same shape as `glucose`
+    """
+    bgi = (np.log(glucose)**1.084) - 5.381
+    if measure == 'LBGI':
+        r = np.minimum(0, bgi)
+    else:
+        r = np.maximum(0, bgi)
+    risk = 22.77 * (r**2)
+
+    return risk
+
+
+def get_range_measures(cgm, low=70, high=180):
+    """
+    Percentage of valid readings below, within and above the target range.
+    :param cgm: Array of glucose readings
+    :param low: Lower bound of the target range (mg/dL)
+    :param high: Upper bound of the target range (mg/dL)
+    :return: Dictionary {'TBR': %, 'TIR': %, 'TAR': %}
+    """
+    cgm = np.asarray(cgm, dtype=float)
+    cgm = cgm[~np.isnan(cgm)]
+    if len(cgm) == 0:
+        return {'TBR': np.nan, 'TIR': np.nan, 'TAR': np.nan}
+
+    below = np.count_nonzero(cgm < low)
+    above = np.count_nonzero(cgm > high)
+    scale = 100 / len(cgm)
+
+    return {'TBR': below * scale, 'TIR': (len(cgm) - below - above) * scale, 'TAR': above * scale}
+
+
+def _collapse_turning_points(points, sd, start=0):
+    """
+    Removes the small oscillations that cannot change the MAGE hysteresis sweep: a consecutive peak/nadir
+    pair less than `sd` apart whose values lie within the range of its two neighbours. Such a pair is never
+    a confirmed excursion and never moves the running extreme of one, so removing it leaves the sweep's
+    result unchanged once it has left its initial phase (before `start`, which is kept as is).
+    Pairs are removed in vectorised passes until none is left.
+    :return: The remaining points
+    """
+    head, points = points[:start], points[start:]
+    while len(points) >= 4:
+        a, b, c, d = points[:-3], points[1:-2], points[2:-1], points[3:]
+        small = (np.abs(b - c) < sd) & (np.minimum(b, c) >= np.minimum(a, d)) & (np.maximum(b, c) <= np.maximum(a, d))
+        pairs = np.flatnonzero(small) + 1
+        if len(pairs) == 0:
+            break
+        # Pairs at least 3 apart do not share points or neighbours, so they can be removed together
+        pairs = pairs[np.r_[True, np.diff(pairs) >= 3]]
+        keep = np.ones(len(points), dtype=bool)
+        keep[pairs] = keep[pairs + 1] = False
+        points = points[keep]
+    return np.r_[head, points]
+
+
+def get_mage(cgm):
+    """
+    Mean amplitude of glycaemic excursions, averaged over rises and falls.
+    Turning points are found with one vectorised pass over the sign of the first
+    difference and their small nested oscillations are collapsed in vectorised passes,
+    so the hysteresis sweep that keeps the excursions larger than one SD runs over
+    far fewer points than there are readings.
+    :param cgm: Array of glucose readings in time order
+    :return: MAGE in mg/dL
+    """
+    g = np.asarray(cgm, dtype=float)
+    g = g[~np.isnan(g)]
+    if len(g) < 3:
+        return np.nan
+    sd = np.std(g)
+
+    step = np.sign(np.diff(g))
+    moving = np.flatnonzero(step)
+    turns = moving[np.flatnonzero(step[moving][1:] != step[moving][:-1])] + 1
+    points = g[np.r_[0, turns, len(g) - 1]]
+
+    # The sweep leaves its initial phase at the first point one SD away from the extremes before it
+    started = np.flatnonzero(((points - np.minimum.accumulate(points) >= sd) |
+                              (np.maximum.accumulate(points) - points >= sd))[1:])
+    if len(started):
+        points = _collapse_turning_points(points, sd, started[0] + 1)
+
+    amplitudes = []
+    lo = hi = last = candidate = points[0]
+    direction = 0
+    for v in points[1:]:
+        if direction == 0:
+            lo, hi = min(lo, v), max(hi, v)
+            if v - lo >= sd:
+                last, candidate, direction = lo, v, 1
+            elif hi - v >= sd:
+                last, candidate, direction = hi, v, -1
+        elif direction * (v - candidate) > 0:
+            candidate = v
+        elif abs(candidate - v) >= sd:
+            amplitudes.append(abs(candidate - last))
+            last, candidate, direction = candidate, v, -direction
+    if direction != 0 and abs(candidate - last) >= sd:
+        amplitudes.append(abs(candidate - last))
+
+    return np.mean(amplitudes) if amplitudes else np.nan
+
+
+def _runs(flags, t, res):
+    """Start and end positions of runs of True in `flags` that are not broken by time gaps."""
+    joined = np.r_[False, np.diff(t) <= 1.5 * res]
+    cont = flags & np.r_[False, flags[:-1]] & joined
+    starts = np.flatnonzero(flags & ~cont)
+    ends = np.flatnonzero(flags & ~np.r_[cont[1:], False])
+    return starts, ends
+
+
+def get_hypo_episodes(times, cgm, threshold=54, min_duration=15, res=5):
+    """
+    Counts consensus hypoglycaemia episodes: runs of consecutive readings below
+    `threshold` lasting at least `min_duration` minutes. Runs are found by run-length
+    encoding the below-threshold flags, and a missing reading or a time gap ends a run.
+    :param times: Timestamps of the readings
+    :param cgm: Glucose readings aligned with `times`
+    :param threshold: Glucose level (mg/dL) defining the episode
+    :param min_duration: Minimum episode duration in minutes
+    :param res: Sampling interval of the CGM in minutes
+    :return: Number of episodes and the observed duration in days
+    """
+    t = to_minutes(times)
+    g = np.asarray(cgm, dtype=float)
+    if len(t) == 0:
+        return 0, 0
+    order = np.argsort(t, kind='stable')
+    t, g = t[order], g[order]
+
+    below = np.nan_to_num(g, nan=np.inf) < threshold
+    starts, ends = _runs(below, t, res)
+    duration = t[ends] - t[starts] + res
+
+    return np.count_nonzero(duration >= min_duration), (t[-1] - t[0] + res) / 1440
+
+
+def get_daily_risk(times, cgm):
+    """
+    Daily low/high blood glucose risk statistics.
+    :param times: Timestamps of the readings
+    :param cgm: Glucose readings aligned with `times`
+    :return: DataFrame indexed by day with the mean (LBGI, HBGI) and maximum (LR, HR) risks
+    """
+    g = np.asarray(cgm, dtype=float)
+    valid = ~np.isnan(g)
+    day = np.floor(to_minutes(times)[valid] / 1440).astype(np.int64)
+    g = g[valid]
+
+    risk = pd.DataFrame({'day': day, 'LBGI': get_glucose_risk(g, 'LBGI'), 'HBGI': get_glucose_risk(g, 'HBGI')})
+    grouped = risk.groupby('day')
+    daily = grouped.mean()
+    daily[['LR', 'HR']] = grouped.max().values
+
+    return daily
+
+
+def get_daily_profile_partials(times, cgm, starts, ends):
+    """
+    Partial aggregates of the glucose readings falling in each time-of-day bin
+    [starts[k], ends[k]), found with one binary search instead of a mask per bin.
+    Partials of different patients (or chunks) are merged with combine_daily_profiles.
+    :param times: Timestamps of the readings
+    :param cgm: Glucose readings aligned with `times`
+    :param starts: Sorted bin starts in seconds since midnight
+    :param ends: Bin ends in seconds since midnight (exclusive)
+    :return: Tuple (n, mean, m2) of arrays with the count, mean and sum of squared deviations per bin
+    """
+    g = np.asarray(cgm, dtype=float)
+    times = np.asarray(times)
+    if not np.issubdtype(times.dtype, np.datetime64):
+        times = pd.to_datetime(times).values
+    seconds = (times.astype('datetime64[ns]').astype(np.int64) % (86400 * 10**9)) / 1e9 # Exact for whole seconds
+    k = np.searchsorted(starts, seconds, side='right') - 1
+    inside = (k >= 0) & ~np.isnan(g)
+    inside[inside] = seconds[inside] < np.asarray(ends)[k[inside]]
+    k, g = k[inside], g[inside]
+
+    n_bins = len(starts)
+    n = np.bincount(k, minlength=n_bins).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(k, weights=g, minlength=n_bins) / n
+    m2 = np.bincount(k, weights=(g - mean[k])**2, minlength=n_bins)
+
+    return n, np.nan_to_num(mean), m2
+
+
+def combine_daily_profiles(a, b):
+    """
+    Merges two sets of daily profile partials (n, mean, m2) with the pairwise update of Chan et al.
+    :return: The combined partials
+    """
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = mean_b - mean_a
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0)
+        m2 = m2_a + m2_b + np.where(n > 0, delta**2 * n_a * n_b / n, 0)
+
+    return n, mean, m2
+
+
+def finish_daily_profile(partials):
+    """
+    Mean and sample standard deviation (ddof=1, as pandas) per bin from daily profile partials.
+    :return: Tuple (mean, std); NaN where a bin has too few readings
+    """
+    n, mean, m2 = partials
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(m2 / (n - 1))
+
+    return np.where(n > 0, mean, np.nan), np.where(n > 1, std, np.nan)
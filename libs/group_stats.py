@@ -0,0 +1,243 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from libs.lazy import lazy_import
+
+sps = lazy_import('scipy.stats') # Only needed by the significance tests
+
+
+def _pad_days(values, pIDs):
+    """Packs per-day values into a (patients, max_days) array padded with NaN."""
+    codes, uniques = pd.factorize(pIDs)
+    counts = np.bincount(codes, minlength=len(uniques))
+    order = np.argsort(codes, kind='stable')
+    offsets = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    padded = np.full((len(uniques), max(counts.max(), 1)), np.nan)
+    padded[codes[order], offsets] = np.asarray(values, dtype=float)[order]
+    return padded, counts, uniques
+
+
+def _bootstrap_chunk(groups, n_boot, seed, statistic):
+    """
+    Draws `n_boot` resamples of every group from one seeded stream.
+    Each group is (values, day_counts): values is (patients,) or (patients, max_days).
+    """
+    rng = np.random.default_rng(seed)
+    reduce = np.nanmedian if statistic == 'median' else np.nanmean
+    stats = np.empty((n_boot, len(groups)))
+
+    for g, (values, day_counts) in enumerate(groups):
+        if len(values) == 0:
+            stats[:, g] = np.nan
+            continue
+        pidx = rng.integers(0, len(values), size=(n_boot, len(values)))
+        if values.ndim == 1:
+            patient_values = values[pidx]
+        else:
+            n_days = day_counts[pidx][..., None]
+            didx = (rng.random(pidx.shape + (values.shape[1],)) * n_days).astype(np.int64)
+            resampled = values[pidx[..., None], didx]
+            resampled[np.arange(values.shape[1]) >= n_days] = np.nan
+            patient_values = np.nanmean(resampled, axis=2)
+        stats[:, g] = reduce(patient_values, axis=1)
+
+    return stats
+
+
+def map_checked(function, args, n_jobs=1, checkpoint=None):
+    """
+    Applies function to every tuple of arguments, in worker processes if n_jobs > 1, and returns the results in order.
+    checkpoint (optional) is called before every call, or before collecting every result; if it raises, the
+    calls not started yet are cancelled and the exception propagates, so a caller can stop the work early.
+    """
+    if n_jobs == 1 or len(args) <= 1:
+        results = []
+        for a in args:
+            if checkpoint is not None:
+                checkpoint()
+            results.append(function(*a))
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(args))) as pool:
+        futures = [pool.submit(function, *a) for a in args]
+        try:
+            results = []
+            for future in futures:
+                if checkpoint is not None:
+                    checkpoint()
+                results.append(future.result())
+            return results
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _run_chunks(groups, n_boot, seed, statistic, n_jobs, chunk_size, checkpoint=None):
+    """Splits the resamples into fixed-size chunks with their own seed so results do not depend on n_jobs."""
+    sizes = [min(chunk_size, n_boot - k) for k in range(0, n_boot, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(groups, size, s, statistic) for size, s in zip(sizes, seeds)]
+
+    results = map_checked(_bootstrap_chunk, args, n_jobs or os.cpu_count() or 1, checkpoint)
+    return np.concatenate(results)
+
+
+def _chunk_size(groups, budget=2_000_000):
+    cells = max(v.size for v, _ in groups)
+    return int(np.clip(budget // max(cells, 1), 1, 2500))
+
+
+def bootstrap_groups(table, category, measure, n_boot=10000, resample_days=False, statistic='mean',
+                     alpha=0.05, seed=0, n_jobs=None, order=None, checkpoint=None):
+    """
+    Bootstrap confidence intervals of a measure for every value of a category.
+    Patients are resampled with replacement inside each category and, with
+    `resample_days`, days are resampled inside each drawn patient.
+    :param table: DataFrame with 'pID', category and measure columns (one row per patient,
+                  or one row per patient-day when resample_days is True)
+    :param category: Column used to group the patients
+    :param measure: Column holding the values
+    :param n_boot: Number of bootstrap resamples
+    :param resample_days: Resample days within patients as well as patients
+    :param statistic: 'mean' or 'median' of the patient values in each category
+    :param alpha: Significance level of the confidence interval
+    :param seed: Seed of the random streams; results are reproducible for a given seed
+    :param n_jobs: Number of worker processes (default: all cores)
+    :param order: Category values to report, in order (default: order of appearance)
+    :param checkpoint: Optional function called between chunks of resamples; raise from it to stop early
+    :return: DataFrame indexed by category value with n, estimate, ci_low, ci_high and
+             p_value (two-sided, against the first category). Categories without values get n = 0 and NaN
+    """
+    table = table.dropna(subset=[category, measure])
+    levels = pd.unique(table[category]) if order is None else order
+    reduce = np.median if statistic == 'median' else np.mean
+
+    groups, estimates, sizes = [], [], []
+    for level in levels:
+        subset = table[table[category] == level]
+        if subset.empty:
+            groups.append((np.zeros(0), None))
+            estimates.append(np.nan)
+            sizes.append(0)
+            continue
+        if resample_days:
+            values, counts, uniques = _pad_days(subset[measure].values, subset['pID'].values)
+            estimates.append(reduce(np.nanmean(values, axis=1)))
+        else:
+            values, counts, uniques = subset[measure].values.astype(float), None, subset['pID'].values
+            estimates.append(reduce(values))
+        groups.append((values, counts))
+        sizes.append(len(uniques))
+
+    stats = _run_chunks(groups, n_boot, seed, statistic, n_jobs, _chunk_size(groups), checkpoint)
+
+    diff = stats - stats[:, [0]]
+    p_value = np.minimum(1, 2 * np.minimum(np.mean(diff <= 0, axis=0), np.mean(diff >= 0, axis=0)))
+    measured = np.array(sizes) > 0
+    p_value[~measured | ~measured[0]] = np.nan
+    p_value[0] = np.nan
+    ci = np.full((2, len(sizes)), np.nan)
+    ci[:, measured] = np.nanquantile(stats[:, measured], [alpha / 2, 1 - alpha / 2], axis=0)
+
+    return pd.DataFrame({'n': sizes,
+                         'estimate': estimates,
+                         'ci_low': ci[0],
+                         'ci_high': ci[1],
+                         'p_value': p_value}, index=pd.Index(levels, name=category))
+
+
+def _bootstrap_slope_chunk(x, y, n_boot, seed):
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(x), size=(n_boot, len(x)))
+    xs, ys = x[idx], y[idx]
+    xs = xs - xs.mean(axis=1, keepdims=True)
+    ys = ys - ys.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (xs * ys).sum(axis=1) / (xs * xs).sum(axis=1)
+
+
+def bootstrap_slope(table, category, measure, n_boot=10000, alpha=0.05, seed=0, n_jobs=None, chunk_size=2500,
+                    checkpoint=None):
+    """
+    Bootstrap confidence interval of the least-squares slope of a measure against a numeric category.
+    :param checkpoint: Optional function called between chunks of resamples; raise from it to stop early
+    :return: Dictionary with slope, ci_low, ci_high and p_value (two-sided, slope = 0)
+    """
+    table = table.dropna(subset=[category, measure])
+    x = table[category].values.astype(float)
+    y = table[measure].values.astype(float)
+
+    sizes = [min(chunk_size, n_boot - k) for k in range(0, n_boot, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    slopes = map_checked(_bootstrap_slope_chunk, [(x, y, size, s) for size, s in zip(sizes, seeds)],
+                         n_jobs or os.cpu_count() or 1, checkpoint)
+    slopes = np.concatenate(slopes)
+
+    return {'slope': np.polyfit(x, y, 1)[0],
+            'ci_low': np.nanquantile(slopes, alpha / 2),
+            'ci_high': np.nanquantile(slopes, 1 - alpha / 2),
+            'p_value': min(1, 2 * min(np.mean(slopes <= 0), np.mean(slopes >= 0)))}
+
+
+def compare_groups(values, labels):
+    """
+    Nonparametric test of a measure across the values of a category.
+    Numeric categories use the Spearman rank correlation, others the Kruskal-Wallis H test.
+    :param values: Measure of each patient
+    :param labels: Category value of each patient
+    :return: Dictionary with test, statistic, p_value, n and a per-group summary string
+    """
+    frame = pd.DataFrame({'value': values, 'label': labels}).dropna()
+    result = {'test': None, 'statistic': np.nan, 'p_value': np.nan, 'n': len(frame), 'summary': ''}
+    if frame.empty:
+        return result
+
+    if pd.api.types.is_numeric_dtype(frame['label']):
+        result['test'] = 'Spearman'
+        if frame['label'].nunique() > 1 and frame['value'].nunique() > 1:
+            result['statistic'], result['p_value'] = sps.spearmanr(frame['label'], frame['value'])
+        return result
+
+    result['test'] = 'Kruskal-Wallis'
+    grouped = frame.groupby('label', sort=False)['value']
+    result['summary'] = '; '.join('{}: {:.3g} (n={})'.format(k, v.median(), len(v)) for k, v in grouped)
+    samples = [v.values for _, v in grouped]
+    if len(samples) > 1:
+        try:
+            result['statistic'], result['p_value'] = sps.kruskal(*samples)
+        except ValueError:
+            pass
+    return result
+
+
+def _compare_cells(table, cells):
+    return [dict(measure=m, category=c, **compare_groups(table[m].values, table[c].values)) for m, c in cells]
+
+
+def significance_matrix(table, measures, categories, n_jobs=None):
+    """
+    Tests every measure against every category in one run.
+    :param table: One row per patient with the measure and category columns
+                  (e.g. get_glycaemic_table merged with the profiles)
+    :param measures: Measure columns to test
+    :param categories: Category columns to group by
+    :param n_jobs: Number of worker processes (default: all cores)
+    :return: Long DataFrame with one row per (measure, category) cell
+    """
+    cells = [(m, c) for m in measures for c in categories]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(cells))
+
+    if n_jobs <= 1:
+        rows = _compare_cells(table, cells)
+    else:
+        batches = [cells[k::n_jobs] for k in range(n_jobs)]
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            rows = [row for batch in pool.map(_compare_cells, [table] * n_jobs, batches) for row in batch]
+
+    matrix = pd.DataFrame(rows).set_index(['measure', 'category'])
+    return matrix.loc[cells].reset_index()
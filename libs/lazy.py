@@ -0,0 +1,24 @@
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """
+    Function to import a module on first use.
+    The module object is created straight away but its code only runs when one of its
+    attributes is first accessed, so heavy libraries do not slow down start-up.
+    :param name: Full module name, e.g. 'seaborn' or 'scipy.stats'
+    :return: The (not yet executed) module
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
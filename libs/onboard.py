@@ -0,0 +1,128 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from libs.responses import get_grid_slots
+
+ONBOARD_COLUMNS = ['IOB', 'COB']
+
+
+def insulin_on_board_curve(duration=360, peak=75, res=5):
+    """
+    Function to get the fraction of an insulin dose still active after every interval, following the exponential
+    insulin action model used by open-source closed loops (rapid-acting insulin by default)
+    :param duration: Duration of insulin action in minutes
+    :param peak: Minutes to the peak of insulin activity
+    :param res: Sampling interval in minutes
+    :return: Array with the remaining fraction at 0, res, 2 * res, ... minutes after the dose
+    """
+    t = np.arange(0, duration + res, res, dtype=float)
+    tau = peak * (1 - peak / duration) / (1 - 2 * peak / duration)
+    a = 2 * tau / duration
+    S = 1 / (1 - a + (1 + a) * np.exp(-duration / tau))
+    remaining = 1 - S * (1 - a) * ((t**2 / (tau * duration * (1 - a)) - t / tau - 1) * np.exp(-t / tau) + 1)
+    return np.clip(remaining, 0, 1)
+
+
+def carbs_on_board_curve(absorption=180, res=5):
+    """
+    Function to get the fraction of a meal still to be absorbed after every interval, with linear absorption
+    :param absorption: Absorption time of the meal in minutes
+    :param res: Sampling interval in minutes
+    :return: Array with the remaining fraction at 0, res, 2 * res, ... minutes after the meal
+    """
+    t = np.arange(0, absorption + res, res, dtype=float)
+    return np.clip(1 - t / absorption, 0, 1)
+
+
+def get_action_curves(res=5):
+    """Default {output column: (input column, action curve)} of get_on_board: IOB from INS and COB from CRB."""
+    return {'IOB': ('INS', insulin_on_board_curve(res=res)), 'COB': ('CRB', carbs_on_board_curve(res=res))}
+
+
+def fft_convolve(x, kernel, block=4096):
+    """
+    Function to convolve a long series with a short kernel by overlap-add: the series is cut into blocks that
+    are transformed together as one 2-D FFT, so memory stays proportional to the block size times the block count
+    :param x: Series to convolve
+    :param kernel: Kernel, e.g. an action curve
+    :param block: Length of the blocks (raised to the kernel length if shorter)
+    :return: The first len(x) values of the full convolution
+    """
+    n, k = len(x), len(kernel)
+    if n == 0 or k == 0:
+        return np.zeros(n)
+    block = max(block, k)
+    n_blocks = -(-n // block)
+    n_fft = 1 << int(np.ceil(np.log2(block + k - 1)))
+    blocks = np.zeros((n_blocks, block))
+    blocks.ravel()[:n] = x
+    y = np.fft.irfft(np.fft.rfft(blocks, n_fft, axis=1) * np.fft.rfft(kernel, n_fft), n_fft, axis=1)
+
+    out = np.zeros((n_blocks + 1, block))
+    out[:-1] += y[:, :block]
+    out[1:, :k - 1] += y[:, block:block + k - 1]
+    return out.ravel()[:n]
+
+
+def get_on_board(df, curves=None, res=5):
+    """
+    Function to compute the insulin and carbohydrates on board of every row of every patient. Doses of all
+    patients are placed on one regular grid, with gaps longer than the action curves between patients, and each
+    curve is applied to the whole cohort with a single FFT convolution
+    :param df: DataFrame with 'pID', 'Time' and the dose columns, each patient's rows in time order
+    :param curves: Dictionary {output column: (dose column, action curve sampled every res minutes)};
+                   default get_action_curves(res)
+    :param res: Sampling interval in minutes
+    :return: DataFrame with pID, Time and one float32 column per curve (e.g. IOB in U and COB in g), aligned
+             with the rows of df
+    """
+    curves = get_action_curves(res) if curves is None else curves
+    pad = max((len(curve) for _, curve in curves.values()), default=0)
+    _, _, slot, size = get_grid_slots(df['pID'], df['Time'].values, res, pad)
+
+    on_board = pd.DataFrame({'pID': df['pID'].values, 'Time': pd.to_datetime(df['Time'].values)})
+    for name, (column, curve) in curves.items():
+        doses = np.zeros(size)
+        np.add.at(doses, slot, np.nan_to_num(df[column].to_numpy(dtype=float, na_value=np.nan)))
+        on_board[name] = np.maximum(fft_convolve(doses, np.asarray(curve, dtype=float))[slot], 0).astype(np.float32)
+    return on_board
+
+
+def get_curves_key(curves, res):
+    """Digest of the action curves and sampling interval of on-board traces, saved with them to detect stale files."""
+    digest = hashlib.sha1(str(res).encode())
+    for name, (column, curve) in sorted(curves.items()):
+        digest.update(f'{name}:{column}:'.encode())
+        digest.update(np.asarray(curve, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def load_on_board(path, data=None, source_path=None, curves=None, res=5):
+    """
+    Function to load the on-board traces saved at path, recomputing (and saving) them from data when they are
+    missing, older than source_path (the glucose file they were computed from) or computed with other curves or res
+    :param data: DataFrame to compute the traces from
+    :param curves: Action curves, as in get_on_board
+    :param res: Sampling interval in minutes
+    :return: DataFrame returned by get_on_board
+    """
+    curves = get_action_curves(res) if curves is None else curves
+    key = get_curves_key(curves, res)
+    if os.path.exists(path) and (source_path is None or os.path.getmtime(path) >= os.path.getmtime(source_path)):
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if isinstance(saved, dict) and saved.get('key') == key:
+            return saved['on_board']
+    if data is None:
+        raise FileNotFoundError("No up-to-date on-board traces at {}".format(path))
+    on_board = get_on_board(data, curves, res)
+    try:
+        with open(path, 'wb') as f:
+            pickle.dump({'key': key, 'on_board': on_board}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"Could not save on-board traces to {path}: {e}")
+    return on_board
@@ -0,0 +1,95 @@
+import sys
+import threading
+import functools
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def get_nbytes(obj):
+    """
+    Function to estimate the memory held by plot data
+    :param obj: numpy array, DataFrame/Series, container of these, or a functools.partial over them
+    :return: Size in bytes
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, dict):
+        return sum(get_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(get_nbytes(v) for v in obj)
+    if isinstance(obj, functools.partial):
+        return get_nbytes(obj.args) + get_nbytes(obj.keywords)
+    return sys.getsizeof(obj)
+
+
+def get_figure_nbytes(fig):
+    """
+    Function to estimate the memory held by a figure: its RGBA bitmap plus the data of its artists
+    :param fig: matplotlib.figure.Figure
+    :return: Size in bytes
+    """
+    width, height = fig.bbox.size
+    nbytes = int(width * height * 4)
+    for ax in fig.axes:
+        nbytes += sum(np.asarray(line.get_xydata()).nbytes for line in ax.lines)
+        nbytes += sum(np.asarray(collection.get_offsets()).nbytes for collection in ax.collections)
+        nbytes += sum(np.asarray(image.get_array()).nbytes for image in ax.images)
+    return nbytes
+
+
+class PlotCache:
+    """
+    Least-recently-used cache of plot results (computed data, figures and their rendered bitmaps)
+    bounded by an approximate memory budget. Entries are evicted oldest first once the budget is
+    exceeded; a single entry larger than the budget is not stored.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict() # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Returns the value stored under key and marks it as most recently used."""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes=None):
+        """
+        Stores a value, evicting the least recently used entries to stay within the budget
+        :param nbytes: Size of the value (default: estimated with get_nbytes)
+        :return: The evicted values, e.g. to release figures
+        """
+        nbytes = get_nbytes(value) if nbytes is None else nbytes
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return [value]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (old, old_nbytes) = self._entries.popitem(last=False)
+                self.nbytes -= old_nbytes
+                evicted.append(old)
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,86 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from libs.glycaemic import to_minutes
+
+# Bucket width of each pyramid level in minutes, finest first
+LEVELS = {'5min': 5, '1h': 60, '1d': 1440, '1w': 10080}
+
+
+def _aggregate(frame, width):
+    """Combines partial aggregates (pID, bucket start, n, CGM sum/min/max, CRB, INS) into buckets of `width` minutes."""
+    frame = frame.assign(Minute=np.floor(frame['Minute'] / width) * width)
+    grouped = frame.groupby(['pID', 'Minute'], sort=True)
+    return grouped.agg(n=('n', 'sum'), CGM_sum=('CGM_sum', 'sum'), CGM_min=('CGM_min', 'min'),
+                       CGM_max=('CGM_max', 'max'), CRB=('CRB', 'sum'), INS=('INS', 'sum')).reset_index()
+
+
+def build_pyramid(df):
+    """
+    Function to precompute per-patient aggregates of the glucose data at every level of LEVELS.
+    The 5 min level is built from the raw rows; each coarser level is combined from the level
+    below it, so the raw data is read only once.
+    :param df: DataFrame with 'pID', 'Time', 'CGM', 'CRB' and 'INS' columns
+    :return: Dictionary {level: {pID: DataFrame}}; every DataFrame is sorted by time and has
+             Time (bucket start), Minute, n (CGM readings), CGM_min, CGM_mean, CGM_max, CRB and INS columns
+    """
+    cgm = df['CGM'].values.astype(float)
+    base = pd.DataFrame({'pID': df['pID'].values,
+                         'Minute': to_minutes(df['Time'].values),
+                         'n': (~np.isnan(cgm)).astype(np.int64),
+                         'CGM_sum': np.nan_to_num(cgm),
+                         'CGM_min': cgm,
+                         'CGM_max': cgm,
+                         'CRB': df['CRB'].fillna(0).values.astype(float),
+                         'INS': df['INS'].fillna(0).values.astype(float)})
+
+    pyramid = {}
+    frame = base
+    for level, width in LEVELS.items():
+        frame = _aggregate(frame, width)
+        agg = frame.assign(CGM_mean=frame['CGM_sum'] / frame['n'].where(frame['n'] > 0),
+                           Time=pd.to_datetime(frame['Minute'] * 60, unit='s'))
+        agg = agg[['pID', 'Time', 'Minute', 'n', 'CGM_min', 'CGM_mean', 'CGM_max', 'CRB', 'INS']]
+        pyramid[level] = {pID: group.drop(columns='pID').reset_index(drop=True)
+                          for pID, group in agg.groupby('pID', sort=False)}
+
+    return pyramid
+
+
+def select_level(span, max_points=2000):
+    """
+    Function to pick the finest level that shows a time span with at most max_points buckets
+    :param span: Visible time span in minutes
+    :param max_points: Largest number of buckets worth drawing (about the plot width in pixels)
+    :return: Name of the level
+    """
+    for level, width in LEVELS.items():
+        if span / width <= max_points:
+            return level
+    return level
+
+
+def query_pyramid(pyramid, level, pID, start=None, end=None):
+    """
+    Function to get the buckets of one patient between two times with a binary search on the level
+    :param start: First minute (since the epoch) to include, None for the start of the record
+    :param end: Last minute to include, None for the end of the record
+    :return: DataFrame slice of the level
+    """
+    frame = pyramid[level][pID]
+    minutes = frame['Minute'].values
+    lo = 0 if start is None else np.searchsorted(minutes, start - LEVELS[level], side='right')
+    hi = len(minutes) if end is None else np.searchsorted(minutes, end, side='right')
+    return frame.iloc[lo:hi]
+
+
+def save_pyramid(pyramid, path):
+    with open(path, 'wb') as f:
+        pickle.dump(pyramid, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_pyramid(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
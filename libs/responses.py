@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from libs.glycaemic import to_minutes
+
+# Smallest amount that counts as an event. OhioT1DM's INS adds the basal delivery of every 5 minutes to the
+# boluses, so only larger doses are treated as boluses
+MIN_EVENT_AMOUNT = {'CRB': 0, 'INS': 0.5}
+
+
+def get_grid_slots(pIDs, times, res=5, pad=0):
+    """
+    Function to lay the rows of all patients out on one regular res-minute grid. Patients follow each other in
+    order of first appearance, with `pad` empty slots before, between and after them, so that operations reaching
+    up to `pad` slots from a row (windows, convolutions) never mix patients
+    :param pIDs: Patient of every row
+    :param times: Timestamps of the rows
+    :param res: Sampling interval in minutes
+    :param pad: Empty slots around every patient
+    :return: Patient code of every row, its slot within the patient, its slot in the grid and the grid size
+    """
+    codes, _ = pd.factorize(pIDs)
+    minutes = to_minutes(times)
+    n_patients = codes.max() + 1 if len(codes) else 0
+    first = np.full(n_patients, np.inf)
+    np.minimum.at(first, codes, minutes)
+    local = np.rint((minutes - first[codes]) / res).astype(np.int64)
+    length = np.zeros(n_patients, dtype=np.int64)
+    np.maximum.at(length, codes, local + 1)
+    base = pad + np.r_[0, np.cumsum(length + pad)[:-1]]
+    size = base[-1] + length[-1] + pad if n_patients else 0
+    return codes, local, base[codes] + local, size
+
+
+def get_response_windows(df, event='CRB', before=30, after=180, res=5, min_amount=None, measure='CGM'):
+    """
+    Function to extract the glucose window around every event of every patient with a single indexed gather.
+    The readings of all patients are laid out on one regular res-minute grid, each patient after a gap longer
+    than a window, so windows never reach into another patient and missing readings read as NaN.
+    An event is the first row of a run of rows above min_amount (a bolus spread over several rows counts once)
+    :param df: DataFrame with 'pID', 'Time', measure and event columns, each patient's rows in time order
+    :param event: Column with the events, 'CRB' (meals) or 'INS' (boluses)
+    :param before: Minutes of the window before the event
+    :param after: Minutes of the window after the event
+    :param res: Sampling interval in minutes
+    :param min_amount: Smallest event amount (default: MIN_EVENT_AMOUNT of the column, else 0)
+    :return: DataFrame with pID, Time and amount of every event, the (events, offsets) array of windows and
+             the offsets of the window columns in minutes
+    """
+    min_amount = MIN_EVENT_AMOUNT.get(event, 0) if min_amount is None else min_amount
+    values = df[measure].to_numpy(dtype=np.float32, na_value=np.nan)
+    amount = df[event].to_numpy(dtype=float, na_value=np.nan)
+    steps = np.arange(-(before // res), after // res + 1)
+
+    codes, local, slot, size = get_grid_slots(df['pID'], df['Time'].values, res, pad=len(steps))
+    grid = np.full(size, np.nan, dtype=np.float32)
+    valid = ~np.isnan(values)
+    grid[slot[valid]] = values[valid]
+
+    flags = np.nan_to_num(amount) > min_amount
+    follows = np.r_[False, flags[:-1] & (codes[1:] == codes[:-1]) & (np.diff(local) == 1)]
+    rows = np.flatnonzero(flags & ~follows)
+
+    windows = grid[slot[rows, None] + steps]
+    events = pd.DataFrame({'pID': df['pID'].values[rows], 'Time': pd.to_datetime(df['Time'].values[rows]),
+                           'amount': amount[rows]})
+    return events, windows, steps * res
+
+
+def get_response_measures(windows, offsets, baseline=15, min_coverage=0.8):
+    """
+    Function to measure the glucose response of every window relative to its pre-event baseline
+    :param windows: Array of windows returned by get_response_windows
+    :param offsets: Offsets of the window columns in minutes
+    :param baseline: The baseline is the mean reading in the last `baseline` minutes up to the event
+    :param min_coverage: Smallest fraction of post-event readings a window needs to be measured
+    :return: DataFrame with the baseline, peak rise (mg/dL above baseline), time to peak (minutes) and coverage
+             of every window (peak rise and time to peak are NaN for windows that cannot be measured),
+             and the array of responses (windows minus their baseline)
+    """
+    pre = (offsets >= -baseline) & (offsets <= 0)
+    post = offsets >= 0
+    counts = (~np.isnan(windows[:, pre])).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        base = np.nansum(windows[:, pre], axis=1) / counts
+    responses = windows - base[:, None]
+
+    after = responses[:, post]
+    coverage = (~np.isnan(after)).mean(axis=1) if after.shape[1] else np.zeros(len(after))
+    measured = (coverage >= min_coverage) & (counts > 0)
+    peak_at = np.argmax(np.where(np.isnan(after), -np.inf, after), axis=1)
+    peak = after[np.arange(len(after)), peak_at]
+
+    measures = pd.DataFrame({'baseline': base, 'peak_rise': np.where(measured, peak, np.nan),
+                             'time_to_peak': np.where(measured, offsets[post][peak_at], np.nan),
+                             'coverage': coverage})
+    return measures, responses
+
+
+def summarise_responses(events, measures, responses, offsets, by='pID'):
+    """
+    Function to reduce the measured windows of every group in one grouped pass
+    :param events: DataFrame returned by get_response_windows (optionally with extra category columns)
+    :param measures: DataFrame returned by get_response_measures
+    :param responses: Array of responses returned by get_response_measures
+    :param offsets: Offsets of the window columns in minutes
+    :param by: Column of events to group by, e.g. 'pID' or a profile category
+    :return: DataFrame indexed by group with the number of windows, mean peak rise, median time to peak and the
+             peak and time to peak of the mean curve; and DataFrames (groups x offsets) with the mean response
+             curve and its standard error
+    """
+    measured = measures['peak_rise'].notna().values
+    keys = events[by].values[measured]
+    curves = pd.DataFrame(responses[measured], columns=offsets).groupby(keys)
+    mean = curves.mean()
+    sem = curves.std() / np.sqrt(curves.count())
+
+    grouped = measures[measured].groupby(keys)
+    # Peak of the mean curves in numpy, so a frame without events gives empty float columns
+    post = mean.loc[:, offsets >= 0].to_numpy(dtype=float)
+    peak_at = np.argmax(np.where(np.isnan(post), -np.inf, post), axis=1)
+    curve_peak = post[np.arange(len(post)), peak_at]
+    curve_time = np.where(np.isnan(curve_peak), np.nan, offsets[offsets >= 0][peak_at])
+    table = pd.DataFrame({'n': grouped.size(), 'peak_rise': grouped['peak_rise'].mean(),
+                          'time_to_peak': grouped['time_to_peak'].median(),
+                          'curve_peak_rise': pd.Series(curve_peak, index=mean.index, dtype=float),
+                          'curve_time_to_peak': pd.Series(curve_time, index=mean.index, dtype=float)})
+    table.index.name = mean.index.name = sem.index.name = by
+    return table, mean, sem
+
+
+def get_event_responses(df, event='CRB', profiles=None, category=None, before=30, after=180, res=5,
+                        min_amount=None, baseline=15, min_coverage=0.8):
+    """
+    Function to compute the event-triggered glucose responses of a dataset, per patient or per profile category
+    :param df: DataFrame containing the data
+    :param event: 'CRB' for postprandial or 'INS' for post-bolus responses
+    :param profiles: DataFrame containing the profiles of the population, needed to group by category
+    :param category: Profile column to group by; None groups by patient
+    :return: The events with their measures, and the table, mean curves and standard errors of summarise_responses
+    """
+    events, windows, offsets = get_response_windows(df, event, before, after, res, min_amount)
+    measures, responses = get_response_measures(windows, offsets, baseline, min_coverage)
+    by = 'pID'
+    if category is not None:
+        events[category] = events['pID'].map(profiles.set_index('pID')[category])
+        by = category
+    table, mean, sem = summarise_responses(events, measures, responses, offsets, by)
+    return pd.concat([events, measures], axis=1), table, mean, sem
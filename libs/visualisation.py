@@ -1,12 +1,27 @@
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import time 
 import datetime 
 import matplotlib.pyplot as plt
 from matplotlib.dates import DateFormatter
-
-from libs.CEG import clarke_error_grid
+import matplotlib.dates as mdates
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+
+from libs.lazy import lazy_import
+from libs.CEG import clarke_error_grid, clarke_zones, ZONE_LABELS
+from libs.PEG import parkes_error_grid, parkes_zones
+from libs.accuracy import pair_measurements, get_accuracy_measures
+from libs.group_stats import bootstrap_groups, bootstrap_slope, significance_matrix, map_checked
+from libs.downsample import downsample_series, with_breaks
+from libs.pyramid import LEVELS, select_level, query_pyramid
+from libs.events import EVENT_COLUMNS, build_event_table
+from libs.responses import get_event_responses
+from libs.onboard import ONBOARD_COLUMNS
+from libs.glycaemic import to_minutes, get_lag_measures, get_glucose_risk, get_daily_risk, get_range_measures, get_mage, get_hypo_episodes, get_daily_profile_partials, combine_daily_profiles, finish_daily_profile
+from src.dataset.store import iter_patients
+
+sns = lazy_import('seaborn') # seaborn (and the scipy it pulls in) loads on the first plot
 
 import os 
 import time 
@@ -85,12 +100,78 @@ def generate_5_min_intervals(day, type = 'sparse'):
     return record_timestamps , time_intervals
 
 
-def get_individual_plot(df, dataset, pID, start_day=0, end_day=1000):
+def get_daily_profile(data, pIDs, type = 'sparse'):
     """
-    Function to plot the individual data of a subject
+    Function to compute the mean and standard deviation of glucose in every time-of-day bin of the daily variation plots.
+    Partial aggregates are computed per subject and combined, so a PatientStore gives the same result as the
+    DataFrame it was built from while holding one subject in memory at a time
+    :param data: DataFrame or PatientStore containing the data
+    :param pIDs: IDs of the subjects to include
+    :param type: Type of intervals to generate. 'sparse' for sparse intervals, 'dense' for dense intervals.
+    :return: Timestamps of the bins and arrays with the mean and standard deviation of each bin
+    """
+    if type == 'dense':
+        step = 1
+    elif type == 'sparse':
+        step = 2
+    else:
+        raise ValueError("Invalid type. Use 'sparse' or 'dense'.")
+
+    today = datetime.date.today() # You can use any date
+    print(f"Generating 5-minute intervals for: {today}\n")
+    timestamps, time_intervals  = generate_5_min_intervals(today, type)
+    seconds = np.array([t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6 for t in time_intervals])
+    starts, ends = seconds[0:-1:step], seconds[1::step]
+
+    partials = None
+    for pID, df_ind in iter_patients(data, pIDs, ['Time', 'CGM'], skip_missing=True):
+        partial = get_daily_profile_partials(df_ind['Time'].values, df_ind['CGM'].values, starts, ends)
+        partials = partial if partials is None else combine_daily_profiles(partials, partial)
+    if partials is None:
+        partials = (np.zeros(len(starts)), np.zeros(len(starts)), np.zeros(len(starts)))
+    bg_mean, bg_std = finish_daily_profile(partials)
+
+    return timestamps, bg_mean, bg_std
+
+
+def prepare_figure(fig=None, figsize=None, **subplot_kw):
+    """
+    Function to get a figure and its axes for a plot, reusing an existing figure when given
+    :param fig: Figure to clear and draw on (e.g. the one shown by the GUI canvas); if None a new one is created
+    :param figsize: Size of a new figure; an existing figure keeps its size
+    :param subplot_kw: Arguments of Figure.subplots
+    :return: The figure and its axes
+    """
+    if fig is None:
+        return plt.subplots(figsize=figsize, **subplot_kw)
+    fig.clear()
+    return fig, fig.subplots(**subplot_kw)
+
+
+def _get_event_spans(table, events):
+    """Function to group the rows of an event table into {event: (starts, ends)} for the given events"""
+    return {event: (table['start'].values[table['event'].values == event], table['end'].values[table['event'].values == event])
+            for event in events}
+
+
+def get_individual_data(df, dataset, pID, start_day=0, end_day=1000, max_points=2000, events=None, on_board=None,
+                        segments=None, res=5):
+    """
+    Function to select and downsample the data drawn by the individual plot of a subject
     :param df: DataFrame containing the data
     :param dataset: Dataset name
-    :param pID: ID of the subject to plot
+    :param pID: ID of the subject
+    :param max_points: Number of CGM points to keep. The CGM line is reduced with LTTB;
+                       BGM, carb and insulin events are always kept.
+    :param events: EventIndex of the dataset (libs.events) to query the sleep, exercise and hypo intervals from;
+                   if None they are run-length encoded from the event columns of the selected rows
+    :param on_board: DataFrame returned by libs.onboard.get_on_board; its IOB and COB traces are added when given
+    :param segments: Valid-segment index of the dataset (src.dataset.segments). When given, the CGM line breaks at
+                     its segment boundaries instead of rescanning the readings, and 'coverage' is added
+    :param res: Sampling interval in minutes, used for the coverage
+    :return: Dictionary {'CGM', 'BGM', 'CRB', 'INS'} (and 'IOB', 'COB') of (timestamps, values) arrays, 'events',
+             {event: (starts, ends)} of the intervals overlapping the selected days, and (with segments) 'coverage',
+             the percentage of the selected period covered by valid CGM readings
     """
     df_ind = df.loc[df['pID'] == pID].reset_index(drop=True)
     
@@ -102,80 +183,290 @@ def get_individual_plot(df, dataset, pID, start_day=0, end_day=1000):
     duration = pd.to_datetime(df_ind['Time'])
 
     mask = duration.between(start_date, end_date)
+    rows = np.flatnonzero(mask.values)
 
     df_ind = df_ind[mask].reset_index(drop=True)
 
-    timestamp = get_record_time(df_ind)
+    timestamp = duration[mask].values
+    minutes = to_minutes(timestamp)
+
+    data = {}
+    cgm_segments = None
+    if segments is not None and len(rows):
+        # Segments of the subject clipped to the selected rows (the rows are contiguous as Time is sorted)
+        patient = segments[segments['pID'] == pID]
+        first = np.maximum(patient['start_row'].values, rows[0]) - rows[0]
+        last = np.minimum(patient['end_row'].values, rows[-1]) - rows[0]
+        cgm_segments = first[first <= last], last[first <= last]
+        covered = (cgm_segments[1] - cgm_segments[0] + 1).sum() * res
+        data['coverage'] = 100 * min(1, covered / (minutes[-1] - minutes[0] + res))
+    idx, gap_after = downsample_series(minutes, df_ind['CGM'].values, max_points, max_gap=10, segments=cgm_segments)
+    data['CGM'] = with_breaks(timestamp[idx], df_ind['CGM'].values[idx], gap_after)
+
+    for column in ['BGM', 'CRB']:
+        present = (df_ind[column] > 0).values
+        data[column] = (timestamp[present], df_ind[column].values[present])
+
+    if(dataset == 'OhioT1DM'):
+        # Basal + bolus line: keep the min/max of each pixel bucket so no bolus peak is lost
+        idx, gap_after = downsample_series(minutes, df_ind['INS'].values, max_points, max_gap=10, method='minmax')
+        data['INS'] = with_breaks(timestamp[idx], df_ind['INS'].values[idx], gap_after)
+    else:
+        ins = (df_ind['INS'] > 0).values
+        data['INS'] = (timestamp[ins], df_ind['INS'].values[ins])
+
+    if on_board is not None:
+        ob_ind = on_board.loc[on_board['pID'] == pID]
+        ob_ind = ob_ind[pd.to_datetime(ob_ind['Time']).between(start_date, end_date)]
+        ob_time = pd.to_datetime(ob_ind['Time']).values
+        for column in ONBOARD_COLUMNS:
+            if column in ob_ind.columns:
+                idx, gap_after = downsample_series(to_minutes(ob_time), ob_ind[column].values, max_points, max_gap=10)
+                data[column] = with_breaks(ob_time[idx], ob_ind[column].values[idx], gap_after)
+
+    if events is not None:
+        start, end = to_minutes(np.array([start_date, end_date], dtype='datetime64[ns]'))
+        data['events'] = _get_event_spans(events.query(pID, start, end), events.events)
+    else:
+        columns = [c for c in EVENT_COLUMNS if c in df_ind.columns]
+        data['events'] = _get_event_spans(build_event_table(df_ind, columns), columns)
+
+    return data
+
+
+def draw_event_spans(ax, events):
+    """
+    Function to shade event intervals behind the data of an axis, one patch per interval
+    :param ax: Axis to draw on
+    :param events: Dictionary {event: (starts, ends)}, e.g. get_individual_data(...)['events']
+    :return: List of the drawn patches
+    """
+    spans = []
+    for event, (starts, ends) in events.items():
+        for x0, x1 in zip(mdates.date2num(starts), mdates.date2num(ends)):
+            spans.append(ax.axvspan(x0, x1, color=EVENT_COLUMNS.get(event, 'grey'), alpha=0.2, lw=0, zorder=0))
+    return spans
+
+
+def _event_legend_handles(events):
+    return [Patch(color=EVENT_COLUMNS.get(event, 'grey'), alpha=0.2, label=event.replace('_', ' ').capitalize())
+            for event in events]
+
+
+def _individual_title(data, pID):
+    if 'coverage' in data:
+        return 'Individual data for {} ({:.0f}% CGM coverage)'.format(pID, data['coverage'])
+    return f'Individual data for {pID}'
+
+
+def _update_individual_plot(artists, data, pID):
+    """Replaces the data of an existing individual plot in place and rescales its axes."""
+    for name in ['CGM', 'BGM', 'CRB', 'INS'] + [c for c in ONBOARD_COLUMNS if c in artists]:
+        t, values = data[name]
+        if isinstance(artists[name], Line2D):
+            artists[name].set_data(t, values)
+        else:
+            artists[name].set_offsets(np.column_stack([mdates.date2num(t), values]))
+
+    ax1, ax2, ax3 = artists['axes']
+    for span in artists['events']:
+        span.remove()
+    artists['events'] = draw_event_spans(ax1, data.get('events', {}))
+    for ax in (ax1, ax2, ax3):
+        # relim only covers lines, so the scatter points are added to the data limits by hand
+        ax.relim()
+        for artist in ax.collections:
+            points = artist.get_offsets()
+            points = points[np.isfinite(points).all(axis=1)]
+            if len(points):
+                ax.update_datalim(points)
+        ax.autoscale_view()
+    ax1.set_title(_individual_title(data, pID))
+
+
+
+def draw_individual_plot(data, dataset, pID, fig=None, artists=None):
+    """
+    Function to draw the data returned by get_individual_data, with the event intervals as shaded spans.
+    If artists are those of an individual plot of the same dataset still shown on fig, its lines and
+    points are updated in place with set_data/set_offsets instead of rebuilding the axes.
+    :param data: Dictionary returned by get_individual_data
+    :param dataset: Dataset name
+    :param pID: ID of the subject
+    :param fig: Figure to draw on; if None a new one is created
+    :param artists: Artists returned by an earlier call on fig, or None
+    :return: The matplotlib.figure.Figure object and a dictionary of its artists (the CGM, BGM, CRB, INS
+             and on-board series, the event spans and the three axes) to pass to the next call
+    """
+    if artists is not None and fig is not None and artists['dataset'] == dataset and artists['axes'][0] in fig.axes \
+            and all((c in artists) == (c in data) for c in ONBOARD_COLUMNS):
+        _update_individual_plot(artists, data, pID)
+        return fig, artists
 
     sns.set_style("darkgrid")
     sns.set_context("notebook")
    
-    fig, (ax1, ax2) = plt.subplots(nrows=2, sharex=True)
-    ax1.plot(timestamp, df_ind['CGM'], label='CGM', color='green')
-    ax1.scatter(timestamp, df_ind['BGM'], color='k',label = 'BGM', alpha=0.5, marker='o')
-    ax2.scatter(timestamp, df_ind['CRB'].replace(0,np.nan), label='Carbohydrates', color='blue', marker='s')
+    fig, (ax1, ax2) = prepare_figure(fig, nrows=2, sharex=True)
+
+    events = draw_event_spans(ax1, data.get('events', {}))
+    cgm, = ax1.plot(*data['CGM'], label='CGM', color='green')
+    bgm = ax1.scatter(*data['BGM'], color='k',label = 'BGM', alpha=0.5, marker='o')
+    crb = ax2.scatter(*data['CRB'], label='Carbohydrates', color='blue', marker='s')
     ax3 = ax2.twinx()
     if(dataset == 'OhioT1DM'):
-        ax3.plot(timestamp, df_ind['INS'], label='Insulin', color='red')
+        ins, = ax3.plot(*data['INS'], label='Insulin', color='red')
     else:
-        ax3.scatter(timestamp, df_ind['INS'].replace(0,np.nan), label='Insulin', color='red', marker='*')
+        ins = ax3.scatter(*data['INS'], label='Insulin', color='red', marker='*')
+    overlays = {}
+    if 'COB' in data:
+        overlays['COB'], = ax2.plot(*data['COB'], label='Carbs on board', color='blue', linestyle='--', alpha=0.6)
+    if 'IOB' in data:
+        overlays['IOB'], = ax3.plot(*data['IOB'], label='Insulin on board', color='red', linestyle='--', alpha=0.6)
         
     hh_mm = DateFormatter('%H')
     ax2.xaxis.set_major_formatter(hh_mm)
-    ax1.set_title(f'Individual data for {pID}')
+    ax1.set_title(_individual_title(data, pID))
     ax1.set_ylabel('Glucose (CGM)')
     ax2.set_xlabel('Time (h)')
     ax2.set_ylabel('Carb (g)')
     ax3.set_ylabel('Insulin(U)')
-    ax1.legend(loc='best')
+    handles, _ = ax1.get_legend_handles_labels()
+    ax1.legend(handles=handles + _event_legend_handles(data.get('events', {})), loc='best')
     ax2.legend(loc='upper left')
     ax3.legend(loc='upper right')
     # ax2.tick_params(axis = 'x', rotation=90)
     ax1.grid()
     ax2.grid()
-    return fig
 
-def get_daily_glycaemic_variation(df, dataset, pID, type = 'sparse'):
+    artists = {'dataset': dataset, 'CGM': cgm, 'BGM': bgm, 'CRB': crb, 'INS': ins, 'events': events,
+               'axes': (ax1, ax2, ax3), **overlays}
+    return fig, artists
+
+
+def get_individual_plot(df, dataset, pID, start_day=0, end_day=1000, max_points=None, fig=None, events=None, on_board=None,
+                        segments=None):
     """
-    Function to plot the daily glycaemic variation of a subject
+    Function to plot the individual data of a subject
     :param df: DataFrame containing the data
     :param dataset: Dataset name
     :param pID: ID of the subject to plot
-    :param type: Type of intervals to generate. 'sparse' for sparse intervals, 'dense' for dense intervals.
-    :return: A matplotlib.figure.Figure object
+    :param max_points: Number of CGM points to draw (default: twice the figure width in pixels).
+                       The CGM line is reduced with LTTB; BGM, carb and insulin events are always drawn.
+    :param fig: Figure to draw on; if None a new one is created
+    :param events: EventIndex of the dataset, to look the shaded sleep, exercise and hypo intervals up
+    :param on_board: Insulin and carbs on board (libs.onboard.get_on_board) to overlay on the insulin and carb axes
+    :param segments: Valid-segment index of the dataset, to break the CGM line at its gaps and show the coverage
     """
+    if max_points is None:
+        width = fig.get_figwidth() * fig.dpi if fig is not None else plt.rcParams['figure.figsize'][0] * plt.rcParams['figure.dpi']
+        max_points = 2 * int(width)
 
+    data = get_individual_data(df, dataset, pID, start_day, end_day, max_points, events, on_board, segments)
+    fig, _ = draw_individual_plot(data, dataset, pID, fig)
+    return fig
 
-    daily_glucose_mean, daily_glucose_std = [], []
+def get_individual_timeline(pyramid, pID, start_day=0, end_day=1000, max_points=None, fig=None, events=None):
+    """
+    Function to plot a zoomable timeline of a subject from the precomputed time pyramid.
+    Whenever the visible range changes (zoom or pan) the coarsest level with enough detail
+    is chosen and only the buckets around the visible range are drawn, so raw rows are never read.
+    :param pyramid: Pyramid returned by libs.pyramid.build_pyramid
+    :param pID: ID of the subject to plot
+    :param max_points: Largest number of buckets drawn (default: the figure width in pixels)
+    :param fig: Figure to draw on; if None a new one is created
+    :param events: EventIndex of the dataset; the intervals around the visible range are shaded
+    """
+    full = query_pyramid(pyramid, '5min', pID)
+    first = np.floor(full['Minute'].values[0] / 1440) * 1440
+    start = max(first + start_day * 1440, full['Minute'].values[0])
+    end = min(first + end_day * 1440, full['Minute'].values[-1] + 5)
 
-    df_ind = df.loc[df['pID'] == pID]
+    sns.set_style("darkgrid")
+    sns.set_context("notebook")
 
-    today = datetime.date.today() # You can use any date
-    print(f"Generating 5-minute intervals for: {today}\n")
-    timestamps, time_intervals  = generate_5_min_intervals(today, type)
+    fig, (ax1, ax2) = prepare_figure(fig, nrows=2, sharex=True)
+    ax3 = ax2.twinx()
+    if max_points is None:
+        max_points = int(fig.get_figwidth() * fig.dpi)
+
+    line, = ax1.plot([], [], label='CGM', color='green')
+    carbs = ax2.vlines([], [], [], label='Carbohydrates', color='blue')
+    insulin, = ax3.plot([], [], label='Insulin', color='red', drawstyle='steps-post')
+    state = {'level': None, 'start': np.inf, 'end': -np.inf, 'band': None, 'events': []}
+
+    def to_minute(x):
+        return (x - mdates.date2num(np.datetime64('1970-01-01'))) * 1440
+
+    def update(ax):
+        x0, x1 = to_minute(np.asarray(ax.get_xlim()))
+        level = select_level(x1 - x0, max_points)
+        if level == state['level'] and state['start'] <= x0 and x1 <= state['end']:
+            return
+        # Keep one visible span of margin on each side so small pans reuse the drawn buckets
+        span = x1 - x0
+        buckets = query_pyramid(pyramid, level, pID, x0 - span, x1 + span)
+        width = LEVELS[level]
+        t = buckets['Time'].values
+        gap_after = np.r_[np.diff(buckets['Minute'].values) > width, False]
+
+        line.set_data(*with_breaks(t, buckets['CGM_mean'].values, gap_after))
+        if state['band'] is not None:
+            state['band'].remove()
+        band_t, band_min = with_breaks(t, buckets['CGM_min'].values, gap_after)
+        state['band'] = ax1.fill_between(band_t, band_min, with_breaks(t, buckets['CGM_max'].values, gap_after)[1],
+                                         color='green', alpha=0.2, linewidth=0)
+        x = mdates.date2num(t + np.timedelta64(width * 30, 's'))
+        crb = buckets['CRB'].values
+        carbs.set_segments([[(xi, 0), (xi, c)] for xi, c in zip(x[crb > 0], crb[crb > 0])])
+        insulin.set_data(*with_breaks(t, buckets['INS'].values, gap_after))
+        if events is not None:
+            for patch in state['events']:
+                patch.remove()
+            state['events'] = draw_event_spans(ax1, _get_event_spans(events.query(pID, x0 - span, x1 + span), events.events))
+
+        ax1.set_title(f'Individual data for {pID} ({level} buckets)')
+        ax2.set_ylim(0, max(crb.max() if len(crb) else 0, 1) * 1.05)
+        ax3.set_ylim(0, max(buckets['INS'].max() if len(buckets) else 0, 1) * 1.05)
+        state.update(level=level, start=x0 - span, end=x1 + span)
+        fig.canvas.draw_idle()
+
+    ax1.set_xlim(mdates.date2num(pd.to_datetime([start * 60, end * 60], unit='s').values))
+    ax1.set_ylim(0, max(np.nanmax(full['CGM_max'].values), 1) * 1.05)
+    update(ax1)
+    ax1.callbacks.connect('xlim_changed', update)
+
+    locator = mdates.AutoDateLocator()
+    ax2.xaxis.set_major_locator(locator)
+    ax2.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    ax1.set_ylabel('Glucose (CGM)')
+    ax2.set_xlabel('Time')
+    ax2.set_ylabel('Carb (g)')
+    ax3.set_ylabel('Insulin(U)')
+    handles, _ = ax1.get_legend_handles_labels()
+    ax1.legend(handles=handles + (_event_legend_handles(events.events) if events is not None else []), loc='best')
+    ax2.legend(loc='upper left')
+    ax3.legend(loc='upper right')
+    ax1.grid()
+    ax2.grid()
+    return fig
 
-    if type == 'dense':
-        step = 1
-    elif type == 'sparse':
-        step = 2
-    else:
-        raise ValueError("Invalid type. Use 'sparse' or 'dense'.")
+def get_daily_glycaemic_variation(df, dataset, pID, type = 'sparse', fig=None):
+    """
+    Function to plot the daily glycaemic variation of a subject
+    :param df: DataFrame (or PatientStore) containing the data
+    :param dataset: Dataset name
+    :param pID: ID of the subject to plot
+    :param type: Type of intervals to generate. 'sparse' for sparse intervals, 'dense' for dense intervals.
+    :param fig: Figure to draw on; if None a new one is created
+    :return: A matplotlib.figure.Figure object
+    """
 
-    for k in range(1, len(time_intervals), step):
-        start_time = time_intervals[k-1]
-        end_time = time_intervals[k]
-        df_time = pd.to_datetime(df_ind['Time']).dt.time
-        mask = (df_time >= start_time) & (df_time < end_time)
 
-        daily_glucose_mean.append(df_ind.loc[mask, 'CGM'].mean())
-        daily_glucose_std.append(df_ind.loc[mask, 'CGM'].std())
-    
-    bg_mean = np.array(daily_glucose_mean)
-    bg_std = np.array(daily_glucose_std)
+    timestamps, bg_mean, bg_std = get_daily_profile(df, [pID], type)
 
     sns.set_style("darkgrid")
     sns.set_context("notebook")
-    fig, ax = plt.subplots(figsize=(15, 5))
+    fig, ax = prepare_figure(fig, figsize=(15, 5))
     ax.plot(timestamps, bg_mean, label='Mean daily glucose', color='blue')
     ax.fill_between(timestamps, bg_mean - bg_std, bg_mean + bg_std, color='blue', alpha=0.2)
     hh_mm = DateFormatter('%H:%M')
@@ -188,14 +479,15 @@ def get_daily_glycaemic_variation(df, dataset, pID, type = 'sparse'):
     return fig
     
 
-def get_group_daily_glycaemic_variation(df, profiles, category, type = 'sparse'):
+def get_group_daily_glycaemic_variation(df, profiles, category, type = 'sparse', fig=None):
     """
     Function to plot the daily glycaemic variation of a subject
-    :param df: DataFrame containing the data
+    :param df: DataFrame (or PatientStore) containing the data
     :param profiles: DataFrame containing the profiles of the population
     :param dataset: Dataset name
     :param category: Category to group participants
     :param type: Type of intervals to generate. 'sparse' for sparse intervals, 'dense' for dense intervals.
+    :param fig: Figure to draw on; if None a new one is created
     :return: A matplotlib.figure.Figure object
     """
 
@@ -204,23 +496,12 @@ def get_group_daily_glycaemic_variation(df, profiles, category, type = 'sparse')
     # pIDs = get_pIDs(dataset_path)
     # df = prepare_data(dataset_path, pIDs)
 
-    today = datetime.date.today() # You can use any date
-    print(f"Generating 5-minute intervals for: {today}\n")
-    timestamps, time_intervals  = generate_5_min_intervals(today, type)
-
-    if type == 'dense':
-        step = 1
-    elif type == 'sparse':
-        step = 2
-    else:
-        raise ValueError("Invalid type. Use 'sparse' or 'dense'.")
-
     cat_array = profiles[category].unique()
     colours=['r','g','b','c','m','y','k','orange','purple','pink']
     sns.set_style("darkgrid")
     sns.set_context("notebook")
 
-    fig, ax = plt.subplots(figsize=(15, 5))
+    fig, ax = prepare_figure(fig, figsize=(15, 5))
     ax.set_title(f'Daily glycaemic variation stratified by {category}')
     ax.set_xlabel('Time')
     ax.set_ylabel('Value')
@@ -230,21 +511,8 @@ def get_group_daily_glycaemic_variation(df, profiles, category, type = 'sparse')
         mask = profiles[category] == i
         inc = profiles.loc[mask, 'pID']
         pIDs = inc.unique()
-        df_group = df.loc[df['pID'].isin(pIDs)]
-        daily_glucose_mean, daily_glucose_std = [], []
         print(f"Generating plot for: {i}:{pIDs}\n")
-
-        for k in range(1, len(time_intervals), step):
-            start_time = time_intervals[k-1]
-            end_time = time_intervals[k]
-            df_time = pd.to_datetime(df_group['Time']).dt.time
-            mask = (df_time >= start_time) & (df_time < end_time)
-
-            daily_glucose_mean.append(df_group.loc[mask, 'CGM'].mean())
-            daily_glucose_std.append(df_group.loc[mask, 'CGM'].std())
-
-        bg_mean = np.array(daily_glucose_mean)
-        bg_std = np.array(daily_glucose_std)
+        timestamps, bg_mean, bg_std = get_daily_profile(df, pIDs, type)
         ax.plot(timestamps, bg_mean, label= i, color=colours[n])
         ax.fill_between(timestamps, bg_mean - bg_std, bg_mean + bg_std, color=colours[n], alpha=0.2)
         
@@ -255,30 +523,201 @@ def get_group_daily_glycaemic_variation(df, profiles, category, type = 'sparse')
     return fig
     
 
-def compare_measures(df, pIDs, ax):
+EVENT_LABELS = {'CRB': 'meal', 'INS': 'bolus'}
+
+
+def get_event_response_plot(df, profiles=None, event='CRB', category=None, before=30, after=180, fig=None):
+    """
+    Function to plot the glucose response to meals or boluses: the mean response curve (with its standard error)
+    of every patient or profile category, and the peak rise and time to peak of every event window
+    :param df: DataFrame containing the data
+    :param profiles: DataFrame containing the profiles of the population, needed to group by category
+    :param event: 'CRB' for postprandial or 'INS' for post-bolus responses
+    :param category: Category to group participants; None draws one curve per patient
+    :param before: Minutes before the event shown
+    :param after: Minutes after the event shown
+    :param fig: Figure to draw on; if None a new one is created
+    :return: A matplotlib.figure.Figure object and the summary table of every group
+    """
+    windows, table, mean, sem = get_event_responses(df, event, profiles, category, before, after)
+    by = category or 'pID'
+
+    sns.set_style("darkgrid")
+    sns.set_context("notebook")
+    fig, (ax1, ax2) = prepare_figure(fig, figsize=(15, 5), ncols=2)
+    colours = sns.color_palette(n_colors=max(len(mean), 1))
+
+    offsets = mean.columns.values
+    for n, group in enumerate(mean.index):
+        label = f'{group} (n={table.loc[group, "n"]})'
+        ax1.plot(offsets, mean.loc[group].values, color=colours[n], label=label)
+        ax1.fill_between(offsets, (mean.loc[group] - sem.loc[group]).values, (mean.loc[group] + sem.loc[group]).values,
+                         color=colours[n], alpha=0.2, linewidth=0)
+        measured = windows[windows[by] == group].dropna(subset=['peak_rise'])
+        ax2.scatter(measured['time_to_peak'], measured['peak_rise'], color=colours[n], s=8, alpha=0.3)
+
+    ax1.axvline(0, color='k', linestyle='--', linewidth=1)
+    ax1.axhline(0, color='k', linewidth=0.5)
+    ax1.set_title(f'Mean glucose response after each {EVENT_LABELS.get(event, event)}' + (f' by {category}' if category else ''))
+    ax1.set_xlabel(f'Minutes from {EVENT_LABELS.get(event, event)}')
+    ax1.set_ylabel('Glucose change from baseline (mg/dL)')
+    if len(mean) <= 10:
+        ax1.legend(loc='best')
+    ax2.set_title('Peak rise and time to peak per event')
+    ax2.set_xlabel('Time to peak (min)')
+    ax2.set_ylabel('Peak rise (mg/dL)')
+    ax1.grid()
+    ax2.grid()
+    return fig, table
+
+
+ERROR_GRIDS = {'Clarke': (clarke_zones, clarke_error_grid), 'Parkes': (parkes_zones, parkes_error_grid)}
+
+def compare_measures(df, pIDs, ax=None, mode='auto', window=5, grid='Clarke'):
+    """
+    Function to compare BGM (reference) against CGM readings on an error grid
+    :param df: DataFrame containing the data
+    :param pIDs: IDs of the subjects to include
+    :param ax: Axes to draw on; if None only the zones are computed
+    :param mode: 'scatter', 'density' or 'auto' (density for large point counts)
+    :param window: Each BGM reading is paired with the nearest CGM reading within this many minutes
+    :param grid: Error grid, 'Clarke' or 'Parkes' (type 1)
+    :return: The axes, the percentage of readings in each zone [A, B, C, D, E] and the indices of each zone.
+             The MAD, MARD and bias of the pairs are written on the grid
+    """
 
-    df_CEG = df[df['pID'].isin(pIDs)]
-    df_CEG = df_CEG[['BGM', 'CGM']].dropna()
+    df_CEG = pair_measurements(df[df['pID'].isin(pIDs)], window)
 
     reference = df_CEG['CGM'].values
     finger_stick = df_CEG['BGM'].values
-    title = " "
 
-    ax, _zone_, zone_index = clarke_error_grid(finger_stick, reference, ax)
+    classify, draw_grid = ERROR_GRIDS[grid]
+    _zone_, zone_codes = classify(finger_stick, reference)
+    if ax is not None:
+        ax, _zone_, zone_index = draw_grid(finger_stick, reference, ax, zone_codes, mode)
+        accuracy = get_accuracy_measures(df_CEG.assign(group=0), by='group', zone_codes=zone_codes)
+        draw_accuracy_summary(ax, accuracy.iloc[0] if len(accuracy) else None)
+    else:
+        zone_index = [np.flatnonzero(zone_codes == k) for k in range(5)]
     zone = _zone_/(0.01*np.sum(_zone_))
     
     return ax, zone, zone_index
 
-def get_glucose_risk(glucose, measure):
-
-    bgi = ((np.log(glucose)**1.084)- 5.381)
-    if measure == 'LBGI':
-        r = min(0, bgi)
+def draw_accuracy_summary(ax, row):
+    """
+    Function to write the accuracy of a set of pairs in the corner of an error grid
+    :param ax: Axes of the error grid
+    :param row: Row of the table returned by get_accuracy_measures (None if there are no pairs)
+    """
+    if row is None or not row['n']:
+        text = 'No paired readings'
     else:
-        r = max(0, bgi)
-    risk = 22.77 *(r**2)
+        text = 'n = {:d}\nMARD {:.1f}%\nMAD {:.1f} mg/dL\nbias {:+.1f} mg/dL'.format(int(row['n']), row['MARD'], row['MAD'], row['bias'])
+    ax.text(0.98, 0.02, text, transform=ax.transAxes, ha='right', va='bottom', fontsize=9,
+            bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+
+def get_classified_pairs(df, window=5, grid='Clarke'):
+    """
+    Function to pair every BGM reading with its CGM reading once and classify the pairs on an error grid
+    :param df: DataFrame containing the data
+    :param window: Each BGM reading is paired with the nearest CGM reading within this many minutes
+    :param grid: Error grid, 'Clarke' or 'Parkes' (type 1)
+    :return: DataFrame of pairs (see pair_measurements) with a uint8 'zone' column (0=A ... 4=E)
+    """
+
+    pairs = pair_measurements(df, window)
+    classify, _ = ERROR_GRIDS[grid]
+    _, pairs['zone'] = classify(pairs['BGM'].values, pairs['CGM'].values)
+
+    return pairs
+
+
+def stratify_zones(pairs, profiles, category):
+    """
+    Function to aggregate classified pairs into accuracy measures and zone percentages for every value of a profile category
+    :param pairs: DataFrame returned by get_classified_pairs
+    :param profiles: DataFrame containing the profiles of the population
+    :param category: Profile column to stratify by
+    :return: DataFrame indexed by category value with n, MAD, MARD (%), bias and the percentage of pairs in each zone
+    """
+
+    labels = pairs['pID'].map(profiles.set_index('pID')[category])
+    counts = pd.crosstab(labels, pairs['zone']).reindex(columns=range(5), fill_value=0)
+    counts = counts.reindex(pd.unique(profiles[category].dropna()), fill_value=0)
+
+    table = 100 * counts.div(counts.sum(axis=1).replace(0, np.nan), axis=0)
+    table.columns = ['Zone ' + label for label in ZONE_LABELS]
+    table.insert(0, 'n', counts.sum(axis=1))
+    labelled = pairs.assign(**{category: labels.values}).dropna(subset=[category])
+    accuracy = get_accuracy_measures(labelled, by=category)[['MAD', 'MARD', 'bias']] if len(labelled) else None
+    for k, column in enumerate(['MAD', 'MARD', 'bias']):
+        table.insert(1 + k, column, accuracy[column].reindex(table.index) if accuracy is not None else np.nan)
+    table.index.name = category
+
+    return table
+
+
+def get_patient_accuracy(pairs, profiles=None, category=None):
+    """
+    Function to get the accuracy measures of every subject from classified pairs
+    :param pairs: DataFrame returned by get_classified_pairs
+    :param profiles: DataFrame containing the profiles of the population, to add the category of every subject
+    :param category: Profile column to add
+    :return: DataFrame indexed by pID with (the category,) n, MAD, MARD (%), bias and the percentage of pairs in each zone
+    """
+
+    table = get_accuracy_measures(pairs, by='pID')
+    if category is not None:
+        table.insert(0, category, table.index.map(profiles.set_index('pID')[category]))
+    return table
+
+
+def compare_measures_stratified(pairs, profiles, category, grid='Clarke', mode='auto', fig=None):
+    """
+    Function to draw one error grid per value of a profile category from pairs classified once
+    :param pairs: DataFrame returned by get_classified_pairs for the same grid
+    :param profiles: DataFrame containing the profiles of the population
+    :param category: Profile column to stratify by
+    :param grid: Error grid, 'Clarke' or 'Parkes' (type 1)
+    :param mode: 'scatter', 'density' or 'auto' (density for large point counts)
+    :param fig: Figure to draw on; if None a new one is created
+    :return: A matplotlib.figure.Figure object and the table returned by stratify_zones, which is also drawn below the grids
+    """
+
+    table = stratify_zones(pairs, profiles, category)
+    labels = pairs['pID'].map(profiles.set_index('pID')[category]).values
+    _, draw_grid = ERROR_GRIDS[grid]
+
+    fig, axs = prepare_figure(fig, figsize=(len(table) * 5, 8), nrows=2, ncols=len(table), squeeze=False,
+                              gridspec_kw={'height_ratios': [6, 1]})
+    for ax, (cat, row) in zip(axs[0], table.iterrows()):
+        subset = pairs[labels == cat]
+        draw_grid(subset['BGM'].values, subset['CGM'].values, ax, subset['zone'].values, mode)
+        ax.set_title('[{cat}] Safe Regions: {per:.1f}%'.format(cat = cat, per = row['Zone A'] + row['Zone B']))
+        draw_accuracy_summary(ax, row)
+
+    # One table across the bottom row with the accuracy of every category
+    gs = axs[1, 0].get_gridspec()
+    for ax in axs[1]:
+        ax.remove()
+    ax_table = fig.add_subplot(gs[1, :])
+    ax_table.axis('off')
+    cells = table.reset_index()
+    cells = [[str(v) if isinstance(v, str) or k == 0 else '{:.1f}'.format(v) for k, v in enumerate(r)] for r in cells.itertuples(index=False)]
+    ax_table.table(cellText=cells, colLabels=[category] + list(table.columns), loc='center', cellLoc='center')
 
-    return risk
+    fig.tight_layout()
+    fig.suptitle(f'{grid} Error Grid stratified by {category}')
+
+    return fig, table
+
+
+GLYCAEMIC_MEASURES = ['SD', 'CV', 'CONGA24', 'GMI', 'j-index', 'MODD', 'eA1c', 'HBGI', 'LBGI', 'ADDR',
+                      'TIR', 'TAR', 'TBR', 'MAGE', 'LBGI Risk Days', 'Hypo Episodes/wk']
+
+# Measures comparing readings a day apart: they have no value within a single day, so days cannot be resampled
+MULTI_DAY_MEASURES = ['CONGA24', 'MODD']
 
 def get_glycaemic_measures(df, measure, max_thresh = 180, min_thresh = 70):
 
@@ -286,62 +725,33 @@ def get_glycaemic_measures(df, measure, max_thresh = 180, min_thresh = 70):
         glycaemic_measure = df['CGM'].std()
     elif measure == 'CV':
         glycaemic_measure = 100*(df['CGM'].std()/df['CGM'].mean())
-    elif measure == 'CONGA24':
-        temp = []
-        for k in range (288, len(df)):
-            conga = abs(df['CGM'][k] - df['CGM'][k-288])
-            temp.append(conga)
-        glycaemic_measure = np.nanstd(np.array(temp))
+    elif measure.startswith('CONGA'):
+        hours = float(measure[len('CONGA'):])
+        glycaemic_measure = get_lag_measures(df, hours=[hours])['CONGA{:g}'.format(hours)]
     elif measure == 'GMI':
         glycaemic_measure = 3.31 + (0.02392 * df['CGM'].mean())
     elif measure == 'j-index':
         glycaemic_measure = 0.001 * (df['CGM'].mean() + df['CGM'].std())**2
     elif measure == 'MODD':
-        temp = []
-        for k in range (288, len(df)):
-            modd = abs(df['CGM'][k] - df['CGM'][k-288])
-            temp.append(modd)
-        glycaemic_measure = np.nanmean(np.array(temp))
+        glycaemic_measure = get_lag_measures(df, hours=[24])['MODD']
     elif measure == 'eA1c':
         glycaemic_measure = (46.7 + df['CGM'].mean())/28.7
     elif measure == 'HBGI' or measure == 'LBGI':
-        temp = []
-        reference = df['CGM'].dropna().values
-        for glucose_value in reference:
-            r_i = get_glucose_risk(glucose_value, measure)
-            if(r_i != 0):
-                temp.append(r_i)
-        glycaemic_measure = np.mean(np.array(temp))
+        risk = get_glucose_risk(df['CGM'].dropna().values, measure)
+        glycaemic_measure = np.mean(risk[risk != 0])
     elif measure == 'ADDR':
-        temp = []
-        start_date = pd.to_datetime(df['Time'][df.index[0]])
-        start_date = start_date.replace(hour=0, minute=0, second=0)
-        end_date = pd.to_datetime(df['Time'][df.index[-1]])
-        NoD = end_date - start_date
-
-        for i in range(0, NoD.days + 1):
-            start_of_day = start_date + datetime.timedelta(days = i)
-            end_of_day = start_date + datetime.timedelta(days = i + 1)
-
-            duration = pd.to_datetime(df['Time'])
-            mask = duration.between(start_of_day, end_of_day)
-            df_day = df[mask].reset_index(drop=True)
-
-            reference = df_day['CGM'].dropna().values
-            r_l, r_h = [], []
-            for glucose_value in reference:
-                hypo_risk = get_glucose_risk(glucose_value, 'LBGI')
-                hyper_risk = get_glucose_risk(glucose_value, 'HBGI')
-
-                r_l.append(hypo_risk)
-                r_h.append(hyper_risk)
-
-            if r_l and r_h:
-                LR = max(r_l)
-                HR = max(r_h)
-                temp.append(LR + HR)
-
-        glycaemic_measure = np.mean(np.array(temp))
+        daily_risk = get_daily_risk(df['Time'], df['CGM'])
+        glycaemic_measure = np.mean(daily_risk['LR'] + daily_risk['HR'])
+    elif measure in ['TIR', 'TAR', 'TBR']:
+        glycaemic_measure = get_range_measures(df['CGM'].values, min_thresh, max_thresh)[measure]
+    elif measure == 'MAGE':
+        glycaemic_measure = get_mage(df['CGM'].values)
+    elif measure == 'LBGI Risk Days':
+        daily_risk = get_daily_risk(df['Time'], df['CGM'])
+        glycaemic_measure = 100 * np.mean(daily_risk['LBGI'] > 2.5)
+    elif measure == 'Hypo Episodes/wk':
+        episodes, days = get_hypo_episodes(df['Time'], df['CGM'])
+        glycaemic_measure = 7 * episodes / days if days else np.nan
     else:
         raise ValueError("Invalid type. Refer to README for valid measures.")
 
@@ -349,41 +759,163 @@ def get_glycaemic_measures(df, measure, max_thresh = 180, min_thresh = 70):
     return glycaemic_measure
 
 
-def compare_glycaemic_measures(df, profiles, pIDs, measure, category, hue=None, start_day=0, end_day=1000):
+def get_glycaemic_table(df, pIDs, measures, start_day=0, end_day=1000, daily=False, n_jobs=1, checkpoint=None):
     """
-    Function to compare the glycaemic measures of a subject with the population
-    :param profiles: DataFrame containing the profiles of the population
-    :param df: DataFrame containing the data of the subjects 
-    :param grouping: Category to group participants 
+    Function to compute several glycaemic measures for every subject in one pass
+    :param df: DataFrame containing the data of the subjects, or a PatientStore read one subject at a time
+    :param pIDs: IDs of the subjects to include
+    :param measures: List of measures (see GLYCAEMIC_MEASURES)
+    :param start_day: First day of each subject's record to include
+    :param end_day: Last day of each subject's record to include
+    :param daily: If True, compute the measures for every calendar day of every subject
+    :param n_jobs: Number of worker processes; subjects are split between them (None: all cores).
+                   With a PatientStore it is capped so every worker's partition fits in the memory budget
+    :param checkpoint: Optional function called before every subject (or batch of subjects with n_jobs > 1);
+                       raise from it to stop early
+    :return: DataFrame with a 'pID' column (and 'day' column if daily) and one column per measure
     """
 
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(pIDs))
+    out_of_core = hasattr(df, 'iter_partitions')
+    if out_of_core:
+        n_jobs = min(n_jobs, df.max_parallel(pIDs))
+    if n_jobs > 1:
+        # A few batches per worker, so the work is balanced and a checkpoint is reached every few subjects
+        chunks = np.array_split(np.asarray(pIDs), min(len(pIDs), 4 * n_jobs))
+        if out_of_core:
+            parts = [df] * len(chunks) # Workers read their own partitions
+        else:
+            parts = [df.loc[df['pID'].isin(chunk), ['Time', 'pID', 'CGM']] for chunk in chunks]
+        args = [(part, chunk, measures, start_day, end_day, daily) for part, chunk in zip(parts, chunks)]
+        return pd.concat(map_checked(get_glycaemic_table, args, n_jobs, checkpoint), ignore_index=True)
+
     complete_gm = []
+    for pID, df_ind in iter_patients(df, pIDs, ['Time', 'pID', 'CGM']):
+        if checkpoint is not None:
+            checkpoint()
+        df_ind = df_ind.assign(Time=pd.to_datetime(df_ind['Time'])).reset_index(drop=True)
 
-    for pID in pIDs:
-        df_ind = df.loc[df['pID'] == pID].reset_index(drop=True)
+        first_day = df_ind['Time'][0].normalize()
+        start_date = first_day + datetime.timedelta(days=start_day)
+        end_date = first_day + datetime.timedelta(days=end_day)
 
-        start_date = pd.to_datetime(df_ind['Time'][0]) + datetime.timedelta(days=start_day)
-        start_date = start_date.replace(hour=0, minute=0, second=0)
-        end_date = pd.to_datetime(df_ind['Time'][0]) + datetime.timedelta(days=end_day)
-        end_date = end_date.replace(hour=0, minute=0, second=0)
+        mask = df_ind['Time'].between(start_date, end_date)
+        df_slice = df_ind[mask].reset_index(drop=True)
 
-        duration = pd.to_datetime(df_ind['Time'])
+        if daily:
+            for day, df_day in df_slice.groupby(df_slice['Time'].dt.normalize()):
+                df_day = df_day.reset_index(drop=True)
+                complete_gm.append([pID, day] + [get_glycaemic_measures(df_day, measure) for measure in measures])
+        else:
+            complete_gm.append([pID] + [get_glycaemic_measures(df_slice, measure) for measure in measures])
 
-        mask = duration.between(start_date, end_date)
-    
-        df_slice = df_ind[mask].reset_index(drop=True)
+    columns = ['pID', 'day'] + measures if daily else ['pID'] + measures
+    table = pd.DataFrame(complete_gm, columns=columns)
 
-        glycaemic_measure = get_glycaemic_measures(df_slice, measure)
+    return table
 
-        complete_gm.append(glycaemic_measure)
 
-    profiles[measure] = complete_gm
+def compare_glycaemic_measures(df, profiles, pIDs, measure, category, hue=None, start_day=0, end_day=1000,
+                               bootstrap=None, n_boot=10000, seed=0, n_jobs=None, table=None, checkpoint=None):
+    """
+    Function to compare the glycaemic measures of a subject with the population
+    :param profiles: DataFrame containing the profiles of the population
+    :param df: DataFrame containing the data of the subjects 
+    :param grouping: Category to group participants 
+    :param bootstrap: None, 'patients' or 'days'. Overlays bootstrap 95% CIs and p-values
+                      (against the first category) resampling patients, or patients and their days
+                      ('days' is not available for MULTI_DAY_MEASURES)
+    :param n_boot: Number of bootstrap resamples
+    :param seed: Seed of the bootstrap streams
+    :param n_jobs: Number of worker processes used by the bootstrap (default: all cores)
+    :param table: Optional precomputed get_glycaemic_table output for the same day range
+    :param checkpoint: Optional function called between subjects and bootstrap chunks; raise from it to stop early
+    """
+
+    if bootstrap == 'days' and measure in MULTI_DAY_MEASURES:
+        raise ValueError("{} compares readings a day apart, so its days cannot be resampled. "
+                         "Use bootstrap='patients'.".format(measure))
+    if table is None or measure not in table:
+        table = get_glycaemic_table(df, pIDs, [measure], start_day, end_day, checkpoint=checkpoint)
+    profiles[measure] = profiles['pID'].map(table.set_index('pID')[measure])
 
+    numeric = profiles[category].dtype == 'int64' or profiles[category].dtype == 'float64'
 
-    if(profiles[category].dtype == 'int64' or profiles[category].dtype == 'float64'):
+    if(numeric):
         sns_plot = sns.lmplot(data=profiles, x=category , y=measure, hue=hue)
     else:
         sns_plot = sns.catplot(data=profiles, kind ='box', x=category, y=measure, hue=hue)
 
+    if bootstrap is not None:
+        if bootstrap == 'days':
+            boot_table = get_glycaemic_table(df, pIDs, [measure], start_day, end_day, daily=True, checkpoint=checkpoint)
+            boot_table[category] = boot_table['pID'].map(profiles.set_index('pID')[category])
+        elif bootstrap == 'patients':
+            boot_table = profiles
+        else:
+            raise ValueError("Invalid bootstrap. Use None, 'patients' or 'days'.")
+
+        if(numeric):
+            result = bootstrap_slope(profiles, category, measure, n_boot, seed=seed, n_jobs=n_jobs, checkpoint=checkpoint)
+            sns_plot.fig.suptitle('Slope {slope:.3g} [95% CI {ci_low:.3g}, {ci_high:.3g}], p = {p_value:.3f}'.format(**result))
+        else:
+            result = bootstrap_groups(boot_table, category, measure, n_boot, resample_days=(bootstrap == 'days'),
+                                      seed=seed, n_jobs=n_jobs, order=pd.unique(profiles[category].dropna()),
+                                      checkpoint=checkpoint)
+            draw_bootstrap_overlay(sns_plot.ax, result)
+        sns_plot.fig.tight_layout()
+
     return sns_plot
-        
\ No newline at end of file
+
+
+def draw_bootstrap_overlay(ax, result):
+    """
+    Function to overlay bootstrap estimates, confidence intervals and p-values on a categorical plot
+    :param ax: Axes of the categorical plot (categories at x = 0, 1, ...)
+    :param result: DataFrame returned by bootstrap_groups
+    """
+    x = np.arange(len(result))
+    yerr = [result['estimate'] - result['ci_low'], result['ci_high'] - result['estimate']]
+    ax.errorbar(x, result['estimate'], yerr=yerr, fmt='D', color='k', capsize=6, zorder=5, label='Bootstrap mean (95% CI)')
+
+    for k, p_value in zip(x[1:], result['p_value'][1:]):
+        ax.annotate('p = {:.3f}'.format(p_value), (k, result['ci_high'].iloc[k]), xytext=(0, 6),
+                    textcoords='offset points', ha='center', fontsize=9)
+    ax.legend(loc='best')
+
+
+def compare_glycaemic_matrix(df, profiles, pIDs, measures=None, categories=None, start_day=0, end_day=1000,
+                             table=None, n_jobs=None, fig=None):
+    """
+    Function to test every glycaemic measure against every profile category in one run
+    :param df: DataFrame containing the data of the subjects
+    :param profiles: DataFrame containing the profiles of the population
+    :param pIDs: IDs of the subjects to include
+    :param measures: Measures to test (default: GLYCAEMIC_MEASURES)
+    :param categories: Profile columns to group by (default: all profile columns except pID)
+    :param table: Optional precomputed get_glycaemic_table output containing the measures
+    :param n_jobs: Number of worker processes (default: all cores)
+    :param fig: Figure to draw on; if None a new one is created
+    :return: A matplotlib.figure.Figure heatmap of the p-values and the significance matrix DataFrame
+    """
+
+    measures = list(measures or GLYCAEMIC_MEASURES)
+    categories = list(categories or list(profiles.columns)[1:])
+    if table is None or not set(measures).issubset(table.columns):
+        table = get_glycaemic_table(df, pIDs, measures, start_day, end_day, n_jobs=n_jobs)
+
+    merged = profiles[['pID'] + categories].merge(table[['pID'] + measures], on='pID')
+    matrix = significance_matrix(merged, measures, categories, n_jobs)
+    p_values = matrix.pivot(index='measure', columns='category', values='p_value').loc[measures, categories]
+
+    sns.set_style("white")
+    fig, ax = prepare_figure(fig, figsize=(2 + 1.6 * len(categories), 1 + 0.45 * len(measures)))
+    sns.heatmap(-np.log10(p_values.astype(float)), annot=p_values.values, fmt='.3f', cmap='rocket_r',
+                cbar_kws={'label': '-log10(p)'}, linewidths=0.5, ax=ax)
+    ax.set_title('Glycaemic measures by category (Kruskal-Wallis / Spearman p-values)')
+    ax.set_xlabel('Category')
+    ax.set_ylabel('Measure')
+    fig.tight_layout()
+
+    return fig, matrix
+
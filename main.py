@@ -1,29 +1,158 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
+from tkinter import messagebox
+import threading
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg') # Figures are rendered off-screen by the plot worker and embedded with FigureCanvasTkAgg
 import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import os # Added for file path operations and existence checks
 import datetime # Added for dummy data generation if parse_dataset is not available
 import numpy as np # Added for dummy data generation if parse_dataset is not available
-import seaborn as sns # Added for compare_glycaemic_measures figure extraction
 
-from libs.visualisation import get_individual_plot, get_daily_glycaemic_variation, get_group_daily_glycaemic_variation, compare_glycaemic_measures, compare_measures
+from libs.lazy import lazy_import
+from libs.visualisation import get_individual_data, draw_individual_plot, get_individual_timeline, get_daily_glycaemic_variation, get_group_daily_glycaemic_variation, compare_glycaemic_measures, compare_glycaemic_matrix, compare_measures, compare_measures_stratified, get_classified_pairs, get_glycaemic_table, get_event_response_plot, GLYCAEMIC_MEASURES, MULTI_DAY_MEASURES
 from src.dataset.parse_dataset import get_pIDs, prepare_data, get_profiles
+from src.dataset.schema import load_dataset, save_dataset
+from src.dataset.segments import build_segment_index, save_segment_index, load_segment_index
+from libs.pyramid import build_pyramid, save_pyramid, load_pyramid
+from libs.events import EventIndex, build_event_table, save_event_table, load_event_table
+from libs.onboard import ONBOARD_COLUMNS, get_on_board, load_on_board
+from libs.plot_cache import PlotCache, get_figure_nbytes
+
+sns = lazy_import('seaborn') # Loaded by the first plot that needs it, not at start-up
+
+# Plot types offered in the plot type box, in display order
+PLOT_TYPES = ["Individual Plot", "Daily Glycaemic Variation", "Group Daily Glycaemic Variation", "Glycaemic Metrics Comparison",
+              "Glycaemic Significance Matrix", "Glycaemic Distribution Comparison", "CEG Analysis Comparison",
+              "Meal/Bolus Response"]
+
+# Plots that need the profiles as well as the glucose data
+PROFILE_PLOTS = ["Group Daily Glycaemic Variation", "Glycaemic Metrics Comparison", "Glycaemic Significance Matrix",
+                 "Glycaemic Distribution Comparison", "CEG Analysis Comparison"]
+
+# Plots whose options list the profile categories, so the profiles are loaded when one is selected
+CATEGORY_PLOTS = PROFILE_PLOTS + ["Meal/Bolus Response"]
 
 # Import visualisation functions
 
 
+class PlotCancelled(Exception):
+    """Raised inside a plot job when it was cancelled or superseded by a newer request."""
+
+
+class DatasetSnapshot:
+    """
+    One version of the loaded glucose and profiles data and everything derived from it. The frames of a snapshot
+    are never modified: loading data replaces the app's snapshot instead, so a plot job keeps a consistent view of
+    the data it started with and whatever it derives is only cached for that version. Derived data that is not
+    passed in is built on first use through the get_ methods, which only the plot worker calls; nothing else
+    assigns to a snapshot once the app has published it.
+    """
+
+    def __init__(self, df=None, profiles=None, glucose_csv_path=None, version=0, segments=None, events=None):
+        self.df = df
+        self.profiles = profiles
+        self.glucose_csv_path = glucose_csv_path # File df was loaded from; derived data is cached beside it
+        self.version = version
+        self.pIDs = list(df['pID'].unique()) if df is not None else []
+        self.metrics_tables = {} # get_glycaemic_table results keyed by (start_day, end_day)
+        self.ceg_pairs = {} # get_classified_pairs results keyed by (window, grid)
+        self.pyramid = None # Multi-resolution aggregates of df for the timeline view
+        self.segments = segments # Valid CGM segments of df (src.dataset.segments)
+        self.events = events # EventIndex of the sleep, exercise and hypo intervals of df (libs.events)
+        self.on_board = None # Insulin and carbs on board of every row of df (libs.onboard)
+
+    def cache_path(self, suffix):
+        return os.path.splitext(self.glucose_csv_path)[0] + suffix
+
+    def get_segments(self):
+        """Loads the valid-segment index saved beside the glucose CSV, rebuilding it if it is missing or older than the CSV."""
+        if self.segments is None:
+            if self.glucose_csv_path:
+                self.segments = load_segment_index(self.cache_path('_segments.pkl'), self.df, self.glucose_csv_path)
+            else:
+                self.segments = build_segment_index(self.df)
+        return self.segments
+
+    def get_events(self):
+        """Loads the event table saved beside the glucose CSV, rebuilding it if it is missing or older than the CSV."""
+        if self.events is None:
+            if self.glucose_csv_path:
+                self.events = EventIndex(load_event_table(self.cache_path('_events.pkl'), self.df, self.glucose_csv_path))
+            else:
+                self.events = EventIndex(build_event_table(self.df))
+        return self.events
+
+    def get_on_board(self):
+        """Loads the IOB/COB traces saved beside the glucose CSV, recomputing them if they are missing or older than the CSV."""
+        if self.on_board is None:
+            if self.glucose_csv_path:
+                self.on_board = load_on_board(self.cache_path('_onboard.pkl'), self.df, self.glucose_csv_path)
+            else:
+                self.on_board = get_on_board(self.df)
+        return self.on_board
+
+    def get_pyramid(self):
+        """Loads the time pyramid saved beside the glucose CSV, rebuilding it if it is missing or older than the CSV."""
+        if self.pyramid is None:
+            pyramid_path = None
+            if self.glucose_csv_path:
+                pyramid_path = self.cache_path('_pyramid.pkl')
+            if pyramid_path and os.path.exists(pyramid_path) and \
+                    os.path.getmtime(pyramid_path) >= os.path.getmtime(self.glucose_csv_path):
+                self.pyramid = load_pyramid(pyramid_path)
+                print(f"Loaded time pyramid from {pyramid_path}")
+            else:
+                self.pyramid = build_pyramid(self.df)
+                if pyramid_path:
+                    try:
+                        save_pyramid(self.pyramid, pyramid_path)
+                        print(f"Built and saved time pyramid to {pyramid_path}")
+                    except OSError as e:
+                        print(f"Could not save time pyramid to {pyramid_path}: {e}")
+        return self.pyramid
+
+    def get_metrics_table(self, start_day, end_day, checkpoint=None):
+        """Returns the per-patient table of all glycaemic measures, computing it once per day range."""
+        key = (start_day, end_day)
+        if key not in self.metrics_tables:
+            self.metrics_tables[key] = get_glycaemic_table(self.df, self.pIDs, GLYCAEMIC_MEASURES, start_day, end_day,
+                                                           n_jobs=None, checkpoint=checkpoint)
+        return self.metrics_tables[key]
+
+    def get_ceg_pairs(self, window, grid):
+        """Returns the BGM/CGM pairs classified on the error grid, computing them once per window and grid."""
+        key = (window, grid)
+        if key not in self.ceg_pairs:
+            self.ceg_pairs[key] = get_classified_pairs(self.df, window, grid)
+        return self.ceg_pairs[key]
+
+
 class GlucoseVisualisationApp:
     def __init__(self, master):
         self.master = master
         master.title("T1DM Glucose Explorer")
 
-        self.df = None
-        self.profiles = None
-        self.pIDs = []
+        # The loaded data is only replaced, never modified, and always under data_lock (see DatasetSnapshot)
+        self.data = DatasetSnapshot()
+        self.data_lock = threading.RLock()
+        self.significance_matrix = None
+        self.plot_cache = PlotCache() # Plot data and rendered figures keyed by (plot type, dataset version, options)
+        self.fig_key = None # Cache key of the figure on the canvas, None if it is not cached
+
+        # Plot jobs run one at a time on a background thread and report back through job_queue
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.job_queue = queue.Queue()
+        self.job_id = 0 # Only results of the latest job are shown
+        self.job_cancel = threading.Event()
 
         # Default dataset name and directory for auto-building
         # self.dataset_name = 'OhioT1DM'
@@ -61,7 +190,7 @@ class GlucoseVisualisationApp:
         # --- Plot Selection and Configuration ---
         ttk.Label(self.plot_frame, text="Select Plot:").grid(row=0, column=0, padx=5, pady=5)
         self.plot_type = ttk.Combobox(self.plot_frame,
-                                      values=["Individual Plot", "Daily Glycaemic Variation", "Group Daily Glycaemic Variation", "Glycaemic Metrics Comparison", "Glycaemic Distribution Comparison", "CEG Analysis Comparison"])
+                                      values=PLOT_TYPES)
         self.plot_type.grid(row=0, column=1, padx=5, pady=5)
         self.plot_type.bind("<<ComboboxSelected>>", self.update_plot_options)
 
@@ -71,83 +200,128 @@ class GlucoseVisualisationApp:
         self.draw_button = ttk.Button(self.plot_frame, text="Draw Plot", command=self.draw_plot)
         self.draw_button.grid(row=2, column=0, columnspan=4, pady=10) # Adjusted columnspan
 
+        self.progress = ttk.Progressbar(self.plot_frame, mode='indeterminate', length=200)
+        self.progress.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
+        self.progress_label = ttk.Label(self.plot_frame, text="")
+        self.progress_label.grid(row=3, column=2, padx=5, pady=5)
+        self.cancel_button = ttk.Button(self.plot_frame, text="Cancel", command=self.cancel_plot, state='disabled')
+        self.cancel_button.grid(row=3, column=3, padx=5, pady=5)
+
         # --- Canvas for Plotting ---
+        # One canvas widget lives for the whole session; new plots swap their figure into it
+        # and individual plots update their artists in place
         self.fig = plt.Figure(figsize=(8, 6)) # Initialize with an empty Figure
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
         self.canvas_widget = self.canvas.get_tk_widget()
         self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.toolbar = None
+        self._attach_toolbar()
+        self.blit_artists = [] # Animated artists drawn over blit_background
+        self.blit_background = None
+        self.individual_artists = None # Artists of the individual plot drawn on self.fig (draw_individual_plot)
 
         self.clear_canvas() # Initialise with empty plot
 
-    def _ensure_data_loaded(self, data_type=None):
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.master.after(100, self._poll_jobs)
+
+    # The current snapshot's frames, for the option widgets on the Tk thread
+    df = property(lambda self: self.data.df)
+    profiles = property(lambda self: self.data.profiles)
+    pIDs = property(lambda self: self.data.pIDs)
+
+    def _set_data(self, **changes):
+        """
+        Replaces the data snapshot with a new version with `changes` (df, profiles and/or glucose_csv_path, plus any
+        segments or events already built for the new df) applied. Everything derived from the previous version is dropped; jobs still using it keep their own snapshot.
+        """
+        with self.data_lock:
+            current = self.data
+            fields = dict(df=current.df, profiles=current.profiles, glucose_csv_path=current.glucose_csv_path)
+            fields.update(changes)
+            self.data = DatasetSnapshot(version=current.version + 1, **fields)
+        self.plot_cache.clear()
+
+    def _ensure_data_loaded(self, data_type=None, dataset_name=None):
         """
         Ensures glucose and/or profiles data is loaded, attempting to build from scratch if files are not found.
+        Plot jobs pass dataset_name so the Tk variable is only read on the main thread.
         """
+        with self.data_lock:
+            self._load_or_build(data_type, dataset_name or self.dataset_name_var.get())
+
+    def _load_or_build(self, data_type, current_dataset_name):
+        """Body of _ensure_data_loaded, run under data_lock."""
         if not os.path.exists(self.dataset_dir):
             os.makedirs(self.dataset_dir)
 
-        current_dataset_name = self.dataset_name_var.get()
-
         if data_type is None or data_type == 'glucose':
             if self.df is None:
                 glucose_csv_path = os.path.join(self.dataset_dir, f'{current_dataset_name}.csv')
                 if os.path.exists(glucose_csv_path):
                     try:
-                        self.df = pd.read_csv(glucose_csv_path)
-                        self.pIDs = list(self.df['pID'].unique())
+                        self._set_data(df=load_dataset(glucose_csv_path), glucose_csv_path=glucose_csv_path)
                         print(f"Loaded glucose data from {glucose_csv_path}")
                     except Exception as e:
-                        tk.messagebox.showwarning("Warning", f"Could not load {glucose_csv_path}: {e}. Attempting to build.")
-                        self._build_glucose_data()
+                        self._notify('showwarning', "Warning", f"Could not load {glucose_csv_path}: {e}. Attempting to build.")
+                        self._build_glucose_data(current_dataset_name)
                 else:
-                    self._build_glucose_data()
+                    self._build_glucose_data(current_dataset_name)
 
         if data_type is None or data_type == 'profiles':
             if self.profiles is None:
                 profiles_csv_path = os.path.join(self.dataset_dir, f'{current_dataset_name}_profile.csv')
                 if os.path.exists(profiles_csv_path):
                     try:
-                        self.profiles = pd.read_csv(profiles_csv_path)
+                        self._set_data(profiles=pd.read_csv(profiles_csv_path))
                         print(f"Loaded profiles data from {profiles_csv_path}")
                     except Exception as e:
-                        tk.messagebox.showwarning("Warning", f"Could not load {profiles_csv_path}: {e}. Attempting to build.")
-                        self._build_profiles_data()
+                        self._notify('showwarning', "Warning", f"Could not load {profiles_csv_path}: {e}. Attempting to build.")
+                        self._build_profiles_data(current_dataset_name)
                 else:
-                    self._build_profiles_data()
+                    self._build_profiles_data(current_dataset_name)
 
-    def _build_glucose_data(self):
-        """Builds glucose data using prepare_data and saves it to CSV."""
+    def _build_glucose_data(self, dataset_name=None):
+        """Builds glucose data using prepare_data and saves it to CSV, with a typed cache beside it."""
         try:
             # get_pIDs might need a real dataset_path depending on its implementation
             # For dummy functions, a placeholder path is fine.
-            current_dataset_name = self.dataset_name_var.get()
+            current_dataset_name = dataset_name or self.dataset_name_var.get()
             dataset_path = './datasets/{}/raw/'.format(current_dataset_name)
             pIDs_for_build = get_pIDs(dataset_path)
-            self.df = prepare_data(dataset_path, pIDs_for_build, True)
-            self.df.to_csv(os.path.join(self.dataset_dir, f'{current_dataset_name}.csv'), index=False)
-            self.pIDs = list(self.df['pID'].unique())
+            df = prepare_data(dataset_path, pIDs_for_build, True)
+            glucose_csv_path = os.path.join(self.dataset_dir, f'{current_dataset_name}.csv')
+            save_dataset(df, glucose_csv_path)
+            # Build the indexes before publishing the snapshot so it is complete when other threads see it
+            cache_prefix = os.path.splitext(glucose_csv_path)[0]
+            segments = build_segment_index(df)
+            save_segment_index(segments, cache_prefix + '_segments.pkl')
+            events = EventIndex(build_event_table(df))
+            save_event_table(events.table, cache_prefix + '_events.pkl')
+            self._set_data(df=df, glucose_csv_path=glucose_csv_path, segments=segments, events=events)
             print(f"Built and saved glucose data to {self.dataset_dir}/{current_dataset_name}.csv")
         except Exception as e:
-            tk.messagebox.showerror("Error", f"Failed to build glucose data: {e}. "
+            self._notify('showerror', "Error", f"Failed to build glucose data: {e}. "
                                      "Please ensure 'src.dataset.parse_dataset' is correctly set up "
                                      "and raw data is accessible if not using dummy functions.")
-            self.df = None # Ensure df is None if building fails
+            self._set_data(df=None, glucose_csv_path=None) # Ensure df is None if building fails
 
-    def _build_profiles_data(self):
+    def _build_profiles_data(self, dataset_name=None):
         """Builds profiles data using get_profiles and saves it to CSV."""
         try:
             # get_profiles might need a real dataset_path depending on its implementation
-            current_dataset_name = self.dataset_name_var.get()
+            current_dataset_name = dataset_name or self.dataset_name_var.get()
             dataset_path = './datasets/{}/raw/'.format(current_dataset_name)
             profiles_df = get_profiles(dataset_path)
             profiles_df.to_csv(os.path.join(self.dataset_dir, f'{current_dataset_name}_profile.csv'), index=False)
-            self.profiles = profiles_df
+            self._set_data(profiles=profiles_df)
             print(f"Built and saved profiles data to {self.dataset_dir}/{current_dataset_name}_profile.csv")
         except Exception as e:
-            tk.messagebox.showerror("Error", f"Failed to build profiles data: {e}. "
+            self._notify('showerror', "Error", f"Failed to build profiles data: {e}. "
                                      "Please ensure 'src.dataset.parse_dataset' is correctly set up "
                                      "and raw data is accessible if not using dummy functions.")
-            self.profiles = None # Ensure profiles is None if building fails
+            self._set_data(profiles=None) # Ensure profiles is None if building fails
 
     def load_glucose_data(self):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
@@ -155,12 +329,13 @@ class GlucoseVisualisationApp:
             self.glucose_file_path.delete(0, tk.END)
             self.glucose_file_path.insert(0, file_path)
             try:
-                self.df = pd.read_csv(file_path)
-                self.pIDs = list(self.df['pID'].unique())
+                # Read outside the lock; only the swap waits for a plot job that is loading data
+                df = load_dataset(file_path)
+                self._set_data(df=df, glucose_csv_path=file_path)
                 print("Glucose data loaded successfully from selected file.")
             except Exception as e:
                 tk.messagebox.showerror("Error", f"Could not load glucose data from selected file: {e}")
-                self.df = None
+                self._set_data(df=None, glucose_csv_path=None)
 
     def load_profiles_data(self):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
@@ -168,18 +343,20 @@ class GlucoseVisualisationApp:
             self.profiles_file_path.delete(0, tk.END)
             self.profiles_file_path.insert(0, file_path)
             try:
-                self.profiles = pd.read_csv(file_path)
+                profiles = pd.read_csv(file_path)
+                self._set_data(profiles=profiles)
                 print("Profiles data loaded successfully from selected file.")
             except Exception as e:
                 tk.messagebox.showerror("Error", f"Could not load profiles data from selected file: {e}")
-                self.profiles = None
+                self._set_data(profiles=None)
 
     def update_plot_options(self, event=None):
+        self.cancel_plot() # A pending plot of the previous type is stale now
         self.clear_plot_options()
         selected_plot = self.plot_type.get()
 
         # Ensure profiles data is loaded if a category-dependent plot is selected
-        if selected_plot in ["Group Daily Glycaemic Variation", "Glycaemic Metrics Comparison", "Glycaemic Distribution Comparison", "CEG Analysis Comparison"]:
+        if selected_plot in CATEGORY_PLOTS:
             self._ensure_data_loaded(data_type='profiles') # Attempt to load/build profiles data
 
         if selected_plot == "Individual Plot":
@@ -190,10 +367,14 @@ class GlucoseVisualisationApp:
             self.add_group_variation_options()
         elif selected_plot == "Glycaemic Metrics Comparison":
             self.add_compare_glycaemic_options()
+        elif selected_plot == "Glycaemic Significance Matrix":
+            self.add_significance_matrix_options()
         elif selected_plot == "Glycaemic Distribution Comparison":
             self.add_compare_glycaemic_distributions()
         elif selected_plot == "CEG Analysis Comparison":
             self.add_compare_measures_options()
+        elif selected_plot == "Meal/Bolus Response":
+            self.add_event_response_options()
 
     def clear_plot_options(self):
         for widget in self.plot_options_frame.winfo_children():
@@ -215,6 +396,15 @@ class GlucoseVisualisationApp:
         self.end_day_entry = ttk.Entry(self.plot_options_frame, textvariable=self.end_day_var)
         self.end_day_entry.grid(row=2, column=1, padx=5, pady=5)
 
+        ttk.Label(self.plot_options_frame, text="View:").grid(row=3, column=0, padx=5, pady=5)
+        self.individual_view_var = tk.StringVar(value="Events")
+        self.individual_view_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.individual_view_var,
+                                                  values=["Events", "Zoomable Timeline"])
+        self.individual_view_combo.grid(row=3, column=1, padx=5, pady=5)
+
+        self.on_board_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.plot_options_frame, text="Insulin/carbs on board", variable=self.on_board_var).grid(row=4, column=1, padx=5, pady=5)
+
     def add_daily_variation_options(self):
         ttk.Label(self.plot_options_frame, text="Select pID:").grid(row=0, column=0, padx=5, pady=5)
         self.daily_pID_var = tk.IntVar(value= self.pIDs[0])
@@ -242,10 +432,10 @@ class GlucoseVisualisationApp:
 
     def add_compare_glycaemic_options(self):
         ttk.Label(self.plot_options_frame, text="Measure:").grid(row=0, column=0, padx=5, pady=5)
-        measures = ['SD', 'CV', 'CONGA24', 'GMI', 'j-index', 'MODD', 'eA1c', 'HBGI', 'LBGI', 'ADDR']
         self.compare_measure_var = tk.StringVar()
-        self.compare_measure_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.compare_measure_var, values=measures)
+        self.compare_measure_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.compare_measure_var, values=GLYCAEMIC_MEASURES)
         self.compare_measure_combo.grid(row=0, column=1, padx=5, pady=5)
+        self.compare_measure_combo.bind("<<ComboboxSelected>>", self.update_bootstrap_options)
 
         ttk.Label(self.plot_options_frame, text="Category:").grid(row=1, column=0, padx=5, pady=5)
         categories = []
@@ -271,6 +461,61 @@ class GlucoseVisualisationApp:
         self.compare_end_day_entry = ttk.Entry(self.plot_options_frame, textvariable=self.compare_end_day_var)
         self.compare_end_day_entry.grid(row=4, column=1, padx=5, pady=5)
 
+        ttk.Label(self.plot_options_frame, text="Bootstrap CI:").grid(row=5, column=0, padx=5, pady=5)
+        self.compare_bootstrap_var = tk.StringVar(value="None")
+        self.compare_bootstrap_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.compare_bootstrap_var, values=["None", "patients", "days"])
+        self.compare_bootstrap_combo.grid(row=5, column=1, padx=5, pady=5)
+
+    def update_bootstrap_options(self, event=None):
+        """Day resampling is only offered for measures that have a value within a single day."""
+        options = ["None", "patients"]
+        if self.compare_measure_var.get() not in MULTI_DAY_MEASURES:
+            options.append("days")
+        self.compare_bootstrap_combo.config(values=options)
+        if self.compare_bootstrap_var.get() not in options:
+            self.compare_bootstrap_var.set("patients")
+
+    def add_significance_matrix_options(self):
+        ttk.Label(self.plot_options_frame, text="Start Day:").grid(row=0, column=0, padx=5, pady=5)
+        self.matrix_start_day_var = tk.IntVar(value=0)
+        self.matrix_start_day_entry = ttk.Entry(self.plot_options_frame, textvariable=self.matrix_start_day_var)
+        self.matrix_start_day_entry.grid(row=0, column=1, padx=5, pady=5)
+
+        ttk.Label(self.plot_options_frame, text="End Day:").grid(row=1, column=0, padx=5, pady=5)
+        self.matrix_end_day_var = tk.IntVar(value=1000)
+        self.matrix_end_day_entry = ttk.Entry(self.plot_options_frame, textvariable=self.matrix_end_day_var)
+        self.matrix_end_day_entry.grid(row=1, column=1, padx=5, pady=5)
+
+        ttk.Button(self.plot_options_frame, text="Export Table", command=self.export_significance_matrix).grid(row=2, column=0, columnspan=2, padx=5, pady=5)
+
+    def add_event_response_options(self):
+        ttk.Label(self.plot_options_frame, text="Event:").grid(row=0, column=0, padx=5, pady=5)
+        self.response_event_var = tk.StringVar(value="CRB")
+        self.response_event_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.response_event_var, values=["CRB", "INS"])
+        self.response_event_combo.grid(row=0, column=1, padx=5, pady=5)
+
+        ttk.Label(self.plot_options_frame, text="Category:").grid(row=1, column=0, padx=5, pady=5)
+        categories = ["None"]
+        if self.profiles is not None:
+          categories += list(self.profiles.columns)[1:]
+        self.response_category_var = tk.StringVar(value="None")
+        self.response_category_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.response_category_var, values=categories)
+        self.response_category_combo.grid(row=1, column=1, padx=5, pady=5)
+
+        ttk.Label(self.plot_options_frame, text="Minutes After:").grid(row=2, column=0, padx=5, pady=5)
+        self.response_after_var = tk.IntVar(value=180)
+        self.response_after_entry = ttk.Entry(self.plot_options_frame, textvariable=self.response_after_var)
+        self.response_after_entry.grid(row=2, column=1, padx=5, pady=5)
+
+    def export_significance_matrix(self):
+        if self.significance_matrix is None:
+            tk.messagebox.showerror("Error", "Draw the significance matrix before exporting it.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+        if file_path:
+            self.significance_matrix.to_csv(file_path, index=False)
+            print(f"Saved significance matrix to {file_path}")
+
     def add_compare_glycaemic_distributions(self):
         ttk.Label(self.plot_options_frame, text="Category:").grid(row=0, column=0, padx=5, pady=5)
         categories = []
@@ -289,157 +534,375 @@ class GlucoseVisualisationApp:
         self.clarke_category_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.clarke_category_var, values=categories)
         self.clarke_category_combo.grid(row=0, column=1, padx=5, pady=5)
 
-    def draw_plot(self):
-        self.clear_canvas() # Clear the existing plot before drawing a new one
+        ttk.Label(self.plot_options_frame, text="Pairing Window (min):").grid(row=1, column=0, padx=5, pady=5)
+        self.clarke_window_var = tk.IntVar(value=5)
+        self.clarke_window_entry = ttk.Entry(self.plot_options_frame, textvariable=self.clarke_window_var)
+        self.clarke_window_entry.grid(row=1, column=1, padx=5, pady=5)
+
+        ttk.Label(self.plot_options_frame, text="Error Grid:").grid(row=2, column=0, padx=5, pady=5)
+        self.clarke_grid_var = tk.StringVar(value="Clarke")
+        self.clarke_grid_combo = ttk.Combobox(self.plot_options_frame, textvariable=self.clarke_grid_var, values=["Clarke", "Parkes"])
+        self.clarke_grid_combo.grid(row=2, column=1, padx=5, pady=5)
 
-        # Ensure data is loaded or attempt to build it before plotting
-        self._ensure_data_loaded(data_type='glucose')
+    def draw_plot(self):
+        """Reads the plot options on the Tk thread and submits the plot job to the background worker."""
         selected_plot = self.plot_type.get()
+        try:
+            params = self._read_plot_params(selected_plot)
+        except (ValueError, tk.TclError) as e:
+            tk.messagebox.showerror("Input Error", str(e))
+            return
 
-        if selected_plot in ["Group Daily Glycaemic Variation", "Glycaemic Metrics Comparison", "Glycaemic Distribution Comparison", "CEG Analysis Comparison"]:
-            self._ensure_data_loaded(data_type='profiles')
+        # Supersede any running or queued job; its result is dropped when it arrives
+        self.job_cancel.set()
+        self.job_id += 1
+        self.job_cancel = threading.Event()
 
-        if self.df is None:
-            tk.messagebox.showerror("Error", "Glucose data is not available. Please load or build it.")
-            return
-        if selected_plot in ["Group Daily Glycaemic Variation", "Glycaemic Metrics Comparison", "Glycaemic Distribution Comparison", "CEG Analysis Comparison"] and self.profiles is None:
-            tk.messagebox.showerror("Error", "Profiles data is not available for this plot type. Please load or build it.")
+        key = (selected_plot, self.data.version, tuple(sorted(params.items())))
+        cached = self.plot_cache.get(key)
+        if cached is not None:
+            self._finish_job("")
+            self._show_result(key, cached)
             return
 
-        new_fig = None # Variable to hold the Figure object returned by plotting functions
+        self.worker.submit(self._run_plot_job, self.job_id, self.job_cancel, key, selected_plot, params)
+
+        self.progress_label.config(text="Queued...")
+        self.progress.start(10)
+        self.cancel_button.state(['!disabled'])
+
+    def cancel_plot(self):
+        """Cancels the current plot job. Work already running stops at its next checkpoint."""
+        self.job_cancel.set()
+        self.job_id += 1
+        self._finish_job("" if self.cancel_button.instate(['disabled']) else "Cancelled")
+
+    def _finish_job(self, text):
+        self.progress.stop()
+        self.progress_label.config(text=text)
+        self.cancel_button.state(['disabled'])
+
+    def _read_plot_params(self, selected_plot):
+        """Collects the options of the selected plot from the Tk variables (main thread only)."""
+        params = {'dataset': self.dataset_name_var.get()}
+
+        if selected_plot in ["Individual Plot", "Daily Glycaemic Variation"]:
+            entry = self.pID_entry if selected_plot == "Individual Plot" else self.daily_pID_entry
+            pID_str = entry.get()
+            try:
+                params['pID'] = int(pID_str) # Convert pID to integer
+            except ValueError:
+                raise ValueError(f"Invalid pID: '{pID_str}'. Please select a valid patient ID.")
+
+        if selected_plot == "Individual Plot":
+            params.update(start_day=self.start_day_var.get(), end_day=self.end_day_var.get(),
+                          view=self.individual_view_var.get(), width=max(self.canvas_widget.winfo_width(), 800),
+                          on_board=self.on_board_var.get())
+        elif selected_plot == "Daily Glycaemic Variation":
+            params.update(interval_type=self.interval_type_var.get())
+        elif selected_plot == "Group Daily Glycaemic Variation":
+            params.update(category=self.group_category_var.get(), interval_type=self.group_interval_type_var.get())
+        elif selected_plot == "Glycaemic Metrics Comparison":
+            hue = self.compare_hue_var.get()
+            bootstrap = self.compare_bootstrap_var.get()
+            params.update(measure=self.compare_measure_var.get(), category=self.compare_category_var.get(),
+                          hue=None if hue == "None" else hue,
+                          start_day=self.compare_start_day_var.get(), end_day=self.compare_end_day_var.get(),
+                          bootstrap=None if bootstrap == "None" else bootstrap)
+        elif selected_plot == "Glycaemic Significance Matrix":
+            params.update(start_day=self.matrix_start_day_var.get(), end_day=self.matrix_end_day_var.get())
+        elif selected_plot == "Glycaemic Distribution Comparison":
+            params.update(category=self.hist_category_var.get())
+        elif selected_plot == "CEG Analysis Comparison":
+            params.update(category=self.clarke_category_var.get(), window=self.clarke_window_var.get(),
+                          grid=self.clarke_grid_var.get())
+        elif selected_plot == "Meal/Bolus Response":
+            category = self.response_category_var.get()
+            params.update(event=self.response_event_var.get(), category=None if category == "None" else category,
+                          after=self.response_after_var.get())
+
+        return params
 
+    def _run_plot_job(self, job_id, cancel, key, selected_plot, params):
+        """
+        Worker thread: loads data, computes and renders the figure off-screen, then hands it to the Tk thread.
+        The job works on the data snapshot taken once the data is loaded, and the long computations call
+        checkpoint so a cancelled or superseded job stops early.
+        """
+        def checkpoint():
+            if cancel.is_set():
+                raise PlotCancelled()
+
+        def progress(text):
+            checkpoint()
+            self.job_queue.put((job_id, 'progress', text))
+
+        new_fig = None
         try:
-            if selected_plot == "Individual Plot":
-                pID_str = self.pID_entry.get()
-                try:
-                    pID = int(pID_str) # Convert pID to integer
-                except ValueError:
-                    tk.messagebox.showerror("Input Error", f"Invalid pID: '{pID_str}'. Please select a valid patient ID.")
-                    return
-                start_day = self.start_day_var.get()
-                end_day = self.end_day_var.get()
-                current_dataset_name = self.dataset_name_var.get()
-
-                # Assumes get_individual_plot returns a Figure object
-                new_fig = get_individual_plot(self.df, current_dataset_name, pID, start_day, end_day)
-
-
-            elif selected_plot == "Daily Glycaemic Variation":
-                pID_str = self.daily_pID_entry.get()
-                try:
-                    pID = int(pID_str) # Convert pID to integer
-                except ValueError:
-                    tk.messagebox.showerror("Input Error", f"Invalid pID: '{pID_str}'. Please select a valid patient ID.")
-                    return
-                interval_type = self.interval_type_var.get()
-                current_dataset_name = self.dataset_name_var.get()
-                # Assumes get_daily_glycaemic_variation returns a Figure object
-
-                new_fig = get_daily_glycaemic_variation(self.df, current_dataset_name, pID, interval_type)
-
-            elif selected_plot == "Group Daily Glycaemic Variation":
-                category = self.group_category_var.get()
-                interval_type = self.group_interval_type_var.get()
-                # Assumes get_group_daily_glycaemic_variation returns a Figure object
-                new_fig = get_group_daily_glycaemic_variation(self.df, self.profiles, category, interval_type)
-
-            elif selected_plot == "Glycaemic Metrics Comparison":
-                measure = self.compare_measure_var.get()
-                category = self.compare_category_var.get()
-                hue = self.compare_hue_var.get()
-                start_day = self.compare_start_day_var.get()
-                end_day = self.compare_end_day_var.get()
-                if hue == "None":
-                    hue = None
-                pIDs_for_comparison = list(self.df['pID'].unique())
-                # Assumes compare_glycaemic_measures returns a seaborn FacetGrid/Axes object,
-                # from which we can extract the Figure.
-                sns_plot_object = compare_glycaemic_measures(self.df, self.profiles.copy(), pIDs_for_comparison, measure, category, hue, start_day, end_day)
-                if hasattr(sns_plot_object, 'fig'):
-                    new_fig = sns_plot_object.fig
-                elif hasattr(sns_plot_object, 'figure'): # For some seaborn functions, it might be 'figure'
-                    new_fig = sns_plot_object.figure
-                else:
-                    tk.messagebox.showerror("Error", "Could not extract Figure from seaborn plot object.")
-                    return
-                
-            elif selected_plot == "Glycaemic Distribution Comparison":
-                category = self.hist_category_var.get()
-                cat_array = self.profiles.copy()[category].unique()
-                df_group = self.df
-                for cat in cat_array:
-                    mask = self.profiles[category] == cat
-                    inc  = self.profiles.loc[mask, 'pID']
-                    select_pIDs = inc.unique()
-
-                    df_group.loc[df_group['pID'].isin(select_pIDs), category] = cat
-
-                sns_plot_object = sns.histplot(data=df_group, x='CGM' ,bins=30, stat = 'density', hue=category, kde=True, legend=True, common_norm=False)
-
-                if hasattr(sns_plot_object, 'fig'):
-                    new_fig = sns_plot_object.fig
-                elif hasattr(sns_plot_object, 'figure'): # For some seaborn functions, it might be 'figure'
-                    new_fig = sns_plot_object.figure
-                else:
-                    tk.messagebox.showerror("Error", "Could not extract Figure from seaborn plot object.")
-                    return
-
-
-            elif selected_plot == "CEG Analysis Comparison":
-                category = self.clarke_category_var.get()
-                cat_array = self.profiles.copy()[category].unique()
-
-                new_fig, axs = plt.subplots(ncols= len(cat_array), figsize = (len(cat_array) * 5,6))
-
-                for ax, cat in zip(axs, cat_array):
-                    mask = self.profiles[category] == cat
-                    inc  = self.profiles.loc[mask, 'pID']
-                    select_pIDs = inc.unique()
-                    # Assumes compare_measures returns a Figure object (and potentially other data)
-                    ax, zone, zone_index = compare_measures(self.df, select_pIDs, ax)
-                    ax.set_title('[{cat}] Safe Regions: {per:.1f}%'.format(cat = cat, per = zone[0] + zone[1]))
-
-                new_fig.tight_layout()
-                new_fig.suptitle(f'Clarke Error Grid stratified by {category}')
-                   
-            if new_fig:
-                # Destroy the old canvas widget
-                if self.canvas_widget:
-                    self.canvas_widget.destroy()
-                # Only close the figure if it's a valid matplotlib Figure object
-                if hasattr(self, 'fig') and isinstance(self.fig, plt.Figure):
-                    plt.close(self.fig) # Close the old matplotlib figure to free memory
-
-                # Create a new canvas widget with the new figure
-                self.fig = new_fig # Update the instance's figure reference
-                self.canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
-                self.canvas.draw()
-                self.canvas_widget = self.canvas.get_tk_widget()
-                self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+            progress("Loading data...")
+            with self.data_lock:
+                self._ensure_data_loaded(data_type='glucose', dataset_name=params['dataset'])
+                if selected_plot in PROFILE_PLOTS or params.get('category') is not None:
+                    self._ensure_data_loaded(data_type='profiles', dataset_name=params['dataset'])
+                data = self.data
+            # Cache the result under the version it was computed from, which the load may have changed
+            key = (key[0], data.version, key[2])
+            result = {}
+            new_fig = self._make_figure(selected_plot, params, data, result, progress, checkpoint)
+            if isinstance(new_fig, Figure):
+                progress("Rendering...")
+                new_fig.canvas.draw()
+            progress("Done")
+            result['plot'] = new_fig
+            self.job_queue.put((job_id, 'done', (key, result)))
+        except PlotCancelled:
+            if new_fig is not None:
+                plt.close(new_fig)
+        except Exception as e:
+            if new_fig is not None:
+                plt.close(new_fig)
+            self.job_queue.put((job_id, 'error', f"An error occurred during plotting: {e}"))
+
+    def _make_figure(self, selected_plot, params, data, result, progress, checkpoint):
+        """
+        Builds the Figure of the selected plot from a data snapshot. Runs on the worker thread and must not touch Tk
+        or the app's data; other outputs of the plot (the significance matrix) are stored in result.
+        The individual plot only prepares its data here and returns a function that draws it
+        on the displayed figure, so the Tk thread can update the artists in place.
+        """
+        df, profiles = data.df, data.profiles
+        if df is None:
+            raise ValueError("Glucose data is not available. Please load or build it.")
+        if selected_plot in PROFILE_PLOTS and profiles is None:
+            raise ValueError("Profiles data is not available for this plot type. Please load or build it.")
+
+        progress("Computing...")
+        new_fig = None # Variable to hold the Figure object returned by plotting functions
+
+        if selected_plot == "Individual Plot":
+            if params['view'] == "Zoomable Timeline":
+                new_fig = get_individual_timeline(data.get_pyramid(), params['pID'], params['start_day'], params['end_day'],
+                                                  fig=self._new_figure(), events=data.get_events())
             else:
-                tk.messagebox.showerror("Error", "Plot generation failed or no figure was returned.")
+                data = get_individual_data(df, params['dataset'], params['pID'], params['start_day'], params['end_day'],
+                                           max_points=2 * params['width'], events=data.get_events(),
+                                           on_board=data.get_on_board() if params['on_board'] else None,
+                                           segments=data.get_segments())
+                new_fig = functools.partial(draw_individual_plot, data, params['dataset'], params['pID'])
 
-        except Exception as e:
-            tk.messagebox.showerror("Plotting Error", f"An error occurred during plotting: {e}")
-            self.clear_canvas() # Clear canvas on error
+        elif selected_plot == "Daily Glycaemic Variation":
+            # Assumes get_daily_glycaemic_variation returns a Figure object
+            new_fig = get_daily_glycaemic_variation(df, params['dataset'], params['pID'], params['interval_type'],
+                                                    fig=self._new_figure())
+
+        elif selected_plot == "Group Daily Glycaemic Variation":
+            # Assumes get_group_daily_glycaemic_variation returns a Figure object
+            new_fig = get_group_daily_glycaemic_variation(df, profiles, params['category'], params['interval_type'],
+                                                          fig=self._new_figure())
+
+        elif selected_plot == "Glycaemic Metrics Comparison":
+            start_day, end_day = params['start_day'], params['end_day']
+            pIDs_for_comparison = data.pIDs
+            # Assumes compare_glycaemic_measures returns a seaborn FacetGrid/Axes object,
+            # from which we can extract the Figure.
+            sns_plot_object = compare_glycaemic_measures(df, profiles.copy(), pIDs_for_comparison, params['measure'], params['category'], params['hue'], start_day, end_day, bootstrap=params['bootstrap'],
+                                                         table=data.metrics_tables.get((start_day, end_day)),
+                                                         checkpoint=checkpoint)
+            if hasattr(sns_plot_object, 'fig'):
+                new_fig = sns_plot_object.fig
+            elif hasattr(sns_plot_object, 'figure'): # For some seaborn functions, it might be 'figure'
+                new_fig = sns_plot_object.figure
+            else:
+                raise ValueError("Could not extract Figure from seaborn plot object.")
+
+        elif selected_plot == "Glycaemic Significance Matrix":
+            table = data.get_metrics_table(params['start_day'], params['end_day'], checkpoint)
+            progress("Testing...")
+            new_fig, result['significance_matrix'] = compare_glycaemic_matrix(df, profiles.copy(), list(table['pID']), table=table,
+                                                                         fig=self._new_figure())
+
+        elif selected_plot == "Glycaemic Distribution Comparison":
+            category = params['category']
+            # A frame of our own with the category of every reading; the snapshot's frames are never modified
+            df_group = df[['pID', 'CGM']].assign(**{category: df['pID'].map(profiles.set_index('pID')[category])})
+
+            # Draw on a figure of our own rather than pyplot's current axes, which the worker does not own
+            new_fig = self._new_figure()
+            ax = new_fig.add_subplot(111)
+            sns.histplot(data=df_group, x='CGM' ,bins=30, stat = 'density', hue=category, kde=True, legend=True, common_norm=False, ax=ax)
+
+        elif selected_plot == "CEG Analysis Comparison":
+            pairs = data.get_ceg_pairs(params['window'], params['grid'])
+            progress("Stratifying...")
+            new_fig, _ = compare_measures_stratified(pairs, profiles, params['category'], params['grid'],
+                                                     fig=self._new_figure())
+
+        elif selected_plot == "Meal/Bolus Response":
+            if params['category'] is not None:
+                if profiles is None:
+                    raise ValueError("Profiles data is not available to group by category. Please load or build it.")
+            new_fig, _ = get_event_response_plot(df, profiles, params['event'], params['category'],
+                                                 after=params['after'], fig=self._new_figure())
+
+        if not new_fig:
+            raise ValueError("Plot generation failed or no figure was returned.")
+        return new_fig
+
+    @staticmethod
+    def _new_figure():
+        """An off-screen figure for the worker; it is not registered with pyplot and is swapped into the canvas later."""
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        return fig
+
+    def _poll_jobs(self):
+        """Handles messages from the plot worker on the Tk thread; results of superseded jobs are discarded."""
+        try:
+            while True:
+                job_id, kind, payload = self.job_queue.get_nowait()
+                if job_id is None: # Message box requested by the data loaders
+                    getattr(tk.messagebox, kind)(*payload)
+                elif job_id != self.job_id:
+                    if kind == 'done' and isinstance(payload[1]['plot'], Figure):
+                        plt.close(payload[1]['plot'])
+                elif kind == 'progress':
+                    self.progress_label.config(text=payload)
+                elif kind == 'done':
+                    self._finish_job("")
+                    self._show_result(*payload)
+                elif kind == 'error':
+                    self._finish_job("Failed")
+                    tk.messagebox.showerror("Plotting Error", payload)
+                    self.clear_canvas() # Clear canvas on error
+        except queue.Empty:
+            pass
+        self.master.after(100, self._poll_jobs)
+
+    def _notify(self, kind, title, message):
+        """Shows a message box, deferring it to the Tk thread when called from the plot worker."""
+        if threading.current_thread() is threading.main_thread():
+            getattr(tk.messagebox, kind)(title, message)
+        else:
+            self.job_queue.put((None, kind, (title, message)))
+
+    def _show_result(self, key, result):
+        """Displays a plot job result (computed now or taken from the cache) and caches it."""
+        if 'significance_matrix' in result:
+            self.significance_matrix = result['significance_matrix']
+
+        if isinstance(result['plot'], Figure):
+            self._show_figure(result['plot'], key, result.get('bitmap'))
+            # Keep the rendered bitmap so showing the figure again needs no redraw
+            result['bitmap'] = self.blit_background
+            nbytes = get_figure_nbytes(result['plot'])
+        else:
+            self._update_figure(result['plot'])
+            nbytes = None
+
+        for evicted in self.plot_cache.put(key, result, nbytes):
+            if isinstance(evicted['plot'], Figure) and evicted['plot'] is not self.fig:
+                plt.close(evicted['plot'])
+
+    def _swap_figure(self, new_fig, key=None):
+        """Attaches another figure to the existing Tk canvas without drawing it."""
+        if new_fig is self.fig:
+            return
+        cached = self.plot_cache.get(self.fig_key) if self.fig_key is not None else None
+        if cached is not None:
+            # The figure stays in the cache; remember its latest look (e.g. after zooming)
+            cached['bitmap'] = self.blit_background
+        elif isinstance(self.fig, plt.Figure):
+            plt.close(self.fig) # Close the old matplotlib figure to free memory
+        self.fig = new_fig # Update the instance's figure reference
+        self.fig_key = key
+        self.canvas.figure = new_fig
+        new_fig.set_canvas(self.canvas)
+        width, height = self.canvas_widget.winfo_width(), self.canvas_widget.winfo_height()
+        if width > 1 and height > 1:
+            new_fig.set_size_inches(width / new_fig.dpi, height / new_fig.dpi, forward=False)
+        # Canvas callbacks are stored on the figure, so reconnect them for the new one
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self._attach_toolbar()
+        self.blit_artists = []
+        self.blit_background = None
+        self.individual_artists = None
+
+    def _show_figure(self, new_fig, key=None, bitmap=None):
+        """
+        Swaps a figure into the existing Tk canvas. A bitmap rendered earlier at the same
+        canvas size is blitted directly instead of redrawing the figure.
+        """
+        self._swap_figure(new_fig, key)
+        extents = tuple(int(v) for v in new_fig.bbox.extents)
+        if bitmap is not None and tuple(bitmap.get_extents()) == extents:
+            self.canvas.get_renderer()
+            self.canvas.restore_region(bitmap)
+            self.canvas.blit()
+            self.blit_background = bitmap
+        else:
+            self.canvas.draw()
+
+    def _update_figure(self, draw):
+        """
+        Runs a drawing function on the displayed figure. When it updates the artists of an individual
+        plot in place and the axes limits do not change, only those artists are blitted.
+        """
+        if self.fig_key is not None:
+            # Never draw over a figure that is kept in the cache
+            self._swap_figure(self._new_figure())
+        axes = list(self.fig.axes)
+        limits = [(ax.get_xlim(), ax.get_ylim()) for ax in axes]
+        _, artists = draw(fig=self.fig, artists=self.individual_artists)
+        self.individual_artists = artists
+        self.blit_artists = artists['events'] + [artists[name] for name in ['CGM', 'BGM', 'CRB', 'INS'] + ONBOARD_COLUMNS if name in artists] \
+            + [artists['axes'][0].title]
+        for artist in self.blit_artists:
+            artist.set_animated(True)
+
+        if axes == list(self.fig.axes) and limits == [(ax.get_xlim(), ax.get_ylim()) for ax in axes] \
+                and self.blit_background is not None:
+            self.canvas.restore_region(self.blit_background)
+            for artist in self.blit_artists:
+                self.fig.draw_artist(artist)
+            self.canvas.blit(self.fig.bbox)
+        else:
+            if axes != list(self.fig.axes):
+                self.toolbar.update() # Forget zoom history of the replaced axes
+            self.canvas.draw()
+
+    def _on_draw(self, event):
+        """Keeps the background for blitting after every full draw and draws the animated artists on top."""
+        if event.canvas is self.canvas:
+            self.blit_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        # Also runs when the figure is saved, so the animated artists are not missing from the file
+        for artist in self.blit_artists:
+            artist.draw(event.renderer)
+
+    def on_close(self):
+        self.job_cancel.set()
+        self.worker.shutdown(wait=False, cancel_futures=True)
+        self.master.destroy()
 
     def clear_canvas(self):
-        """Clears the current canvas and replaces it with an empty plot."""
-        if self.canvas_widget:
-            self.canvas_widget.destroy()
-        # Only attempt to close if self.fig is actually a Figure object
-        if hasattr(self, 'fig') and isinstance(self.fig, plt.Figure):
-            plt.close(self.fig) # Close the previous figure to free memory
-
-        self.fig = plt.Figure(figsize=(8, 6)) # Create a new empty figure
+        """Clears the current figure and shows an empty plot on the existing canvas."""
+        if self.fig_key is not None:
+            self._swap_figure(self._new_figure()) # Keep the cached figure intact
+        self.blit_artists = []
+        self.individual_artists = None
+        self.fig.clear()
         self.ax = self.fig.add_subplot(111) # Add an axes to it
         self.ax.set_xlabel("")
         self.ax.set_ylabel("")
         self.ax.set_title("Load data and select plot type")
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
-        self.canvas.draw()
-        self.canvas_widget = self.canvas.get_tk_widget()
-        self.canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.canvas.draw_idle()
+
+    def _attach_toolbar(self):
+        """Replaces the zoom/pan toolbar with one bound to the current canvas."""
+        if self.toolbar:
+            self.toolbar.destroy()
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.canvas_frame, pack_toolbar=False)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X, before=self.canvas_widget)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg') # Headless: figures are only written to files
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from libs.visualisation import get_individual_plot, get_daily_glycaemic_variation, get_group_daily_glycaemic_variation, compare_glycaemic_measures, compare_measures_stratified, get_classified_pairs, stratify_zones, get_patient_accuracy, get_glycaemic_table, GLYCAEMIC_MEASURES
+from src.dataset.schema import load_dataset
+
+PLOT_TYPES = ['individual', 'daily_variation', 'group_variation', 'metric_comparison', 'ceg']
+
+DEFAULT_SPEC = {
+    'formats': ['png'],
+    'dpi': 100,
+    'plots': [{'type': plot_type} for plot_type in PLOT_TYPES],
+}
+
+# Dataset shared by the worker processes. It is set once per worker by _init_worker: with the
+# 'fork' start method the parent's frames are inherited copy-on-write instead of being pickled
+_shared = {}
+
+
+def load_spec(path=None):
+    """
+    Reads a report spec from a JSON (or, with PyYAML installed, YAML) file.
+    Args: path (str): Spec file, None for DEFAULT_SPEC (every plot type for every patient and category).
+    Returns: spec (dict): {'formats': [...], 'dpi': int, 'plots': [{'type': ..., options}, ...]}
+    """
+    if path is None:
+        return DEFAULT_SPEC
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    spec = {**DEFAULT_SPEC, **spec}
+    for entry in spec['plots']:
+        if entry.get('type') not in PLOT_TYPES:
+            raise ValueError("Unknown plot type: {}. Use one of {}".format(entry.get('type'), PLOT_TYPES))
+    return spec
+
+
+def _select(value, available):
+    return list(available) if value in (None, 'all') else list(value)
+
+
+def expand_spec(spec, pIDs, categories):
+    """
+    Expands the spec into one task per figure.
+    Names that several spec entries would share (e.g. two entries of one type with different options)
+    get the position of their entry appended, so every figure is written to its own file.
+    Args: spec (dict): Report spec.
+          pIDs (list): Patients in the dataset.
+          categories (list): Profile columns.
+    Returns: tasks (list): Dictionaries with the plot type, its options and the output name.
+    """
+    tasks, entries = [], []
+    for position, entry in enumerate(spec['plots']):
+        count = len(tasks)
+        plot_type = entry['type']
+        options = {k: v for k, v in entry.items() if k not in ('type', 'pIDs', 'categories', 'measures')}
+        if plot_type in ('individual', 'daily_variation'):
+            for pID in _select(entry.get('pIDs'), pIDs):
+                tasks.append({'type': plot_type, 'pID': pID, **options, 'name': f'{plot_type}_{pID}'})
+        elif plot_type == 'metric_comparison':
+            for measure in _select(entry.get('measures'), GLYCAEMIC_MEASURES):
+                for category in _select(entry.get('categories'), categories):
+                    tasks.append({'type': plot_type, 'measure': measure, 'category': category, **options,
+                                  'name': f'{plot_type}_{measure}_{category}'})
+        else:
+            for category in _select(entry.get('categories'), categories):
+                tasks.append({'type': plot_type, 'category': category, **options, 'name': f'{plot_type}_{category}'})
+        entries += [position] * (len(tasks) - count)
+
+    names = [re.sub(r'[^A-Za-z0-9_.-]+', '-', task['name']).strip('-') for task in tasks]
+    counts = Counter(names)
+    for task, name, position in zip(tasks, names, entries):
+        task['name'] = f'{name}_{position}' if counts[name] > 1 else name
+    return tasks
+
+
+def _init_worker(df, profiles, dataset, tables, pairs):
+    _shared.update(df=df, profiles=profiles, dataset=dataset, tables=tables, pairs=pairs)
+
+
+def _make_figure(task):
+    """Draws the figure of one task from the shared dataset."""
+    df, profiles, dataset = _shared['df'], _shared['profiles'], _shared['dataset']
+    plot_type = task['type']
+
+    if plot_type == 'individual':
+        return get_individual_plot(df, dataset, task['pID'], task.get('start_day', 0), task.get('end_day', 1000))
+    if plot_type == 'daily_variation':
+        return get_daily_glycaemic_variation(df, dataset, task['pID'], task.get('interval', 'sparse'))
+    if plot_type == 'group_variation':
+        return get_group_daily_glycaemic_variation(df, profiles, task['category'], task.get('interval', 'sparse'))
+    if plot_type == 'metric_comparison':
+        key = (task.get('start_day', 0), task.get('end_day', 1000))
+        grid = compare_glycaemic_measures(df, profiles.copy(), list(df['pID'].unique()), task['measure'], task['category'],
+                                          task.get('hue'), *key, bootstrap=task.get('bootstrap'), n_jobs=1,
+                                          table=_shared['tables'].get(key))
+        return grid.fig
+    if plot_type == 'ceg':
+        key = (task.get('window', 5), task.get('grid', 'Clarke'))
+        fig, _ = compare_measures_stratified(_shared['pairs'][key], profiles, task['category'], key[1])
+        return fig
+    raise ValueError("Unknown plot type: {}".format(plot_type))
+
+
+def _make_tables(task):
+    """Tables written next to the figure of one task, as {file suffix: DataFrame}."""
+    if task['type'] == 'ceg':
+        key = (task.get('window', 5), task.get('grid', 'Clarke'))
+        pairs, profiles = _shared['pairs'][key], _shared['profiles']
+        return {'accuracy': stratify_zones(pairs, profiles, task['category']),
+                'patient_accuracy': get_patient_accuracy(pairs, profiles, task['category'])}
+    return {}
+
+
+def _render_task(task, out_dir, formats, dpi):
+    """Worker: renders one figure and writes it in every format. Errors are reported, not raised."""
+    start = time.perf_counter()
+    result = {**task, 'files': [], 'error': None}
+    try:
+        fig = _make_figure(task)
+        folder = os.path.join(out_dir, task['type'])
+        os.makedirs(folder, exist_ok=True)
+        for fmt in formats:
+            path = os.path.join(folder, f"{task['name']}.{fmt}")
+            fig.savefig(path, dpi=dpi, bbox_inches='tight')
+            result['files'].append(os.path.relpath(path, out_dir))
+        plt.close(fig)
+        for suffix, table in _make_tables(task).items():
+            path = os.path.join(folder, f"{task['name']}.{suffix}.csv")
+            table.to_csv(path)
+            result['files'].append(os.path.relpath(path, out_dir))
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def write_index(results, out_dir, dataset):
+    """Writes index.json and a browsable index.html listing every figure, grouped by plot type."""
+    with open(os.path.join(out_dir, 'index.json'), 'w') as f:
+        json.dump({'dataset': dataset, 'figures': results}, f, indent=2, default=str)
+
+    lines = [f'<html><head><meta charset="utf-8"><title>{dataset} report</title></head><body>',
+             f'<h1>{dataset} report</h1>']
+    for plot_type in PLOT_TYPES:
+        group = [r for r in results if r['type'] == plot_type]
+        if not group:
+            continue
+        lines.append(f'<h2>{plot_type}</h2>')
+        for r in group:
+            if r['error']:
+                lines.append(f"<p><b>{r['name']}</b>: failed ({r['error']})</p>")
+                continue
+            links = ' '.join(f'<a href="{path}">{os.path.basename(path)[len(r["name"]) + 1:]}</a>' for path in r['files'])
+            lines.append(f"<h3>{r['name']}</h3><p>{links}</p>")
+            png = [path for path in r['files'] if path.endswith('.png')]
+            if png:
+                lines.append(f'<img src="{png[0]}" style="max-width: 100%">')
+    lines.append('</body></html>')
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def render_report(df, profiles, dataset, spec, out_dir, n_jobs=None):
+    """
+    Renders every figure of a report spec across a process pool.
+    Shared inputs (metric tables, classified CEG pairs) are computed once in the parent; the
+    dataset is handed to each worker once (copy-on-write under 'fork') instead of once per figure.
+    Args: df (Dataframe): Glucose data.
+          profiles (Dataframe): Patient profiles.
+          dataset (str): Dataset name.
+          spec (dict): Report spec (see load_spec).
+          out_dir (str): Output directory.
+          n_jobs (int): Number of worker processes. Default is all cores.
+    Returns: results (list): One dictionary per figure with its files, run time and error, if any.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    pIDs = list(df['pID'].unique())
+    tasks = expand_spec(spec, pIDs, list(profiles.columns)[1:])
+
+    tables, pairs = {}, {}
+    for task in tasks:
+        if task['type'] == 'metric_comparison':
+            key = (task.get('start_day', 0), task.get('end_day', 1000))
+            if key not in tables:
+                measures = list(dict.fromkeys(t['measure'] for t in tasks if t['type'] == 'metric_comparison'))
+                tables[key] = get_glycaemic_table(df, pIDs, measures, *key, n_jobs=n_jobs)
+        elif task['type'] == 'ceg':
+            key = (task.get('window', 5), task.get('grid', 'Clarke'))
+            if key not in pairs:
+                pairs[key] = get_classified_pairs(df, *key)
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    initargs = (df, profiles, dataset, tables, pairs)
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        results = [_render_task(task, out_dir, spec['formats'], spec['dpi']) for task in tasks]
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context, initializer=_init_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_render_task, task, out_dir, spec['formats'], spec['dpi']) for task in tasks]
+            results = [future.result() for future in futures] # In task order, whatever order they finish in
+
+    write_index(results, out_dir, dataset)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a batch report of every plot type without the GUI.")
+    parser.add_argument('dataset', help="Dataset name, e.g. OhioT1DM")
+    parser.add_argument('--spec', help="Report spec (JSON or YAML). Default: every plot type for every patient and category")
+    parser.add_argument('--dataset-dir', default='./datasets/', help="Folder with <dataset>.csv and <dataset>_profile.csv")
+    parser.add_argument('--out', default=None, help="Output folder. Default: ./reports/<dataset>")
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes. Default: all cores")
+    args = parser.parse_args()
+
+    df = load_dataset(os.path.join(args.dataset_dir, f'{args.dataset}.csv'))
+    profiles = pd.read_csv(os.path.join(args.dataset_dir, f'{args.dataset}_profile.csv'))
+    out_dir = args.out or os.path.join('./reports', args.dataset)
+
+    start = time.perf_counter()
+    results = render_report(df, profiles, args.dataset, load_spec(args.spec), out_dir, args.jobs)
+    failed = [r for r in results if r['error']]
+    print(f"Rendered {len(results) - len(failed)} figures to {out_dir} in {time.perf_counter() - start:.1f}s")
+    for r in failed:
+        print(f"  {r['name']} failed: {r['error']}")
+
+
+if __name__ == "__main__":
+    main()
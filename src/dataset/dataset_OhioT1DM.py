@@ -1,16 +1,15 @@
-import pickle
-import random
-from torch.utils.data import DataLoader, Dataset
 import xml.etree.cElementTree as XMLParser
 import datetime as dt
 import pandas as pd
 import numpy as np
-import torch
 
 import os 
 import time 
 import datetime 
 
+from src.dataset.schema import compact_dtypes
+from src.dataset.transforms import MaxScale
+
 def get_OHIO_pIDs(path):
     """ Returns a list of unique patient IDs from the XML files in the given path.
     """
@@ -454,9 +453,9 @@ def get_OHIO_record_time(df_, unix_time= False):
     return np.array(record_time)
 
 
-def prepare_OHIO_data(file_path, pIDs, viz=False):
+def iter_OHIO_data(file_path, pIDs, viz=False):
 
-    """ Loads patient data from an XML file containing all the bgl and even information."""
+    """ Yields the prepared data of one patient at a time, so a cohort can be written out without holding it all in memory."""
     maxBG  = 400
     maxINS = 35
     maxCRB = 400
@@ -497,22 +496,21 @@ def prepare_OHIO_data(file_path, pIDs, viz=False):
                 frames = [df_whole, df]
                 df_whole = pd.concat(frames)
 
-        if(pID == pIDs[0]):
-            df_complete_ = df_whole
-        else:
-            comp = [df_complete_, df_whole]
-            df_complete_ = pd.concat(comp)  
+        df_whole = df_whole.reset_index(drop=True)
 
-    df_complete = df_complete_.reset_index()
-    df_complete = df_complete.drop('index', axis=1) 
+        df_whole = compact_dtypes(df_whole)
+        if(viz == False):
+            df_whole = MaxScale({'CGM': maxBG, 'BGM': maxBG, 'CRB': maxCRB, 'INS': maxINS}).transform_frame(df_whole)
 
-    if(viz == False):
-        df_complete['CGM'] = df_complete['CGM']/maxBG
-        df_complete['BGM'] = df_complete['BGM']/maxBG
-        df_complete['CRB'] = df_complete['CRB']/maxCRB
-        df_complete['INS'] = df_complete['INS']/maxINS
-        
-    return df_complete
+        yield df_whole
+
+
+def prepare_OHIO_data(file_path, pIDs, viz=False):
+
+    """ Loads patient data from an XML file containing all the bgl and even information."""
+    frames = list(iter_OHIO_data(file_path, pIDs, viz))
+
+    return pd.concat(frames, ignore_index=True)
 
 
 def get_OHIO_profiles(file_path, pIDs_=None):
@@ -1,14 +1,13 @@
-import pickle
-import random
-from torch.utils.data import DataLoader, Dataset
 import pandas as pd
 import numpy as np
-import torch
 
 import os 
 import time 
 import datetime 
 
+from src.dataset.schema import compact_dtypes
+from src.dataset.transforms import MaxScale
+
 def get_REPLACE_pIDs(path):
 
     _df_bgm_ = pd.read_csv(path + "HDeviceBGM.txt", sep="|")
@@ -151,7 +150,8 @@ def read_REPLACE_df(path, pID, allBGM = False):
     return df_complete
 
 
-def prepare_REPLACE_data(file_path, pIDs, viz = False):
+def iter_REPLACE_data(file_path, pIDs, viz = False):
+    """ Yields the prepared data of one patient at a time, so a cohort can be written out without holding it all in memory."""
 
     maxBG  = 400
     maxINS = 35
@@ -241,23 +241,19 @@ def prepare_REPLACE_data(file_path, pIDs, viz = False):
                 INS_vals[k[0]] = valueINS[i]
         
         df = pd.DataFrame({"Time": timeMS_timestamps, "pID": pID_vals, "CGM": CGM_vals, "BGM": BGM_vals, "CRB": CRB_vals, "INS": INS_vals})
-        
-        if(pID==pIDs[0]):
-            df_complete_ = df
-        else:
-            frames = [df_complete_, df]
-            df_complete_ = pd.concat(frames)
 
-    df_complete = df_complete_.reset_index()
-    df_complete = df_complete.drop('index', axis=1) 
+        df = compact_dtypes(df)
+        if(viz == False):
+            df = MaxScale({'CGM': maxBG, 'BGM': maxBG, 'CRB': maxCRB, 'INS': maxINS}).transform_frame(df)
 
-    if(viz == False):
-        df_complete['CGM'] = df_complete['CGM']/maxBG
-        df_complete['BGM'] = df_complete['BGM']/maxBG
-        df_complete['CRB'] = df_complete['CRB']/maxCRB
-        df_complete['INS'] = df_complete['INS']/maxINS
+        yield df
 
-    return df_complete
+
+def prepare_REPLACE_data(file_path, pIDs, viz = False):
+
+    frames = list(iter_REPLACE_data(file_path, pIDs, viz))
+
+    return pd.concat(frames, ignore_index=True)
 
     
 def get_REPLACE_profiles(file_path, pIDs):
@@ -0,0 +1,112 @@
+import os
+import json
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+
+# The array layout and window index need no torch; they live in src.dataset.windows and are re-exported here
+from src.dataset.windows import FEATURES, write_window_arrays, get_window_index, get_windows
+
+
+class GlucoseWindowDataset(Dataset):
+    """
+    Forecasting dataset of (history, horizon) windows over the arrays written by write_window_arrays.
+    Item i is x: (history, features) and y: (horizon,) of the target, as float32 tensors.
+    The arrays are memory-mapped and opened lazily in each process (DataLoader workers included), and
+    windows are strided views of them, so only the windows of a batch are ever copied. Indexing with a
+    list/array of indices gathers the whole batch at once (see make_loader).
+    Normalisation is a transform (src.dataset.transforms) applied to each batch on access, so the arrays
+    can hold the unscaled data also used for plotting.
+    """
+
+    def __init__(self, root, history=12, horizon=6, pIDs=None, stride=1, transform=None):
+        with open(os.path.join(root, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.root = root
+        self.history, self.horizon = history, horizon
+        self.pIDs = list(self.meta['pIDs'] if pIDs is None else pIDs)
+        self.target = self.meta['features'].index(self.meta['target'])
+        self.transform = transform
+        self._arrays, self._pid = None, None
+
+        # Window index: patient position and start of every valid window, sorted by patient
+        patient, starts = [], []
+        for k, array in enumerate(self.arrays):
+            s = get_window_index(array, history, horizon, self.target, stride)
+            patient.append(np.full(len(s), k, dtype=np.int32))
+            starts.append(s)
+        self.patient = np.concatenate(patient) if patient else np.zeros(0, dtype=np.int32)
+        self.starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+
+    @property
+    def arrays(self):
+        """Memory maps of the patients, (re)opened on first use in every process."""
+        if self._arrays is None or self._pid != os.getpid():
+            self._arrays = [np.load(os.path.join(self.root, f'{pID}.npy'), mmap_mode='r') for pID in self.pIDs]
+            self._pid = os.getpid()
+        return self._arrays
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'], state['_pid'] = None, None # Workers map the files themselves
+        return state
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if np.ndim(index) == 0:
+            array, start = self.arrays[self.patient[index]], self.starts[index]
+            window = np.array(array[start:start + self.history + self.horizon])
+            if self.transform is not None:
+                window = self.transform.apply(window, self.meta['features'], self.pIDs[self.patient[index]])
+            return (torch.from_numpy(window[:self.history]),
+                    torch.from_numpy(window[self.history:, self.target]))
+        return self.get_batch(index)
+
+    def get_batch(self, indices):
+        """
+        Gathers several windows with one fancy-indexing copy per patient.
+        Args: indices (list or ndarray): Window indices.
+        Returns: x (Tensor): (batch, history, features); y (Tensor): (batch, horizon)
+        """
+        indices = np.asarray(indices)
+        length = self.history + self.horizon
+        batch = np.empty((len(indices), length, len(self.meta['features'])), dtype=np.float32)
+        patient = self.patient[indices]
+        for k in np.unique(patient):
+            rows = np.flatnonzero(patient == k)
+            batch[rows] = get_windows(self.arrays[k], self.starts[indices[rows]], length)
+            if self.transform is not None:
+                batch[rows] = self.transform.apply(batch[rows], self.meta['features'], self.pIDs[k])
+        batch = torch.from_numpy(batch)
+        return batch[:, :self.history], batch[:, self.history:, self.target]
+
+    def invert_target(self, y, indices):
+        """
+        Brings normalised target values (e.g. forecasts) of some windows back to the stored units.
+        Args: y (ndarray or Tensor): (batch, ...) values of the target.
+              indices (list or ndarray): Window index of every row of y.
+        Returns: y (ndarray): Unscaled values.
+        """
+        y = np.array(y, dtype=np.float32)
+        if self.transform is None:
+            return y
+        patient = self.patient[np.asarray(indices)]
+        target = [self.meta['target']]
+        for k in np.unique(patient):
+            rows = np.flatnonzero(patient == k)
+            y[rows] = self.transform.invert(y[rows][..., None], target, self.pIDs[k])[..., 0]
+        return y
+
+
+def make_loader(dataset, batch_size=256, shuffle=True, num_workers=0, **kwargs):
+    """
+    DataLoader that hands whole batches of indices to GlucoseWindowDataset, so each batch is gathered
+    with a few vectorised copies instead of one Python call and a collate per window.
+    Returns: loader (DataLoader): Yields (x, y) batches.
+    """
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None,
+                      num_workers=num_workers, persistent_workers=num_workers > 0, **kwargs)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from libs.glycaemic import to_minutes
+from src.dataset.segments import get_segments
+
+IMPUTATION_METHODS = ['linear', 'spline', 'ffill']
+
+
+def _slopes(t, y, first, last, n, fallback):
+    """Slope (per minute) between readings first and last at the end of each segment; fallback for one-reading segments."""
+    a = np.clip(first, 0, len(y) - 1)
+    b = np.clip(last, 0, len(y) - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (y[b] - y[a]) / (t[b] - t[a])
+    return np.where(n > 1, slope, fallback)
+
+
+def impute_gaps(df, method='linear', max_gap=30, res=5, column='CGM'):
+    """
+    Fills the NaN readings lying between two valid segments of the same patient, for gaps lasting at most
+    max_gap minutes. Gaps are found from the valid-segment run lengths and all of them are filled in one
+    vectorised pass over the cohort; leading and trailing NaNs and longer gaps are left missing.
+    Args: df (Dataframe): Glucose data, each patient's rows in time order.
+          method (str): 'linear' interpolation, 'spline' (cubic Hermite using the slopes at the ends of the
+                        neighbouring segments) or 'ffill' (carry the last reading forward).
+          max_gap (float): Longest gap to fill in minutes (time between the readings around it, less one interval).
+          res (int): Sampling interval in minutes.
+          column (str): Column to impute.
+    Returns: df (Dataframe): Copy with the column filled and a uint8 `<column>_imputed` mask.
+    """
+    if method not in IMPUTATION_METHODS:
+        raise ValueError("Invalid method. Use one of {}".format(IMPUTATION_METHODS))
+
+    t = to_minutes(df['Time'].values)
+    y = df[column].to_numpy(dtype=float)
+    groups = df['pID'].to_numpy()
+    start, end, n = get_segments(df['Time'].values, y, res, groups)
+
+    # Gap k lies between segment k and segment k + 1
+    left, right = end[:-1], start[1:]
+    rows_missing = right - left - 1
+    fill = (groups[left] == groups[right]) & (rows_missing > 0) & (t[right] - t[left] - res <= max_gap)
+    k = np.flatnonzero(fill)
+
+    counts = rows_missing[k]
+    gap = np.repeat(np.arange(len(k)), counts)
+    rows = left[k][gap] + 1 + np.arange(len(gap)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    t0, t1 = t[left[k]][gap], t[right[k]][gap]
+    y0, y1 = y[left[k]][gap], y[right[k]][gap]
+    if method == 'ffill':
+        values = y0
+    elif method == 'linear':
+        values = y0 + (y1 - y0) * (t[rows] - t0) / (t1 - t0)
+    else:
+        secant = (y[right[k]] - y[left[k]]) / (t[right[k]] - t[left[k]])
+        m0 = _slopes(t, y, left[k] - 1, left[k], n[k], secant)[gap]
+        m1 = _slopes(t, y, right[k], right[k] + 1, n[k + 1], secant)[gap]
+        h = t1 - t0
+        s = (t[rows] - t0) / h
+        values = ((2 * s**3 - 3 * s**2 + 1) * y0 + (s**3 - 2 * s**2 + s) * h * m0
+                  + (-2 * s**3 + 3 * s**2) * y1 + (s**3 - s**2) * h * m1)
+
+    y[rows] = values
+    mask = np.zeros(len(df), dtype=np.uint8)
+    mask[rows] = 1
+    return df.assign(**{column: y.astype(df[column].dtype), f'{column}_imputed': mask})
@@ -1,16 +1,12 @@
-import pickle
-import random
-from torch.utils.data import DataLoader, Dataset
 import datetime as dt
 import pandas as pd
 import numpy as np
-import torch
 
 import os 
 import time 
 
-from src.dataset.dataset_replaceBG import get_REPLACE_pIDs, read_REPLACE_df, get_REPLACE_record_time, prepare_REPLACE_data,get_REPLACE_profiles
-from src.dataset.dataset_OhioT1DM import get_OHIO_pIDs, read_OHIO_df, get_OHIO_record_time, prepare_OHIO_data, get_OHIO_profiles
+# The dataset adapters are imported inside each function on first use, so importing this module
+# (e.g. when the GUI starts) does not load the parsers of every dataset
 # from src.dataset.dataset_OpenAPS import get_OpenAPS_pIDs, read_OpenAPS_df, get_OpenAPS_record_time, prepare_OpenAPS_data
 # from src.dataset.dataset_Tidepool import get_Tidepool_pIDs, read_Tidepool_df, get_Tidepool_record_time, prepare_Tidepool_data
 
@@ -26,8 +22,10 @@ def get_pIDs(path):
     # path = proj_dir.replace(os.sep, '/') + dataset_path
 
     if dataset_name == "OhioT1DM":
+        from src.dataset.dataset_OhioT1DM import get_OHIO_pIDs
         pIDs = get_OHIO_pIDs(path)
     elif dataset_name == "Replace_BG":
+        from src.dataset.dataset_replaceBG import get_REPLACE_pIDs
         pIDs = get_REPLACE_pIDs(path)
     else:
         pIDs = []
@@ -45,8 +43,10 @@ def read_df(path, pID, allBGM = False):
     dataset_name = path.split("/")[-3]
 
     if dataset_name == "OhioT1DM":
+        from src.dataset.dataset_OhioT1DM import read_OHIO_df
         df_complete = read_OHIO_df(path, pID)
     elif dataset_name == "Replace_BG":
+        from src.dataset.dataset_replaceBG import read_REPLACE_df
         df_complete = read_REPLACE_df(path, pID, allBGM)
     else:
         df_complete = []
@@ -63,8 +63,10 @@ def get_record_time(df_, dataset_name, unix_time= False):
     """
 
     if dataset_name == "OhioT1DM":
+        from src.dataset.dataset_OhioT1DM import get_OHIO_record_time
         record_time = get_OHIO_record_time(df_, unix_time)
     elif dataset_name == "Replace_BG":
+        from src.dataset.dataset_replaceBG import get_REPLACE_record_time
         record_time = get_REPLACE_record_time(df_, unix_time)
     else:
         record_time = []
@@ -85,8 +87,10 @@ def get_profiles(path):
 
     pIDs = get_pIDs(path)
     if dataset_name == "OhioT1DM":
+        from src.dataset.dataset_OhioT1DM import get_OHIO_profiles
         profiles = get_OHIO_profiles(path, pIDs)
     elif dataset_name == "Replace_BG":
+        from src.dataset.dataset_replaceBG import get_REPLACE_profiles
         profiles = get_REPLACE_profiles(path, pIDs)
     else:
         profiles = []
@@ -109,12 +113,17 @@ def get_preprocessed_time(timestamps):
     return processed_time
 
 
-def prepare_data(file_path, pIDs, viz = False):
+def prepare_data(file_path, pIDs, viz = False, store_dir = None, memory_budget = None, impute = None, max_gap = 30):
     """
     Prepare the data for the given patient IDs.
     Args: file_path (str): Path to the dataset directory.
           pIDs (list): List of patient IDs.
-    Returns: data (list): List of prepared data for each patient ID.
+          store_dir (str): Out-of-core mode: if given, each patient's data is written to a PatientStore
+                           in this folder as soon as it is prepared instead of being kept in memory.
+          memory_budget (int): Memory budget in bytes of the returned PatientStore.
+          impute (str): Fill CGM gaps with 'linear', 'spline' or 'ffill' (see impute_gaps). Default is no imputation.
+          max_gap (float): Longest CGM gap to impute, in minutes.
+    Returns: data (Dataframe): Prepared data of all patient IDs, or a PatientStore in out-of-core mode.
     """
     dataset_name = file_path.split("/")[-3]
     # proj_dir = os.getcwd()
@@ -122,11 +131,23 @@ def prepare_data(file_path, pIDs, viz = False):
     # file_path = proj_dir.replace(os.sep, '/') + dataset_path
 
     if dataset_name == "OhioT1DM":
-        data = prepare_OHIO_data(file_path, pIDs, viz)
+        from src.dataset.dataset_OhioT1DM import iter_OHIO_data
+        frames = iter_OHIO_data(file_path, pIDs, viz)
     elif dataset_name == "Replace_BG":
-        data = prepare_REPLACE_data(file_path, pIDs, viz)
+        from src.dataset.dataset_replaceBG import iter_REPLACE_data
+        frames = iter_REPLACE_data(file_path, pIDs, viz)
     else:
-        data = []
+        frames = []
         raise ValueError("Unknown dataset name: {}".format(dataset_name))
+
+    if impute is not None:
+        from src.dataset.imputation import impute_gaps
+        frames = (impute_gaps(frame, impute, max_gap) for frame in frames)
+
+    if store_dir is not None:
+        from src.dataset.store import PatientStore
+        return PatientStore.from_frames(frames, store_dir, memory_budget)
+
+    data = pd.concat(list(frames), ignore_index=True)
     
-    return data
\ No newline at end of file
+    return data
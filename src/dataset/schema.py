@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Compact dtype of each column of a prepared glucose frame. Columns not listed are left as they are
+GLUCOSE_SCHEMA = {
+    'pID': 'int32',        # Falls back to 'category' for non-integer IDs
+    'CGM': 'float32',
+    'BGM': 'float32',
+    'CRB': 'float32',
+    'INS': 'float32',
+    'hypo_event': 'uint8', # Event flags fall back to float32 if they hold NaN or non-integer values
+    'sleep': 'uint8',
+    'exercise': 'uint8',
+    'CGM_imputed': 'uint8',
+}
+
+
+def _compact_column(values, dtype):
+    if dtype == 'int32':
+        if pd.api.types.is_integer_dtype(values) or (pd.api.types.is_float_dtype(values) and values.notna().all()
+                                                     and (values % 1 == 0).all()):
+            if values.empty or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max):
+                return values.astype(np.int32)
+        return values.astype('category')
+    if dtype == 'uint8':
+        if values.notna().all() and (values % 1 == 0).all() and (values.empty or (values.min() >= 0 and values.max() <= 255)):
+            return values.astype(np.uint8)
+        return values.astype(np.float32)
+    return values.astype(dtype)
+
+
+def compact_dtypes(df):
+    """
+    Casts a prepared glucose frame to the compact GLUCOSE_SCHEMA: int32 (or categorical) pID,
+    float32 glucose, carbohydrate and insulin values, uint8 event flags and a datetime64 Time column.
+    Args: df (Dataframe): Frame returned by prepare_data or read back from its CSV.
+    Returns: df (Dataframe): The same data, typically several times smaller in memory.
+    """
+    columns = {}
+    if 'Time' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Time']):
+        columns['Time'] = pd.to_datetime(df['Time'])
+    for column, dtype in GLUCOSE_SCHEMA.items():
+        if column in df.columns and df[column].dtype != dtype:
+            columns[column] = _compact_column(df[column], dtype)
+    return df.assign(**columns) if columns else df
+
+
+def get_cache_path(csv_path):
+    """Path of the typed cache kept beside a glucose CSV."""
+    return os.path.splitext(csv_path)[0] + '.pkl'
+
+
+def save_dataset(df, csv_path):
+    """
+    Saves a glucose frame as CSV, plus a pickle beside it that keeps the compact dtypes.
+    Args: df (Dataframe): Glucose data.
+          csv_path (str): Path of the CSV file.
+    """
+    df = compact_dtypes(df)
+    df.to_csv(csv_path, index=False)
+    df.to_pickle(get_cache_path(csv_path))
+
+
+def load_dataset(csv_path):
+    """
+    Loads a glucose frame with compact dtypes. The pickle beside the CSV is used when it is at least
+    as new as the CSV; otherwise the CSV is parsed, compacted and the pickle is (re)written.
+    Args: csv_path (str): Path of the CSV file.
+    Returns: df (Dataframe): Glucose data.
+    """
+    cache_path = get_cache_path(csv_path)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f"Could not read {cache_path}: {e}. Reading {csv_path} instead.")
+
+    df = compact_dtypes(pd.read_csv(csv_path))
+    try:
+        df.to_pickle(cache_path)
+    except OSError as e:
+        print(f"Could not save {cache_path}: {e}")
+    return df
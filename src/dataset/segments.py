@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from libs.glycaemic import to_minutes
+from src.dataset.store import iter_patients
+
+SEGMENT_COLUMNS = ['pID', 'start_row', 'end_row', 'start', 'end', 'n', 'minutes']
+
+
+def get_segments(times, cgm, res=5, groups=None):
+    """
+    Run-length encodes the valid CGM readings of a patient into contiguous segments. A NaN reading
+    or a time step longer than 1.5 * res between consecutive readings ends a segment.
+    Args: times (array): Timestamps in time order.
+          cgm (array): Glucose readings aligned with times.
+          res (int): Sampling interval in minutes.
+          groups (array): Patient of every row, to encode several patients (each in time order) at once.
+    Returns: start_row, end_row (ndarray): First and last row of every segment (inclusive);
+             n (ndarray): Readings per segment.
+    """
+    t = to_minutes(times)
+    valid = np.flatnonzero(~np.isnan(np.asarray(cgm, dtype=float)))
+    if len(valid) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    breaks = np.r_[True, (np.diff(valid) > 1) | (np.diff(t[valid]) > 1.5 * res)]
+    if groups is not None:
+        groups = np.asarray(groups)[valid]
+        breaks[1:] |= groups[1:] != groups[:-1]
+    first = np.flatnonzero(breaks)
+    n = np.diff(np.r_[first, len(valid)])
+    return valid[first], valid[first + n - 1], n
+
+
+def build_segment_index(data, res=5):
+    """
+    Builds the valid-segment index of every patient, one patient at a time.
+    Args: data (Dataframe or PatientStore): Glucose data, each patient's rows in time order.
+          res (int): Sampling interval in minutes.
+    Returns: index (Dataframe): One row per segment with the patient, its first and last row within the
+             patient's rows, the times of its first and last reading, its readings (n) and the minutes it
+             covers (one sampling interval per reading span).
+    """
+    frames = []
+    for pID, df in iter_patients(data, columns=['Time', 'CGM']):
+        times = pd.to_datetime(df['Time']).values
+        start_row, end_row, n = get_segments(times, df['CGM'].values, res)
+        start, end = times[start_row], times[end_row]
+        minutes = (end - start).astype('timedelta64[s]').astype(np.int64) / 60 + res
+        frames.append(pd.DataFrame({'pID': pID, 'start_row': start_row, 'end_row': end_row, 'start': start,
+                                    'end': end, 'n': n, 'minutes': minutes}, columns=SEGMENT_COLUMNS))
+    if not frames:
+        return pd.DataFrame(columns=SEGMENT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def save_segment_index(index, path):
+    index.to_pickle(path)
+
+
+def load_segment_index(path, data=None, source_path=None, res=5):
+    """
+    Loads the segment index saved at path, rebuilding (and saving) it from data when it is missing or
+    older than source_path (the glucose file it was built from).
+    """
+    if os.path.exists(path) and (source_path is None or os.path.getmtime(path) >= os.path.getmtime(source_path)):
+        return pd.read_pickle(path)
+    if data is None:
+        raise FileNotFoundError("No up-to-date segment index at {}".format(path))
+    index = build_segment_index(data, res)
+    try:
+        save_segment_index(index, path)
+    except OSError as e:
+        print(f"Could not save segment index to {path}: {e}")
+    return index
+
+
+def get_long_segments(index, hours):
+    """Segments covering at least `hours` hours."""
+    return index[index['minutes'] >= hours * 60]
+
+
+def get_daily_coverage(index, res=5):
+    """
+    Percentage of every calendar day covered by valid segments, per patient. Segments spanning
+    midnight are split between days; days without any reading are absent.
+    Returns: coverage (Dataframe): pID, day and coverage (%) columns.
+    """
+    start = to_minutes(index['start'].values)
+    stop = to_minutes(index['end'].values) + res
+    first_day = np.floor(start / 1440).astype(np.int64)
+    last_day = np.floor((stop - 1e-6) / 1440).astype(np.int64)
+    span = last_day - first_day + 1
+
+    seg = np.repeat(np.arange(len(index)), span)
+    day = first_day[seg] + np.arange(len(seg)) - np.repeat(np.cumsum(span) - span, span)
+    overlap = np.minimum(stop[seg], (day + 1) * 1440) - np.maximum(start[seg], day * 1440)
+
+    coverage = pd.DataFrame({'pID': index['pID'].values[seg], 'day': day, 'coverage': 100 * overlap / 1440})
+    coverage = coverage.groupby(['pID', 'day'], sort=False)['coverage'].sum().reset_index()
+    coverage['day'] = pd.to_datetime(coverage['day'] * 1440 * 60, unit='s')
+    return coverage
+
+
+def count_valid_windows(index, length, stride=1):
+    """Number of windows of `length` consecutive readings inside a segment, per patient."""
+    counts = np.maximum(0, (index['n'].values - length) // stride + 1)
+    return pd.Series(counts, index=index['pID'].values).groupby(level=0, sort=False).sum()
+
+
+def get_valid_windows(index, length, stride=1):
+    """
+    Every window of `length` consecutive readings lying inside a single segment.
+    Returns: windows (Dataframe): pID and start_row (row within the patient) of every window.
+    """
+    counts = np.maximum(0, (index['n'].values - length) // stride + 1)
+    seg = np.repeat(np.arange(len(index)), counts)
+    k = np.arange(len(seg)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DataFrame({'pID': index['pID'].values[seg], 'start_row': index['start_row'].values[seg] + k * stride})
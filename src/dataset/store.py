@@ -0,0 +1,158 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.dataset.schema import compact_dtypes
+
+# Approximate size of one CSV row once parsed, before compaction; sizes the chunks read by PatientStore.from_csv
+CSV_ROW_BYTES = 256
+
+
+def iter_patients(data, pIDs=None, columns=None, skip_missing=False):
+    """
+    Yields (pID, DataFrame) per patient from a DataFrame or, one partition at a time, from a PatientStore.
+    Args: data (Dataframe or PatientStore): Glucose data.
+          pIDs (list): Patients to read, in this order. Default is every patient, in the order of the data.
+          columns (list): Columns to keep, None for all.
+          skip_missing (bool): If True, patients of pIDs without data are skipped instead of raising a KeyError.
+    """
+    if hasattr(data, 'iter_partitions'):
+        if skip_missing and pIDs is not None:
+            pIDs = [pID for pID in pIDs if pID in data]
+        yield from data.iter_partitions(pIDs, columns)
+        return
+
+    if pIDs is None:
+        for pID, df in data.groupby('pID', sort=False, observed=True):
+            yield pID, df if columns is None else df[columns]
+        return
+    data = data.loc[data['pID'].isin(pIDs)]
+    groups = (data if columns is None else data[columns]).groupby(data['pID'], sort=False, observed=True)
+    for pID in pIDs:
+        if skip_missing and pID not in groups.groups:
+            continue
+        yield pID, groups.get_group(pID)
+
+
+class PatientStore:
+    """
+    Glucose data partitioned by patient on disk: `<path>/<pID>/part-<k>.pkl` files with compact dtypes
+    and an index.json holding the row count and in-memory size of every partition.
+    Functions that accept a store instead of a DataFrame (get_glycaemic_table, the daily variation plots)
+    load one patient partition at a time and combine partial aggregates, so only about `memory_budget`
+    bytes of glucose data are resident at once.
+    """
+
+    def __init__(self, path, memory_budget=None):
+        self.path = path
+        self.memory_budget = memory_budget
+        self.index = {} # pID -> {'parts': int, 'rows': int, 'nbytes': int}
+        index_path = os.path.join(path, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for entry in json.load(f):
+                    self.index[entry.pop('pID')] = entry
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, pID):
+        return pID in self.index
+
+    @property
+    def pIDs(self):
+        return list(self.index)
+
+    @property
+    def nbytes(self):
+        return sum(entry['nbytes'] for entry in self.index.values())
+
+    def _flush(self):
+        entries = [{'pID': pID.item() if isinstance(pID, np.generic) else pID, **entry} for pID, entry in self.index.items()]
+        with open(os.path.join(self.path, 'index.json'), 'w') as f:
+            json.dump(entries, f, indent=1)
+
+    def clear(self):
+        """Deletes every partition of the store."""
+        for pID in self.index:
+            shutil.rmtree(os.path.join(self.path, str(pID)), ignore_errors=True)
+        self.index = {}
+        os.makedirs(self.path, exist_ok=True)
+        self._flush()
+
+    def append(self, df):
+        """
+        Writes the rows of each patient in df as a new part of that patient's partition.
+        Args: df (Dataframe): Glucose data of one or more patients.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        df = compact_dtypes(df)
+        for pID, group in df.groupby('pID', sort=False, observed=True):
+            pID = pID.item() if isinstance(pID, np.generic) else pID
+            entry = self.index.setdefault(pID, {'parts': 0, 'rows': 0, 'nbytes': 0})
+            folder = os.path.join(self.path, str(pID))
+            os.makedirs(folder, exist_ok=True)
+            group.reset_index(drop=True).to_pickle(os.path.join(folder, 'part-{:05d}.pkl'.format(entry['parts'])))
+            entry['parts'] += 1
+            entry['rows'] += len(group)
+            entry['nbytes'] += int(group.memory_usage(deep=True).sum())
+        self._flush()
+
+    def read_partition(self, pID, columns=None):
+        """
+        Loads the data of one patient.
+        Args: pID: Patient ID.
+              columns (list): Columns to keep, None for all.
+        Returns: df (Dataframe): The patient's rows in the order they were written.
+        """
+        entry = self.index[pID]
+        if self.memory_budget is not None and entry['nbytes'] > self.memory_budget:
+            raise MemoryError("Partition of patient {} needs {} bytes, more than the memory budget of {} bytes"
+                              .format(pID, entry['nbytes'], self.memory_budget))
+        folder = os.path.join(self.path, str(pID))
+        parts = [pd.read_pickle(os.path.join(folder, 'part-{:05d}.pkl'.format(k))) for k in range(entry['parts'])]
+        df = parts[0] if len(parts) == 1 else compact_dtypes(pd.concat(parts, ignore_index=True))
+        return df if columns is None else df[columns]
+
+    def iter_partitions(self, pIDs=None, columns=None):
+        """
+        Yields (pID, DataFrame) for every patient, loading one partition at a time.
+        Args: pIDs (list): Patients to read, in this order. Default is every patient of the store.
+              columns (list): Columns to keep, None for all.
+        """
+        for pID in (self.pIDs if pIDs is None else pIDs):
+            yield pID, self.read_partition(pID, columns)
+
+    def max_parallel(self, pIDs=None):
+        """Number of partitions that fit in the memory budget at once, e.g. to size a process pool."""
+        if self.memory_budget is None:
+            return len(self.index) or 1
+        largest = max((self.index[pID]['nbytes'] for pID in (self.pIDs if pIDs is None else pIDs)), default=1)
+        return max(1, self.memory_budget // max(largest, 1))
+
+    @classmethod
+    def from_frames(cls, frames, path, memory_budget=None):
+        """
+        Builds a store from an iterable of DataFrames (e.g. one per patient from prepare_data), replacing
+        any data already at path. Only one frame is held in memory at a time.
+        """
+        store = cls(path, memory_budget)
+        store.clear()
+        for df in frames:
+            store.append(df)
+        return store
+
+    @classmethod
+    def from_csv(cls, csv_path, path, memory_budget=None):
+        """
+        Builds a store from a glucose CSV read in chunks sized by the memory budget.
+        Args: csv_path (str): Glucose CSV, e.g. datasets/Replace_BG.csv.
+              path (str): Folder of the store, e.g. datasets/Replace_BG_store.
+              memory_budget (int): Bytes of glucose data to hold at once. Default is 256 MB per chunk.
+        Returns: store (PatientStore)
+        """
+        chunk_rows = max(1, (memory_budget or 256 * 2**20) // CSV_ROW_BYTES)
+        return cls.from_frames(pd.read_csv(csv_path, chunksize=chunk_rows), path, memory_budget)
@@ -0,0 +1,104 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from src.dataset.store import iter_patients
+
+# Maximum values used by prepare_data(viz=False) to scale each column to about [0, 1]
+MAX_SCALES = {'CGM': 400, 'BGM': 400, 'CRB': 400, 'INS': 35}
+
+
+class AffineTransform(ABC):
+    """
+    Invertible normalisation x' = (x - offset) / scale, applied on access instead of storing scaled copies.
+    Subclasses define `columns` and `params(pID)`; the same unscaled data then serves plotting and, through
+    transform_frame or GlucoseWindowDataset(transform=...), modelling.
+    """
+    columns = ()
+
+    def fit(self, data):
+        """Learns the parameters from a DataFrame or PatientStore. Returns self."""
+        return self
+
+    @abstractmethod
+    def params(self, pID):
+        """Returns {column: (offset, scale)} for the patient."""
+
+    def _arrays(self, pID, columns):
+        params = self.params(pID)
+        offset = np.array([params.get(c, (0, 1))[0] for c in columns], dtype=float)
+        scale = np.array([params.get(c, (0, 1))[1] for c in columns], dtype=float)
+        return offset, scale
+
+    def apply(self, values, columns, pID=None):
+        """
+        Normalises an array of one patient.
+        Args: values (ndarray): Array whose last axis follows `columns`, e.g. a (batch, time, features) batch.
+              columns (list): Column name of each position of the last axis.
+              pID: Patient the values belong to.
+        Returns: values (ndarray): Normalised array of the same dtype.
+        """
+        offset, scale = self._arrays(pID, columns)
+        return ((values - offset) / scale).astype(values.dtype, copy=False)
+
+    def invert(self, values, columns, pID=None):
+        """Undoes apply, e.g. to bring forecasts back to mg/dL."""
+        offset, scale = self._arrays(pID, columns)
+        return (values * scale + offset).astype(values.dtype, copy=False)
+
+    def transform_frame(self, df, inverse=False):
+        """
+        Returns a copy of a glucose DataFrame with the transformed columns (normalised, or unscaled if inverse).
+        Rows are grouped by patient so per-patient parameters are applied in one vectorised step each.
+        """
+        columns = [c for c in self.columns if c in df.columns]
+        values = df[columns].to_numpy(dtype=float)
+        pIDs = df['pID'].to_numpy()
+        unique, inverse_index = np.unique(pIDs, return_inverse=True)
+        table = np.array([self._arrays(pID, columns) for pID in unique]) # (patients, 2, columns)
+        offset, scale = table[inverse_index, 0], table[inverse_index, 1]
+        values = values * scale + offset if inverse else (values - offset) / scale
+        return df.assign(**{c: values[:, k].astype(df[c].dtype) for k, c in enumerate(columns)})
+
+
+class MaxScale(AffineTransform):
+    """Divides each column by a fixed maximum (MAX_SCALES by default), as prepare_data(viz=False) does."""
+
+    def __init__(self, scales=None):
+        self.scales = dict(MAX_SCALES if scales is None else scales)
+        self.columns = tuple(self.scales)
+
+    def params(self, pID=None):
+        return {c: (0, s) for c, s in self.scales.items()}
+
+
+class ZScore(AffineTransform):
+    """
+    Standardises columns to zero mean and unit variance per patient (or over the cohort with
+    per_patient=False). fit reads one patient at a time, so it also works on a PatientStore.
+    """
+
+    def __init__(self, columns=('CGM', 'BGM'), per_patient=True):
+        self.columns = tuple(columns)
+        self.per_patient = per_patient
+        self.stats = {} # pID (None for the cohort) -> {column: (mean, std)}
+
+    def fit(self, data):
+        totals = {}
+        for pID, df in iter_patients(data, columns=['pID', *self.columns]):
+            values = df[list(self.columns)].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            filled = np.where(valid, values, 0)
+            key = pID if self.per_patient else None
+            n, s, ss = totals.get(key, (0, 0, 0))
+            totals[key] = (n + valid.sum(0), s + filled.sum(0), ss + (filled**2).sum(0))
+        for key, (n, s, ss) in totals.items():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(n > 0, s / n, 0)
+                std = np.sqrt(np.maximum(ss / n - mean**2, 0))
+            std = np.where(std > 0, std, 1) # Constant or empty columns are only centred
+            self.stats[key] = {c: (mean[k], std[k]) for k, c in enumerate(self.columns)}
+        return self
+
+    def params(self, pID=None):
+        return self.stats[pID if self.per_patient else None]
@@ -0,0 +1,76 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.dataset.store import iter_patients
+
+FEATURES = ['CGM', 'CRB', 'INS']
+
+
+def write_window_arrays(data, root, features=FEATURES, target='CGM', res=5, pIDs=None):
+    """
+    Writes one float32 array per patient, `<root>/<pID>.npy`, laid out on a regular `res` minute grid for
+    memory-mapped window access. Missing grid steps become NaN rows, so windows are purely positional;
+    missing covariates (everything but the target) are treated as no event and set to 0.
+    Args: data (Dataframe or PatientStore): Prepared (normalised) data, e.g. from prepare_data(viz=False).
+          root (str): Output folder.
+          features (list): Columns of every time step, in order.
+          target (str): Column to forecast; NaN readings of it exclude a window.
+          res (int): Sampling interval in minutes.
+          pIDs (list): Patients to write. Default is every patient.
+    Returns: meta (dict): The contents of `<root>/meta.json`.
+    """
+    os.makedirs(root, exist_ok=True)
+    written = []
+    for pID, df in iter_patients(data, pIDs, skip_missing=True):
+        minutes = pd.to_datetime(df['Time']).values.astype('datetime64[m]').astype(np.int64)
+        steps = np.rint((minutes - minutes.min()) / res).astype(np.int64)
+        first = np.unique(steps, return_index=True)[1] # Keep the first row of duplicated steps
+
+        values = df[features].to_numpy(dtype=np.float32)
+        covariates = [k for k, f in enumerate(features) if f != target]
+        values[:, covariates] = np.nan_to_num(values[:, covariates])
+
+        grid = np.full((steps.max() + 1, len(features)), np.nan, dtype=np.float32)
+        grid[steps[first]] = values[first]
+        np.save(os.path.join(root, f'{pID}.npy'), grid)
+        written.append(pID.item() if isinstance(pID, np.generic) else pID)
+
+    meta = {'pIDs': written, 'features': list(features), 'target': target, 'res': res}
+    with open(os.path.join(root, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+def get_window_index(array, history, horizon, target=0, stride=1):
+    """
+    Start positions of the windows of history + horizon steps without a missing target reading.
+    A cumulative count of missing readings makes it one vectorised pass over the patient.
+    Args: array (ndarray): Patient array of shape (time, features), e.g. a memory map.
+          history (int): Input steps.
+          horizon (int): Steps to forecast.
+          target (int): Position of the target feature.
+          stride (int): Step between consecutive window starts.
+    Returns: starts (ndarray): int64 start positions.
+    """
+    length = history + horizon
+    if len(array) < length:
+        return np.zeros(0, dtype=np.int64)
+    missing = np.r_[0, np.cumsum(np.isnan(array[:, target]))]
+    starts = np.arange(0, len(array) - length + 1, stride)
+    return starts[missing[starts + length] == missing[starts]]
+
+
+def get_windows(array, starts, length):
+    """
+    Copies several windows of one patient with a single fancy-indexing gather over a strided view.
+    Args: array (ndarray): Patient array of shape (time, features), e.g. a memory map.
+          starts (ndarray): Start position of every window.
+          length (int): Steps of every window.
+    Returns: windows (ndarray): (windows, length, features) float32 copy.
+    """
+    windows = sliding_window_view(array, length, axis=0) # (starts, features, length) view
+    return np.ascontiguousarray(windows[np.asarray(starts)].transpose(0, 2, 1), dtype=np.float32)
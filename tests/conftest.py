@@ -0,0 +1,14 @@
+import pandas as pd
+import pytest
+
+from tests.synthetic import make_glucose_frame
+
+
+@pytest.fixture
+def glucose_frame():
+    return make_glucose_frame()
+
+
+@pytest.fixture
+def profiles():
+    return pd.DataFrame({'pID': [540, 541, 542], 'Gender': ['M', 'F', 'M'], 'Age Range': ['(20-40)', '(40-60)', '(40-60)']})
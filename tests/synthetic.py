@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+
+def make_glucose_frame(n_patients=3, days=4, seed=0, gaps=True):
+    """Synthetic OhioT1DM-like frame: 5-min CGM with a daily cycle, sparse BGM, meals, boluses and event flags."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for p in range(n_patients):
+        t = pd.date_range('2021-01-01', periods=days * 288, freq='5min')
+        k = np.arange(len(t))
+        cgm = np.clip(140 + 60 * np.sin(2 * np.pi * k / 288 + p) + rng.normal(0, 15, len(t)), 40, 400)
+        if gaps:
+            cgm[rng.random(len(t)) < 0.02] = np.nan
+            keep = np.ones(len(t), bool)
+            keep[300:330] = False # Missing rows, not only missing readings
+            t, cgm = t[keep], cgm[keep]
+        n = len(t)
+        bgm = np.full(n, np.nan)
+        idx = rng.choice(n, n // 50, replace=False)
+        bgm[idx] = np.clip(cgm[idx] + rng.normal(0, 20, len(idx)), 20, 400)
+        crb = np.zeros(n)
+        crb[rng.choice(n, n // 100, replace=False)] = rng.integers(10, 80, n // 100)
+        ins = np.zeros(n)
+        ins[rng.choice(n, n // 80, replace=False)] = rng.uniform(0.5, 8, n // 80)
+        frames.append(pd.DataFrame({'Time': t, 'pID': 540 + p, 'CGM': cgm, 'BGM': bgm, 'CRB': crb, 'INS': ins,
+                                    'hypo_event': (cgm < 60).astype(float), 'sleep': (t.hour < 6).astype(float),
+                                    'exercise': ((k[:n] >= 600) & (k[:n] < 610)).astype(float)}))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,60 @@
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pytest
+
+from libs.CEG import clarke_zones, clarke_error_grid, plot_glucose_pairs
+
+
+def _clarke_zone_loop(ref_values, pred_values):
+    """The original per-point classification of libs/CEG.py."""
+    codes = []
+    for r, p in zip(ref_values, pred_values):
+        if (r <= 70 and p <= 70) or (p <= 1.2 * r and p >= 0.8 * r):
+            codes.append(0)
+        elif (r >= 180 and p <= 70) or (r <= 70 and p >= 180):
+            codes.append(4)
+        elif ((r >= 70 and r <= 290) and p >= r + 110) or ((r >= 130 and r <= 180) and (p <= (7/5)*r - 182)):
+            codes.append(2)
+        elif (r >= 240 and (p >= 70 and p <= 180)) or (r <= 175/3 and p <= 180 and p >= 70) or \
+                ((r > 175/3 and r < 70) and p >= (6/5)*r):
+            codes.append(3)
+        else:
+            codes.append(1)
+    return np.array(codes)
+
+
+@pytest.fixture
+def glucose_pairs():
+    rng = np.random.default_rng(0)
+    ref = np.r_[rng.uniform(20, 400, 20000), np.repeat(np.arange(0, 401, 5), 81).astype(float)]
+    pred = np.r_[rng.uniform(20, 400, 20000), np.tile(np.arange(0, 401, 5), 81).astype(float)]
+    return ref, pred # Random pairs plus a 5 mg/dL lattice that lands on every zone boundary
+
+
+def test_clarke_zones_match_the_loop(glucose_pairs):
+    ref, pred = glucose_pairs
+    zone, codes = clarke_zones(ref, pred)
+    expected = _clarke_zone_loop(ref, pred)
+    np.testing.assert_array_equal(codes, expected)
+    np.testing.assert_array_equal(zone, np.bincount(expected, minlength=5))
+
+
+def test_clarke_error_grid_indices(glucose_pairs):
+    ref, pred = glucose_pairs
+    fig = matplotlib.figure.Figure()
+    _, zone, zone_indices = clarke_error_grid(ref, pred, fig.subplots())
+    expected = _clarke_zone_loop(ref, pred)
+    for code, indices in enumerate(zone_indices):
+        np.testing.assert_array_equal(indices, np.flatnonzero(expected == code))
+    assert list(zone) == [len(indices) for indices in zone_indices]
+
+
+def test_density_view_keeps_pairs_beyond_the_limit():
+    ref = np.array([50., 120., 450., 600., 380.])
+    pred = np.array([60., 500., 420., 90., 410.])
+    ax = matplotlib.figure.Figure().subplots()
+    assert plot_glucose_pairs(ax, ref, pred, mode='density', bins=40) == 'density'
+    counts = ax.images[0].get_array()
+    assert counts.sum() == len(ref)
+    assert counts[-1, -1] == 1 # (450, 420) lands in the top-right bin
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from matplotlib.path import Path
+
+from libs.PEG import BOUNDARIES, LIMIT, _zone_polygon, parkes_zones, points_in_polygon
+
+
+@pytest.mark.parametrize('point, label', [((100, 100), 'A'), ((300, 300), 'A'), ((100, 150), 'B'), ((100, 200), 'C'),
+                                          ((100, 400), 'D'), ((20, 500), 'E'), ((200, 130), 'B'), ((400, 100), 'C'),
+                                          ((500, 20), 'D')])
+def test_parkes_zone_of_known_points(point, label):
+    _, codes = parkes_zones([point[0]], [point[1]])
+    assert 'ABCDE'[codes[0]] == label
+
+
+def test_points_in_polygon_matches_matplotlib():
+    rng = np.random.default_rng(1)
+    x, y = rng.uniform(0, LIMIT, 50000), rng.uniform(0, LIMIT, 50000)
+    for label in 'ABCD':
+        polygon = _zone_polygon(*BOUNDARIES[label])
+        expected = Path(polygon).contains_points(np.column_stack([x, y]))
+        np.testing.assert_array_equal(points_in_polygon(x, y, polygon, chunk_size=7000), expected)
+
+
+def test_parkes_zones_are_nested():
+    rng = np.random.default_rng(2)
+    x, y = rng.uniform(0, LIMIT, 20000), rng.uniform(0, LIMIT, 20000)
+    masks = [points_in_polygon(x, y, _zone_polygon(*BOUNDARIES[label])) for label in 'ABCD']
+    for inner, outer in zip(masks, masks[1:]):
+        assert not (inner & ~outer).any()
+    zone, codes = parkes_zones(x, y)
+    np.testing.assert_array_equal(codes, 4 - np.sum(masks, axis=0))
+    assert zone.sum() == len(x)
@@ -0,0 +1,52 @@
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.accuracy import get_accuracy_measures
+from libs.visualisation import compare_measures_stratified, get_classified_pairs, get_patient_accuracy, stratify_zones
+
+
+def test_accuracy_measures_by_patient():
+    pairs = pd.DataFrame({'pID': [1, 1, 2, 2], 'BGM': [100., 200., 100., 50.], 'CGM': [110., 180., 100., 60.]})
+    table = get_accuracy_measures(pairs)
+
+    assert table.loc[1, 'n'] == 2 and table.loc[2, 'n'] == 2
+    assert table.loc[1, 'MAD'] == pytest.approx(15)
+    assert table.loc[1, 'MARD'] == pytest.approx(10)
+    assert table.loc[1, 'bias'] == pytest.approx(-5)
+    assert table.loc[2, 'MARD'] == pytest.approx(10)
+
+
+def test_accuracy_measures_skip_zero_reference():
+    pairs = pd.DataFrame({'pID': [1, 1, 1], 'BGM': [0., 100., -5.], 'CGM': [40., 120., 10.]})
+    table = get_accuracy_measures(pairs)
+
+    # The pairs with a non-positive reference still count in n, MAD and bias, but not in MARD
+    assert table.loc[1, 'n'] == 3
+    assert np.isfinite(table.loc[1, 'MARD'])
+    assert table.loc[1, 'MARD'] == pytest.approx(20)
+    assert table.loc[1, 'MAD'] == pytest.approx(25)
+
+
+def test_accuracy_measures_use_zone_column():
+    pairs = pd.DataFrame({'pID': [1, 1], 'BGM': [100., 100.], 'CGM': [100., 100.], 'zone': [0, 3]})
+    table = get_accuracy_measures(pairs)
+    assert table.loc[1, 'Zone A'] == 50 and table.loc[1, 'Zone D'] == 50
+
+
+def test_stratified_accuracy(glucose_frame, profiles):
+    pairs = get_classified_pairs(glucose_frame)
+    table = stratify_zones(pairs, profiles, 'Gender')
+    patients = get_patient_accuracy(pairs, profiles, 'Gender')
+
+    assert list(table.columns[:4]) == ['n', 'MAD', 'MARD', 'bias']
+    assert table['n'].sum() == len(pairs) == patients['n'].sum()
+    for gender, row in table.iterrows():
+        assert row['MAD'] == pytest.approx(get_accuracy_measures(pairs[pairs['pID'].isin(
+            profiles.loc[profiles['Gender'] == gender, 'pID'])].assign(g=0), by='g')['MAD'].iloc[0])
+
+    fig, drawn = compare_measures_stratified(pairs, profiles, 'Gender')
+    pd.testing.assert_frame_equal(drawn, table)
+    matplotlib.pyplot.close(fig)
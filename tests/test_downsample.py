@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from libs.downsample import downsample_series, lttb, minmax_downsample, with_breaks
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(2)
+    x = np.arange(5000, dtype=float) * 5
+    y = 140 + 40 * np.sin(x / 700) + rng.normal(0, 8, len(x))
+    return x, y
+
+
+def test_lttb_keeps_endpoints(series):
+    x, y = series
+    kept = lttb(x, y, 300)
+    assert len(kept) == 300
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_short_series_untouched(series):
+    x, y = series
+    np.testing.assert_array_equal(lttb(x[:50], y[:50], 100), np.arange(50))
+
+
+def test_minmax_keeps_every_bucket_extreme(series):
+    x, y = series
+    y = y.copy()
+    y[1234] = 400
+    y[4321] = 20
+    kept = minmax_downsample(x, y, 100)
+    assert 1234 in kept and 4321 in kept
+    assert np.all(np.diff(kept) > 0)
+    assert y[kept].max() == y.max() and y[kept].min() == y.min()
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_segments_keep_endpoints_and_break(series, method):
+    x, y = series
+    y = y.copy()
+    y[1000:1010] = np.nan          # missing readings
+    x = np.where(np.arange(len(x)) >= 3000, x + 600, x)  # a 10 hour jump in time
+
+    kept, gap_after = downsample_series(x, y, 200, max_gap=15, method=method)
+    assert np.all(np.isfinite(y[kept]))
+    for endpoint in [0, 999, 1010, 2999, 3000, len(x) - 1]:
+        assert endpoint in kept
+
+    # A break follows exactly the last point of every segment but the final one
+    np.testing.assert_array_equal(kept[gap_after], [999, 2999])
+
+    bx, by = with_breaks(x[kept], y[kept], gap_after)
+    assert len(bx) == len(kept) + 2
+    assert np.isnan(by).sum() == 2
+    assert np.all(np.diff(bx) >= 0)
+
+
+def test_all_missing():
+    kept, gap_after = downsample_series(np.arange(5.), np.full(5, np.nan), 3)
+    assert len(kept) == 0 and len(gap_after) == 0
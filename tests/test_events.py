@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.events import EventIndex, build_event_table, get_event_intervals
+from libs.glycaemic import to_minutes
+
+
+@pytest.fixture
+def table():
+    """Random, overlapping and nested intervals of three events for three patients."""
+    rng = np.random.default_rng(4)
+    n = 600
+    start = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 14 * 1440, n), unit='m')
+    length = pd.to_timedelta(rng.choice([5, 30, 120, 600, 3000], n), unit='m')
+    return pd.DataFrame({'pID': rng.choice([540, 541, 542], n), 'event': rng.choice(['sleep', 'exercise', 'hypo_event'], n),
+                         'start': start, 'end': start + length})
+
+
+def _brute_force(table, pID, start, end, events):
+    s, e = to_minutes(table['start'].values), to_minutes(table['end'].values)
+    keep = (table['pID'] == pID).values & table['event'].isin(events).values
+    if start is not None:
+        keep &= e > start
+    if end is not None:
+        keep &= s < end
+    return set(table.index[keep])
+
+
+def test_query_matches_brute_force(table):
+    index = EventIndex(table)
+    rng = np.random.default_rng(5)
+    first = to_minutes(np.array([pd.Timestamp('2020-01-01').to_datetime64()]))[0]
+    for _ in range(300):
+        pID = rng.choice([540, 541, 542, 999])
+        start = first + rng.integers(-1440, 16 * 1440)
+        end = start + rng.choice([1, 60, 1440, 7 * 1440])
+        start, end = [None if rng.random() < 0.1 else start, None if rng.random() < 0.1 else end]
+        events = None if rng.random() < 0.5 else list(rng.choice(index.events, 2, replace=False))
+        result = index.query(pID, start, end, events)
+        assert set(result.index) == _brute_force(table, pID, start, end, index.events if events is None else events)
+
+
+def test_touching_intervals_excluded(table):
+    row = table.iloc[0]
+    index = EventIndex(table.iloc[[0]])
+    start, end = to_minutes(np.array([row['start'], row['end']], dtype='datetime64[ns]'))
+    assert len(index.query(row['pID'], end, end + 60)) == 0
+    assert len(index.query(row['pID'], start - 60, start)) == 0
+    assert len(index.query(row['pID'], end - 1, end + 60)) == 1
+
+
+def test_build_event_table():
+    times = pd.date_range('2020-01-01', periods=12, freq='5min').delete([8])   # a 10 minute gap before row 8
+    flags = np.array([0, 1, 1, 0, 1, 1, 1, 1, 1, 1, 0], dtype=float)
+    start, end = get_event_intervals(times, flags)
+    np.testing.assert_array_equal(start, times[[1, 4, 8]].values)
+    np.testing.assert_array_equal(end, times[[2, 7, 9]].values + np.timedelta64(5, 'm'))
+
+    df = pd.DataFrame({'pID': 1, 'Time': times, 'sleep': flags, 'exercise': np.nan})
+    events = build_event_table(df)
+    assert events['event'].tolist() == ['sleep'] * 3
+    assert EventIndex(events).query(1, None, None, ['exercise']).empty
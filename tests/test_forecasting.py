@@ -0,0 +1,62 @@
+import pickle
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.dataset.forecasting import GlucoseWindowDataset, make_loader
+from src.dataset.transforms import ZScore
+from src.dataset.windows import write_window_arrays
+
+
+@pytest.fixture
+def root(glucose_frame, tmp_path):
+    write_window_arrays(glucose_frame, str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def transform(glucose_frame):
+    return ZScore(columns=('CGM', 'INS')).fit(glucose_frame)
+
+
+@pytest.mark.parametrize('with_transform', [False, True])
+def test_batch_matches_items(root, transform, with_transform):
+    dataset = GlucoseWindowDataset(root, history=12, horizon=6, transform=transform if with_transform else None)
+    indices = np.random.default_rng(0).choice(len(dataset), 64, replace=False)
+    x, y = dataset.get_batch(indices)
+    assert x.shape == (64, 12, 3) and y.shape == (64, 6)
+    for k, index in enumerate(indices):
+        x_k, y_k = dataset[index]
+        torch.testing.assert_close(x[k], x_k)
+        torch.testing.assert_close(y[k], y_k)
+    assert not torch.isnan(y).any()
+
+
+def test_invert_target_round_trip(root, transform):
+    plain = GlucoseWindowDataset(root, history=12, horizon=6)
+    scaled = GlucoseWindowDataset(root, history=12, horizon=6, transform=transform)
+    indices = np.arange(0, len(plain), 11)
+    _, y = plain.get_batch(indices)
+    _, y_scaled = scaled.get_batch(indices)
+    assert not np.allclose(y_scaled.numpy(), y.numpy())
+    np.testing.assert_allclose(scaled.invert_target(y_scaled, indices), y.numpy(), rtol=1e-5, atol=1e-3)
+    np.testing.assert_array_equal(plain.invert_target(y, indices), y.numpy())
+
+
+def test_pickle_drops_memory_maps(root):
+    dataset = GlucoseWindowDataset(root, history=12, horizon=6)
+    assert dataset.arrays is not None
+    state = dataset.__getstate__()
+    assert state['_arrays'] is None and state['_pid'] is None
+    copy = pickle.loads(pickle.dumps(dataset))
+    assert copy._arrays is None
+    torch.testing.assert_close(copy[5][0], dataset[5][0])
+
+
+def test_loader_covers_every_window(root):
+    dataset = GlucoseWindowDataset(root, history=12, horizon=6)
+    batches = list(make_loader(dataset, batch_size=100, shuffle=False))
+    assert sum(len(y) for _, y in batches) == len(dataset)
+    torch.testing.assert_close(batches[0][0], dataset.get_batch(np.arange(100))[0])
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from libs.glycaemic import get_lagged_values, get_lag_measures, get_mage
+from tests.synthetic import make_glucose_frame
+
+
+def _row_offset_differences(cgm, offset=288):
+    """The original row-offset pairing: reading k against reading k - offset."""
+    return np.array([cgm[k] - cgm[k - offset] for k in range(offset, len(cgm))])
+
+
+def test_modd_matches_row_offset_on_regular_grid():
+    df = make_glucose_frame(n_patients=1, days=5, gaps=False)
+    diff = _row_offset_differences(df['CGM'].values)
+    measures = get_lag_measures(df, hours=[24])
+    assert np.isclose(measures['MODD'], np.nanmean(np.abs(diff)))
+
+
+def test_conga_is_sd_of_signed_difference():
+    df = make_glucose_frame(n_patients=1, days=5, gaps=False)
+    diff = _row_offset_differences(df['CGM'].values)
+    conga = get_lag_measures(df, hours=[24])['CONGA24']
+    assert np.isclose(conga, np.nanstd(diff))
+    assert not np.isclose(conga, np.nanstd(np.abs(diff)))
+
+
+def test_lag_pairs_by_timestamp_on_irregular_grid():
+    times = pd.to_datetime(['2021-01-01 00:00', '2021-01-01 00:05', '2021-01-01 00:11',  # 1 min late
+                            '2021-01-01 01:00', '2021-01-01 01:06', '2021-01-01 01:30'])
+    values = np.array([100., 110., 120., 130., 140., 150.])
+    lagged = get_lagged_values(times, values, 60, tolerance=2.5)[0]
+    # 01:00 -> 00:00, 01:06 -> 00:05 (1 min off), 01:30 has no reading near 00:30
+    np.testing.assert_array_equal(lagged, [np.nan, np.nan, np.nan, 100., 110., np.nan])
+
+
+def test_lag_never_pairs_across_patients():
+    df = make_glucose_frame(n_patients=2, days=2, gaps=False)
+    lagged = get_lagged_values(df['Time'].values, df['CGM'].values, 24 * 60, groups=df['pID'].values)[0]
+    first_day = (df['Time'] - df.groupby('pID')['Time'].transform('min')) < pd.Timedelta(days=1)
+    assert np.isnan(lagged[first_day.values]).all()
+    assert not np.isnan(lagged[~first_day.values]).any()
+
+
+def test_lag_tolerates_dropped_rows():
+    df = make_glucose_frame(n_patients=1, days=3, gaps=False)
+    dropped = df.drop(index=range(400, 450)).reset_index(drop=True)
+    full = pd.Series(get_lagged_values(df['Time'], df['CGM'], 1440)[0], index=df['Time'])
+    partial = pd.Series(get_lagged_values(dropped['Time'], dropped['CGM'], 1440)[0], index=dropped['Time'])
+    lost = set(df['Time'][400:450] + pd.Timedelta(days=1))
+    kept = ~partial.index.isin(lost)
+    np.testing.assert_allclose(partial[kept].values, full[partial.index[kept]].values)
+
+
+def _sweep_mage(g):
+    """Hysteresis sweep over every turning point, without collapsing small oscillations first."""
+    g = g[~np.isnan(g)]
+    sd = np.std(g)
+    step = np.sign(np.diff(g))
+    moving = np.flatnonzero(step)
+    turns = moving[np.flatnonzero(step[moving][1:] != step[moving][:-1])] + 1
+    points = g[np.r_[0, turns, len(g) - 1]]
+    amplitudes, lo, hi, last, candidate, direction = [], points[0], points[0], points[0], points[0], 0
+    for v in points[1:]:
+        if direction == 0:
+            lo, hi = min(lo, v), max(hi, v)
+            if v - lo >= sd:
+                last, candidate, direction = lo, v, 1
+            elif hi - v >= sd:
+                last, candidate, direction = hi, v, -1
+        elif direction * (v - candidate) > 0:
+            candidate = v
+        elif abs(candidate - v) >= sd:
+            amplitudes.append(abs(candidate - last))
+            last, candidate, direction = candidate, v, -direction
+    if direction != 0 and abs(candidate - last) >= sd:
+        amplitudes.append(abs(candidate - last))
+    return np.mean(amplitudes) if amplitudes else np.nan
+
+
+def test_mage_collapse_keeps_the_sweep_result():
+    rng = np.random.default_rng(0)
+    for trial in range(300):
+        n = rng.integers(3, 400)
+        g = rng.normal(150, 40, n) if trial % 2 else np.cumsum(rng.normal(0, 5, n)) + 150
+        expected = _sweep_mage(g)
+        assert np.isclose(get_mage(g), expected) or (np.isnan(expected) and np.isnan(get_mage(g)))
+    g = make_glucose_frame(n_patients=1, days=14)['CGM'].values
+    assert np.isclose(get_mage(g), _sweep_mage(g))
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from libs.group_stats import bootstrap_groups, bootstrap_slope
+from libs.visualisation import compare_glycaemic_measures, get_glycaemic_table
+
+
+def _table(days=False):
+    rng = np.random.default_rng(1)
+    pIDs = np.arange(30)
+    table = pd.DataFrame({'pID': pIDs, 'Gender': np.where(pIDs % 3, 'F', 'M'), 'Age': 20 + pIDs})
+    if days:
+        table = table.loc[table.index.repeat(rng.integers(3, 9, len(table)))].reset_index(drop=True)
+    table['TIR'] = 60 + 5 * (table['Gender'] == 'F') + rng.normal(0, 10, len(table))
+    return table
+
+
+def test_bootstrap_does_not_depend_on_n_jobs():
+    table = _table()
+    serial = bootstrap_groups(table, 'Gender', 'TIR', n_boot=6000, seed=3, n_jobs=1)
+    parallel = bootstrap_groups(table, 'Gender', 'TIR', n_boot=6000, seed=3, n_jobs=2)
+    pdt.assert_frame_equal(serial, parallel)
+    assert serial['ci_low'].lt(serial['estimate']).all() and serial['ci_high'].gt(serial['estimate']).all()
+
+
+def test_day_bootstrap_does_not_depend_on_n_jobs():
+    table = _table(days=True)
+    serial = bootstrap_groups(table, 'Gender', 'TIR', n_boot=3000, resample_days=True, seed=3, n_jobs=1)
+    parallel = bootstrap_groups(table, 'Gender', 'TIR', n_boot=3000, resample_days=True, seed=3, n_jobs=2)
+    pdt.assert_frame_equal(serial, parallel)
+    assert list(serial['n']) == [10, 20] # Patients, not patient-days
+
+
+def test_bootstrap_depends_on_seed():
+    table = _table()
+    a = bootstrap_groups(table, 'Gender', 'TIR', n_boot=1000, seed=1, n_jobs=1)
+    b = bootstrap_groups(table, 'Gender', 'TIR', n_boot=1000, seed=2, n_jobs=1)
+    assert not np.allclose(a['ci_low'], b['ci_low'])
+
+
+def test_slope_bootstrap_does_not_depend_on_n_jobs():
+    table = _table()
+    assert bootstrap_slope(table, 'Age', 'TIR', n_boot=6000, seed=3, n_jobs=1) == \
+        bootstrap_slope(table, 'Age', 'TIR', n_boot=6000, seed=3, n_jobs=2)
+
+
+class Stop(Exception):
+    pass
+
+
+def _stop_after(calls):
+    count = [0]
+
+    def checkpoint():
+        count[0] += 1
+        if count[0] > calls:
+            raise Stop()
+    return checkpoint, count
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_bootstrap_stops_at_checkpoint(n_jobs):
+    checkpoint, count = _stop_after(1)
+    with pytest.raises(Stop):
+        bootstrap_groups(_table(), 'Gender', 'TIR', n_boot=10000, seed=3, n_jobs=n_jobs, checkpoint=checkpoint)
+    assert count[0] == 2
+
+
+def test_glycaemic_table_stops_at_checkpoint(glucose_frame):
+    pIDs = list(glucose_frame['pID'].unique())
+    checkpoint, count = _stop_after(1)
+    with pytest.raises(Stop):
+        get_glycaemic_table(glucose_frame, pIDs, ['SD'], checkpoint=checkpoint)
+    assert count[0] == 2
+
+    # A checkpoint that never raises leaves the table unchanged
+    pdt.assert_frame_equal(get_glycaemic_table(glucose_frame, pIDs, ['SD'], checkpoint=lambda: None),
+                           get_glycaemic_table(glucose_frame, pIDs, ['SD']))
+
+
+@pytest.mark.parametrize('measure', ['MODD', 'CONGA24'])
+def test_day_bootstrap_of_multi_day_measures(glucose_frame, profiles, measure):
+    pIDs = list(glucose_frame['pID'].unique())
+    daily = get_glycaemic_table(glucose_frame, pIDs, [measure], daily=True)
+    daily['Gender'] = daily['pID'].map(profiles.set_index('pID')['Gender'])
+    assert daily[measure].isna().all()
+
+    # Empty categories give NaN instead of failing inside the resampling
+    result = bootstrap_groups(daily, 'Gender', measure, n_boot=200, resample_days=True, n_jobs=1, order=['M', 'F'])
+    assert result['n'].tolist() == [0, 0]
+    assert result[['estimate', 'ci_low', 'ci_high', 'p_value']].isna().all().all()
+
+    with pytest.raises(ValueError, match='bootstrap'):
+        compare_glycaemic_measures(glucose_frame, profiles.copy(), pIDs, measure, 'Gender', bootstrap='days', n_boot=200, n_jobs=1)
+
+
+def test_bootstrap_with_an_empty_category():
+    table = _table()
+    result = bootstrap_groups(table, 'Gender', 'TIR', n_boot=500, n_jobs=1, order=['M', 'F', 'X'])
+    assert result.loc['X', 'n'] == 0 and result.loc['X', ['ci_low', 'ci_high', 'p_value']].isna().all()
+    assert result.loc['F', ['ci_low', 'ci_high', 'p_value']].notna().all()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dataset.imputation import impute_gaps
+
+
+def _frame():
+    """Two patients on a 5 minute grid with a linear CGM trace and NaN runs of 1, 3, 6 and 7 readings."""
+    frames = []
+    for pID in [1, 2]:
+        times = pd.date_range('2020-01-01', periods=60, freq='5min')
+        cgm = 100 + 2.0 * np.arange(60) + 50 * (pID - 1)
+        cgm[[0, 1]] = np.nan             # leading
+        cgm[5] = np.nan                  # 1 reading: 5 minutes
+        cgm[10:13] = np.nan              # 3 readings: 15 minutes
+        cgm[20:26] = np.nan              # 6 readings: 30 minutes
+        cgm[35:42] = np.nan              # 7 readings: 35 minutes, longer than max_gap
+        cgm[58:] = np.nan                # trailing
+        frames.append(pd.DataFrame({'pID': pID, 'Time': times, 'CGM': cgm}))
+    return pd.concat(frames, ignore_index=True)
+
+
+FILLED = [5, 10, 11, 12] + list(range(20, 26))
+
+
+@pytest.mark.parametrize('method', ['linear', 'spline', 'ffill'])
+def test_only_gaps_up_to_max_gap_are_filled(method):
+    df = _frame()
+    out = impute_gaps(df, method, max_gap=30)
+
+    for pID, patient in out.groupby('pID'):
+        imputed = np.flatnonzero(patient['CGM_imputed'].values)
+        assert imputed.tolist() == FILLED
+        assert patient['CGM'].iloc[FILLED].notna().all()
+        assert patient['CGM'].iloc[[0, 1, 58, 59] + list(range(35, 42))].isna().all()
+
+    # Readings that were present are not changed
+    present = df['CGM'].notna()
+    np.testing.assert_array_equal(out.loc[present, 'CGM'], df.loc[present, 'CGM'])
+
+
+def test_max_gap_bound():
+    out = impute_gaps(_frame(), max_gap=29)
+    assert np.flatnonzero(out.loc[out['pID'] == 1, 'CGM_imputed']).tolist() == [5, 10, 11, 12]
+    assert impute_gaps(_frame(), max_gap=35)['CGM_imputed'].sum() == 2 * (len(FILLED) + 7)
+
+
+@pytest.mark.parametrize('method', ['linear', 'spline'])
+def test_interpolation_recovers_a_line(method):
+    out = impute_gaps(_frame(), method, max_gap=30)
+    rows = out['CGM_imputed'] == 1
+    expected = 100 + 2.0 * (out.index % 60) + 50 * (out['pID'] - 1)
+    np.testing.assert_allclose(out.loc[rows, 'CGM'], expected[rows])
+
+
+def test_ffill_carries_last_reading():
+    out = impute_gaps(_frame(), 'ffill', max_gap=30)
+    patient = out[out['pID'] == 1]['CGM'].values
+    assert (patient[10:13] == patient[9]).all() and (patient[20:26] == patient[19]).all()
+
+
+def test_gap_between_patients_not_filled():
+    df = _frame()
+    # Patient 1 ends and patient 2 starts with a valid reading next to a short NaN run of the other patient
+    df.loc[df['pID'] == 1, 'CGM'] = df.loc[df['pID'] == 1, 'CGM'].fillna(150)
+    df.loc[59, 'CGM'] = np.nan
+    out = impute_gaps(df, max_gap=30)
+    assert out.loc[[59, 60, 61], 'CGM_imputed'].eq(0).all() and out.loc[[59, 60, 61], 'CGM'].isna().all()
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        impute_gaps(_frame(), 'cubic')
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.onboard import carbs_on_board_curve, fft_convolve, get_action_curves, get_on_board, insulin_on_board_curve, load_on_board
+
+
+@pytest.mark.parametrize('n, k, block', [(10000, 73, 4096), (5000, 37, 64), (100, 73, 4096), (50, 120, 16), (1, 5, 8)])
+def test_fft_convolve_matches_np_convolve(n, k, block):
+    rng = np.random.default_rng(n + k)
+    x = rng.exponential(1, n) * (rng.random(n) < 0.1)
+    kernel = rng.random(k)
+    np.testing.assert_allclose(fft_convolve(x, kernel, block), np.convolve(x, kernel)[:n], atol=1e-9)
+
+
+def test_fft_convolve_empty():
+    assert len(fft_convolve(np.zeros(0), np.ones(3))) == 0
+    np.testing.assert_array_equal(fft_convolve(np.ones(4), np.zeros(0)), np.zeros(4))
+
+
+def test_action_curves():
+    iob, cob = insulin_on_board_curve(), carbs_on_board_curve()
+    assert iob[0] == pytest.approx(1) and iob[-1] == pytest.approx(0, abs=1e-9) and np.all(np.diff(iob) <= 1e-12)
+    assert cob[0] == 1 and cob[-1] == 0 and len(cob) == 180 // 5 + 1
+
+
+def test_on_board_per_patient(glucose_frame):
+    on_board = get_on_board(glucose_frame)
+    curves = get_action_curves()
+    for pID, df in glucose_frame.groupby('pID'):
+        # Reference: each patient's doses on its own 5 minute grid, convolved directly
+        steps = np.rint((df['Time'] - df['Time'].iloc[0]) / pd.Timedelta(minutes=5)).astype(int).values
+        result = on_board[on_board['pID'] == pID]
+        for name, (column, curve) in curves.items():
+            doses = np.zeros(steps.max() + 1)
+            np.add.at(doses, steps, df[column].fillna(0).values)
+            expected = np.maximum(np.convolve(doses, curve)[:len(doses)], 0)[steps]
+            np.testing.assert_allclose(result[name].values, expected, rtol=1e-5, atol=1e-4)
+
+
+def test_load_on_board_checks_curves(glucose_frame, tmp_path):
+    path = str(tmp_path / 'onboard.pkl')
+    default = load_on_board(path, glucose_frame)
+    assert os.path.exists(path)
+    pd.testing.assert_frame_equal(load_on_board(path), default)
+
+    # Other curves or another res are not served from the saved traces
+    fast = {'IOB': ('INS', insulin_on_board_curve(duration=240, peak=55))}
+    with pytest.raises(FileNotFoundError):
+        load_on_board(path, curves=fast)
+    with pytest.raises(FileNotFoundError):
+        load_on_board(path, res=10)
+    recomputed = load_on_board(path, glucose_frame, curves=fast)
+    pd.testing.assert_frame_equal(recomputed, get_on_board(glucose_frame, fast))
+    pd.testing.assert_frame_equal(load_on_board(path, curves=fast), recomputed)
@@ -0,0 +1,52 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from libs.plot_cache import PlotCache, get_nbytes
+
+
+def test_evicts_least_recently_used():
+    cache = PlotCache(max_bytes=300)
+    assert cache.put('a', 'A', 100) == []
+    assert cache.put('b', 'B', 100) == []
+    assert cache.put('c', 'C', 100) == []
+    assert cache.get('a') == 'A' # 'b' is now the least recently used
+
+    assert cache.put('d', 'D', 100) == ['B']
+    assert 'b' not in cache and all(key in cache for key in 'acd')
+    assert cache.nbytes == 300 and len(cache) == 3
+
+
+def test_evicts_until_within_budget():
+    cache = PlotCache(max_bytes=300)
+    for key in 'abc':
+        cache.put(key, key.upper(), 100)
+    assert cache.put('big', 'BIG', 250) == ['A', 'B', 'C']
+    assert list(cache._entries) == ['big'] and cache.nbytes == 250
+
+
+def test_oversized_value_not_stored():
+    cache = PlotCache(max_bytes=300)
+    cache.put('a', 'A', 100)
+    assert cache.put('huge', 'HUGE', 301) == ['HUGE']
+    assert 'huge' not in cache and 'a' in cache and cache.nbytes == 100
+
+
+def test_replace_and_clear():
+    cache = PlotCache(max_bytes=300)
+    cache.put('a', 'A', 200)
+    cache.put('a', 'A2', 50)
+    assert cache.get('a') == 'A2' and cache.nbytes == 50
+    assert cache.get('missing', 'default') == 'default'
+
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_nbytes_of_plot_data():
+    values = np.zeros(1000)
+    frame = pd.DataFrame({'x': np.zeros(100)})
+    assert get_nbytes(values) == 8000
+    assert get_nbytes({'values': values, 'parts': [values, values]}) == 24000
+    assert get_nbytes(functools.partial(print, values, frame=frame)) == 8000 + get_nbytes(frame)
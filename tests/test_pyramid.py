@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.glycaemic import to_minutes
+from libs.pyramid import LEVELS, build_pyramid, load_pyramid, query_pyramid, save_pyramid, select_level
+
+
+@pytest.fixture
+def pyramid(glucose_frame):
+    return build_pyramid(glucose_frame)
+
+
+@pytest.mark.parametrize('level', list(LEVELS))
+def test_buckets_match_a_groupby(glucose_frame, pyramid, level):
+    width = LEVELS[level]
+    frame = glucose_frame.assign(Minute=np.floor(to_minutes(glucose_frame['Time'].values) / width) * width)
+    for pID, df in frame.groupby('pID'):
+        grouped = df.groupby('Minute')
+        expected = pd.DataFrame({'n': grouped['CGM'].count(), 'CGM_min': grouped['CGM'].min(),
+                                 'CGM_mean': grouped['CGM'].mean(), 'CGM_max': grouped['CGM'].max(),
+                                 'CRB': grouped['CRB'].sum(), 'INS': grouped['INS'].sum()})
+        result = pyramid[level][pID]
+        assert result['Minute'].is_monotonic_increasing
+        np.testing.assert_array_equal(result['Minute'].values, expected.index.values)
+        np.testing.assert_array_equal(result['Time'].values, pd.to_datetime(expected.index.values * 60, unit='s').values)
+        np.testing.assert_array_equal(result['n'].values, expected['n'].values)
+        for column in ['CGM_min', 'CGM_mean', 'CGM_max', 'CRB', 'INS']:
+            np.testing.assert_allclose(result[column].values, expected[column].values, rtol=1e-9, err_msg=column)
+
+
+def test_select_level():
+    levels = list(LEVELS)
+    for span in [60, 5 * 2000, 5 * 2000 + 1, 60 * 2000, 1440 * 2000 + 1, 10 ** 9]:
+        level = select_level(span, 2000)
+        index = levels.index(level)
+        # The finest level that fits, unless even the coarsest one does not
+        assert span / LEVELS[level] <= 2000 or index == len(levels) - 1
+        assert index == 0 or span / LEVELS[levels[index - 1]] > 2000
+    assert select_level(5 * 2000) == '5min' and select_level(5 * 2000 + 1) == '1h'
+
+
+@pytest.mark.parametrize('level', ['5min', '1h', '1d'])
+def test_query_returns_overlapping_buckets(pyramid, level):
+    width = LEVELS[level]
+    for pID, frame in pyramid[level].items():
+        minutes = frame['Minute'].values
+        for start, end in [(minutes[0] + 7.5, minutes[0] + 3 * width), (minutes[-1] - 1, minutes[-1] + 1),
+                           (minutes[0] - 100, minutes[0] - 50), (minutes[len(minutes) // 2] + 0.5, None), (None, None)]:
+            result = query_pyramid(pyramid, level, pID, start, end)
+            lo = -np.inf if start is None else start
+            hi = np.inf if end is None else end
+            overlaps = (minutes + width > lo) & (minutes <= hi)
+            np.testing.assert_array_equal(result['Minute'].values, minutes[overlaps])
+
+
+def test_save_and_load(pyramid, tmp_path):
+    path = tmp_path / 'pyramid.pkl'
+    save_pyramid(pyramid, path)
+    loaded = load_pyramid(path)
+    assert loaded.keys() == pyramid.keys()
+    for level in pyramid:
+        assert loaded[level].keys() == pyramid[level].keys()
+        for pID in pyramid[level]:
+            pd.testing.assert_frame_equal(loaded[level][pID], pyramid[level][pID])
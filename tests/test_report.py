@@ -0,0 +1,47 @@
+import json
+import os
+
+from report import expand_spec, render_report
+
+
+def test_expand_spec_names_are_unique():
+    spec = {'plots': [{'type': 'individual', 'pIDs': [540, 541]},
+                      {'type': 'individual', 'pIDs': [540], 'start_day': 1},
+                      {'type': 'group_variation', 'categories': ['Age Range']}]}
+    tasks = expand_spec(spec, [540, 541, 542], ['Gender', 'Age Range'])
+    assert [task['name'] for task in tasks] == ['individual_540_0', 'individual_541', 'individual_540_1',
+                                                'group_variation_Age-Range']
+    assert tasks[2]['start_day'] == 1
+
+
+def test_render_report(glucose_frame, profiles, tmp_path):
+    spec = {'formats': ['png', 'svg'], 'dpi': 40,
+            'plots': [{'type': 'individual', 'pIDs': [540], 'end_day': 1},
+                      {'type': 'individual', 'pIDs': [540], 'start_day': 1, 'end_day': 2},
+                      {'type': 'ceg', 'categories': ['Gender']},
+                      {'type': 'metric_comparison', 'measures': ['TIR', 'MODD'], 'categories': ['Gender'],
+                       'bootstrap': 'days'}]}
+    results = render_report(glucose_frame, profiles, 'OhioT1DM', spec, str(tmp_path), n_jobs=1)
+
+    names = ['individual_540_0', 'individual_540_1', 'ceg_Gender', 'metric_comparison_TIR_Gender',
+             'metric_comparison_MODD_Gender']
+    assert [r['name'] for r in results] == names
+
+    with open(tmp_path / 'index.json') as f:
+        index = json.load(f)
+    assert index['dataset'] == 'OhioT1DM'
+    assert [figure['name'] for figure in index['figures']] == names
+    assert (tmp_path / 'index.html').exists()
+
+    # MODD cannot be resampled by day: that figure fails on its own and the others are still written
+    errors = {figure['name']: figure['error'] for figure in index['figures']}
+    assert errors.pop('metric_comparison_MODD_Gender').startswith('ValueError')
+    assert all(error is None for error in errors.values())
+    by_name = {figure['name']: figure['files'] for figure in index['figures']}
+    assert by_name['metric_comparison_MODD_Gender'] == []
+    assert by_name['individual_540_0'] == ['individual/individual_540_0.png', 'individual/individual_540_0.svg']
+    assert by_name['ceg_Gender'] == ['ceg/ceg_Gender.png', 'ceg/ceg_Gender.svg', 'ceg/ceg_Gender.accuracy.csv',
+                                     'ceg/ceg_Gender.patient_accuracy.csv']
+    for files in by_name.values():
+        for path in files:
+            assert os.path.getsize(tmp_path / path) > 0
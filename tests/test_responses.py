@@ -0,0 +1,121 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from libs.responses import get_event_responses, get_response_measures, get_response_windows, summarise_responses
+
+
+@pytest.fixture
+def bolus_frame(glucose_frame):
+    df = glucose_frame.copy()
+    ins = df['INS'].values
+    for pID, rows in df.groupby('pID').indices.items():
+        ins[rows[0]] = ins[rows[-1]] = 4 # Events on the first and last row of every patient
+        ins[rows[100:103]] = [3, 2, 1] # A bolus spread over three rows counts once
+        ins[rows[299:301]] = 2 # Consecutive rows either side of the missing rows are two events
+        ins[rows[200]] = 0.3 # Below MIN_EVENT_AMOUNT
+    return df
+
+
+def _scan_windows(df, event, before, after, res, min_amount):
+    """Reference: find every onset row by row and look each window reading up by patient and time."""
+    readings = {(pID, time): cgm for pID, time, cgm in zip(df['pID'], df['Time'], df['CGM'])}
+    offsets = np.arange(-(before // res), after // res + 1) * res
+    events, windows = [], []
+    previous = None
+    for pID, time, amount in zip(df['pID'], df['Time'], df[event]):
+        flagged = np.nan_to_num(amount) > min_amount
+        onset = flagged and not (previous is not None and previous[0] == pID and previous[2]
+                                 and time - previous[1] == pd.Timedelta(minutes=res))
+        if onset:
+            events.append((pID, time, amount))
+            windows.append([readings.get((pID, time + pd.Timedelta(minutes=int(m))), np.nan) for m in offsets])
+        previous = (pID, time, flagged)
+    return pd.DataFrame(events, columns=['pID', 'Time', 'amount']), np.array(windows, dtype=np.float32), offsets
+
+
+@pytest.mark.parametrize('event, before, after', [('INS', 30, 180), ('CRB', 60, 120), ('INS', 0, 15)])
+def test_windows_match_a_scan(bolus_frame, event, before, after):
+    min_amount = 0.5 if event == 'INS' else 0
+    events, windows, offsets = get_response_windows(bolus_frame, event, before, after)
+    expected_events, expected_windows, expected_offsets = _scan_windows(bolus_frame, event, before, after, 5, min_amount)
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    pdt.assert_frame_equal(events, expected_events)
+    np.testing.assert_array_equal(windows, expected_windows)
+
+
+def test_window_onsets(bolus_frame):
+    events, windows, offsets = get_response_windows(bolus_frame, 'INS')
+    for pID, df in bolus_frame.groupby('pID'):
+        onsets = np.isin(df['Time'].values, events.loc[events['pID'] == pID, 'Time'].values)
+        assert onsets[[0, -1, 100, 299, 300]].all() and not onsets[[101, 102, 200]].any()
+    # Windows at the ends of a patient stop at the patient instead of reading its neighbour
+    last = events.groupby('pID').tail(1).index
+    first = events.groupby('pID').head(1).index
+    assert np.isnan(windows[last][:, offsets > 0]).all()
+    assert np.isnan(windows[first][:, offsets < 0]).all()
+
+
+def test_response_measures_on_a_constructed_curve():
+    offsets = np.arange(-30, 185, 5)
+    curve = np.where(offsets <= 0, 100, 100 + 50 * np.exp(-((offsets - 60) / 30.) ** 2))
+    windows = np.array([curve, curve + 20], dtype=np.float32)
+    windows[1, offsets == -30] = np.nan # Outside the baseline period
+    windows[1, offsets == -10] = 70 # Baseline (70 + 3 * 120) / 4
+    measures, responses = get_response_measures(windows, offsets, baseline=15)
+
+    np.testing.assert_allclose(measures['baseline'], [100, (70 + 3 * 120) / 4])
+    np.testing.assert_allclose(measures['peak_rise'], [50, 170 - (70 + 3 * 120) / 4], rtol=1e-6)
+    np.testing.assert_array_equal(measures['time_to_peak'], [60, 60])
+    np.testing.assert_array_equal(measures['coverage'], [1, 1])
+    np.testing.assert_allclose(responses, windows - measures['baseline'].values[:, None], rtol=1e-6)
+
+
+@pytest.mark.parametrize('min_coverage', [0.5, 0.8])
+def test_min_coverage(min_coverage):
+    offsets = np.arange(-15, 65, 5)
+    windows = np.tile(np.linspace(100, 180, len(offsets)), (3, 1))
+    post = np.flatnonzero(offsets >= 0)
+    windows[1, post[:4]] = np.nan # 4 of 13 post-event readings missing: coverage 9/13
+    windows[2, offsets < 0] = np.nan
+    windows[2, offsets == 0] = np.nan # No baseline reading
+    measures, _ = get_response_measures(windows, offsets, baseline=15, min_coverage=min_coverage)
+
+    np.testing.assert_allclose(measures['coverage'][:2], [1, 9 / 13])
+    assert measures['peak_rise'].notna().tolist() == [True, min_coverage <= 9 / 13, False]
+    assert measures['time_to_peak'].isna().tolist() == measures['peak_rise'].isna().tolist()
+
+
+def test_grouping_by_category(glucose_frame, profiles):
+    responses, table, mean, sem = get_event_responses(glucose_frame, 'CRB', profiles, 'Gender')
+    assert table.index.name == 'Gender' and list(table.index) == ['F', 'M']
+
+    events, windows, offsets = get_response_windows(glucose_frame, 'CRB')
+    measures, curves = get_response_measures(windows, offsets)
+    gender = events['pID'].map(profiles.set_index('pID')['Gender']).values
+    for group in ['F', 'M']:
+        rows = (gender == group) & measures['peak_rise'].notna().values
+        assert table.loc[group, 'n'] == rows.sum()
+        assert table.loc[group, 'peak_rise'] == pytest.approx(measures['peak_rise'][rows].mean())
+        assert table.loc[group, 'time_to_peak'] == measures['time_to_peak'][rows].median()
+        np.testing.assert_allclose(mean.loc[group].values, np.nanmean(curves[rows], axis=0), rtol=1e-5)
+        post = mean.loc[group, offsets >= 0]
+        assert table.loc[group, 'curve_peak_rise'] == pytest.approx(post.max())
+        assert table.loc[group, 'curve_time_to_peak'] == post.idxmax()
+    pdt.assert_frame_equal(responses[['pID', 'Time', 'amount']], events)
+
+    # Without a category the windows are grouped by patient
+    by_patient = summarise_responses(events, measures, curves, offsets)[0]
+    assert list(by_patient.index) == [540, 541, 542] and by_patient['n'].sum() == table['n'].sum()
+
+
+def test_no_events(glucose_frame):
+    glucose_frame['CRB'] = 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        responses, table, mean, sem = get_event_responses(glucose_frame, 'CRB')
+    assert len(responses) == 0 and len(table) == 0 and len(mean) == 0
+    assert (table.dtypes[['peak_rise', 'time_to_peak', 'curve_peak_rise', 'curve_time_to_peak']] == float).all()
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from src.dataset.schema import compact_dtypes, get_cache_path, load_dataset, save_dataset
+
+
+def test_compact_dtypes(glucose_frame):
+    compact = compact_dtypes(glucose_frame)
+    assert compact['pID'].dtype == np.int32
+    assert all(compact[c].dtype == np.float32 for c in ['CGM', 'BGM', 'CRB', 'INS'])
+    assert all(compact[c].dtype == np.uint8 for c in ['hypo_event', 'sleep', 'exercise'])
+    assert compact.memory_usage(deep=True).sum() < glucose_frame.memory_usage(deep=True).sum()
+
+    # Values survive the cast: glucose to float32 precision (NaN stays NaN), IDs and flags exactly
+    pdt.assert_frame_equal(compact.astype({c: float for c in compact.columns if c != 'Time'}),
+                           glucose_frame.astype({c: float for c in glucose_frame.columns if c != 'Time'}),
+                           check_dtype=False, rtol=1e-6)
+    assert compact_dtypes(compact) is compact
+
+
+def test_compact_dtypes_fallbacks():
+    df = pd.DataFrame({'pID': ['a', 'b', 'a'], 'sleep': [0, np.nan, 1], 'exercise': [0, 300, 1],
+                       'Time': ['2020-01-01 00:00', '2020-01-01 00:05', '2020-01-01 00:10']})
+    compact = compact_dtypes(df)
+    assert compact['pID'].dtype == 'category' and list(compact['pID']) == ['a', 'b', 'a']
+    assert compact['sleep'].dtype == np.float32 and np.isnan(compact['sleep'][1])
+    assert compact['exercise'].dtype == np.float32 and compact['exercise'][1] == 300
+    assert pd.api.types.is_datetime64_any_dtype(compact['Time'])
+
+
+def test_save_load_round_trip(glucose_frame, tmp_path):
+    csv_path = str(tmp_path / 'glucose.csv')
+    save_dataset(glucose_frame, csv_path)
+    expected = compact_dtypes(glucose_frame)
+
+    # From the typed pickle
+    pdt.assert_frame_equal(load_dataset(csv_path), expected)
+
+    # From the CSV when the pickle is older, which also rewrites the pickle
+    os.utime(get_cache_path(csv_path), (0, 0))
+    from_csv = load_dataset(csv_path)
+    pdt.assert_frame_equal(from_csv, expected, check_freq=False)
+    assert os.path.getmtime(get_cache_path(csv_path)) >= os.path.getmtime(csv_path)
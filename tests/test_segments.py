@@ -0,0 +1,84 @@
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+from libs.visualisation import draw_individual_plot, get_individual_data
+from src.dataset.segments import build_segment_index, count_valid_windows, get_daily_coverage, get_long_segments, get_valid_windows
+
+
+def _reference_segments(times, cgm, res=5):
+    """Row-by-row reference: a valid reading starts a segment unless the previous row is valid and at most 1.5 res earlier."""
+    first, last = [], []
+    for k in range(len(cgm)):
+        if np.isnan(cgm[k]):
+            continue
+        if k and not np.isnan(cgm[k - 1]) and (times[k] - times[k - 1]) <= pd.Timedelta(minutes=1.5 * res):
+            last[-1] = k
+        else:
+            first.append(k)
+            last.append(k)
+    return first, last
+
+
+def test_segment_index(glucose_frame):
+    index = build_segment_index(glucose_frame)
+    for pID, df in glucose_frame.groupby('pID'):
+        segments = index[index['pID'] == pID]
+        first, last = _reference_segments(df['Time'].tolist(), df['CGM'].values)
+        assert segments['start_row'].tolist() == first
+        assert segments['end_row'].tolist() == last
+        assert segments['n'].sum() == np.isfinite(df['CGM']).sum()
+        assert (segments['start'].values == df['Time'].values[first]).all()
+
+
+def test_segment_queries():
+    start = pd.Timestamp('2020-01-01 22:00')
+    index = pd.DataFrame({'pID': [1, 1, 2], 'start_row': [0, 30, 0], 'end_row': [23, 29 + 48, 11],
+                          'start': [start, start + pd.Timedelta(hours=3), start],
+                          'end': [start + pd.Timedelta(minutes=115), start + pd.Timedelta(minutes=180 + 235), start + pd.Timedelta(minutes=55)],
+                          'n': [24, 48, 12], 'minutes': [120., 240., 60.]})
+
+    assert list(get_long_segments(index, 2).index) == [0, 1]
+    assert count_valid_windows(index, 12).to_dict() == {1: 13 + 37, 2: 1}
+    windows = get_valid_windows(index, 12, stride=12)
+    assert windows['start_row'].tolist() == [0, 12, 30, 42, 54, 66, 0]
+
+    coverage = get_daily_coverage(index).set_index(['pID', 'day'])['coverage']
+    # Patient 1: 2 h on Jan 1 (22:00 to midnight) and 4 h on Jan 2 (01:00 to 05:00)
+    assert coverage[(1, pd.Timestamp('2020-01-01'))] == 100 * 120 / 1440
+    assert coverage[(1, pd.Timestamp('2020-01-02'))] == 100 * 240 / 1440
+    assert coverage[(2, pd.Timestamp('2020-01-01'))] == 100 * 60 / 1440
+
+
+def test_individual_plot_uses_segments(glucose_frame):
+    index = build_segment_index(glucose_frame)
+    scanned = get_individual_data(glucose_frame, 'OhioT1DM', 540, 1, 3, max_points=300)
+    indexed = get_individual_data(glucose_frame, 'OhioT1DM', 540, 1, 3, max_points=300, segments=index)
+
+    np.testing.assert_array_equal(indexed['CGM'][0], scanned['CGM'][0])
+    np.testing.assert_array_equal(indexed['CGM'][1], scanned['CGM'][1])
+
+    df = glucose_frame[glucose_frame['pID'] == 540]
+    days = df['Time'].between(df['Time'].iloc[0].normalize() + pd.Timedelta(days=1),
+                              df['Time'].iloc[0].normalize() + pd.Timedelta(days=3))
+    selected = df.loc[days]
+    span = (selected['Time'].iloc[-1] - selected['Time'].iloc[0]) / pd.Timedelta(minutes=1) + 5
+    assert indexed['coverage'] == np.isfinite(selected['CGM']).sum() * 5 / span * 100
+    assert 'coverage' not in scanned
+
+
+def test_individual_plot_updates_returned_artists(glucose_frame):
+    index = build_segment_index(glucose_frame)
+    first = get_individual_data(glucose_frame, 'OhioT1DM', 540, 0, 2, max_points=300, segments=index)
+    second = get_individual_data(glucose_frame, 'OhioT1DM', 541, 1, 3, max_points=300, segments=index)
+    fig, artists = draw_individual_plot(first, 'OhioT1DM', 540, matplotlib.figure.Figure())
+    axes = list(fig.axes)
+
+    same_fig, same_artists = draw_individual_plot(second, 'OhioT1DM', 541, fig, artists)
+    assert same_fig is fig and same_artists is artists and list(fig.axes) == axes
+    np.testing.assert_array_equal(artists['CGM'].get_ydata(), second['CGM'][1])
+
+    # Artists of another dataset (or none) rebuild the axes
+    _, rebuilt = draw_individual_plot(second, 'T1DEXI', 541, fig, artists)
+    assert rebuilt is not artists and rebuilt['axes'][0] in fig.axes and axes[0] not in fig.axes
@@ -0,0 +1,61 @@
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+import scipy.stats as sps
+
+from libs.group_stats import compare_groups, significance_matrix
+from libs.visualisation import compare_glycaemic_matrix, get_glycaemic_table
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(7)
+    n = 40
+    table = pd.DataFrame({'pID': np.arange(n), 'Gender': rng.choice(['M', 'F'], n),
+                          'Group': rng.choice(['a', 'b', 'c'], n), 'Age': rng.integers(18, 70, n)})
+    table['TIR'] = 60 + 8 * (table['Gender'] == 'F') + rng.normal(0, 10, n)
+    table['SD'] = 30 + 0.3 * table['Age'] + rng.normal(0, 5, n)
+    table.loc[3, 'SD'] = np.nan
+    return table
+
+
+def _direct(table, measure, category):
+    frame = table[[measure, category]].dropna()
+    if pd.api.types.is_numeric_dtype(frame[category]):
+        return sps.spearmanr(frame[category], frame[measure])
+    return sps.kruskal(*[v.values for _, v in frame.groupby(category, sort=False)[measure]])
+
+
+def test_matrix_matches_scipy(table):
+    measures, categories = ['TIR', 'SD'], ['Gender', 'Group', 'Age']
+    matrix = significance_matrix(table, measures, categories, n_jobs=1)
+
+    assert list(zip(matrix['measure'], matrix['category'])) == [(m, c) for m in measures for c in categories]
+    for _, row in matrix.iterrows():
+        statistic, p_value = _direct(table, row['measure'], row['category'])
+        assert row['statistic'] == pytest.approx(statistic) and row['p_value'] == pytest.approx(p_value)
+        assert row['test'] == ('Spearman' if row['category'] == 'Age' else 'Kruskal-Wallis')
+        assert row['n'] == table[[row['measure'], row['category']]].dropna().shape[0]
+
+    pdt.assert_frame_equal(significance_matrix(table, measures, categories, n_jobs=2), matrix)
+
+
+def test_compare_groups_degenerate():
+    assert np.isnan(compare_groups(np.ones(5), np.array(['a'] * 5))['p_value'])
+    assert np.isnan(compare_groups(np.arange(5.), np.ones(5))['p_value'])
+    assert compare_groups(np.array([np.nan]), np.array(['a']))['n'] == 0
+
+
+def test_glycaemic_matrix(glucose_frame, profiles):
+    pIDs = list(glucose_frame['pID'].unique())
+    table = get_glycaemic_table(glucose_frame, pIDs, ['SD', 'TIR'])
+    fig, matrix = compare_glycaemic_matrix(glucose_frame, profiles, pIDs, ['SD', 'TIR'], ['Gender'], table=table, n_jobs=1)
+
+    merged = profiles.merge(table, on='pID')
+    for measure in ['SD', 'TIR']:
+        p_value = matrix.set_index('measure').loc[measure, 'p_value']
+        assert p_value == pytest.approx(_direct(merged, measure, 'Gender')[1])
+    matplotlib.pyplot.close(fig)
@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded while the GUI starts (submodules that only exist once the lazy imports ran)
+HEAVY_MODULES = ['torch', 'seaborn.axisgrid', 'scipy.stats._stats_py']
+
+# Seconds our own modules may add to the import of numpy, pandas, matplotlib and tkinter, which every start pays
+BUDGET = 0.5
+
+
+def _import_in_fresh_interpreter(module):
+    """Imports module in a new interpreter after the third-party libraries it always needs; returns seconds and heavy modules loaded."""
+    code = ("import json, sys, time; import numpy, pandas, matplotlib.pyplot, tkinter; "
+            f"start = time.perf_counter(); import {module}; seconds = time.perf_counter() - start; "
+            f"print(json.dumps([seconds, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', ['main', 'libs.visualisation', 'report'])
+def test_startup_is_lazy(module):
+    seconds, loaded = _import_in_fresh_interpreter(module)
+    assert loaded == []
+    assert seconds < BUDGET
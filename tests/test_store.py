@@ -0,0 +1,93 @@
+import numpy as np
+import pandas.testing as pdt
+import pytest
+
+from libs.visualisation import GLYCAEMIC_MEASURES, get_daily_profile, get_glycaemic_table
+from src.dataset.schema import compact_dtypes, save_dataset
+from src.dataset.store import CSV_ROW_BYTES, PatientStore, iter_patients
+
+
+@pytest.fixture
+def frame(glucose_frame):
+    return compact_dtypes(glucose_frame).reset_index(drop=True)
+
+
+@pytest.fixture
+def csv_store(frame, tmp_path):
+    csv_path = str(tmp_path / 'glucose.csv')
+    save_dataset(frame, csv_path)
+    # Budget for 400 rows per chunk: every patient is written in several parts
+    return PatientStore.from_csv(csv_path, str(tmp_path / 'store'), memory_budget=400 * CSV_ROW_BYTES)
+
+
+@pytest.fixture(params=['frames', 'csv'])
+def store(request, frame, tmp_path):
+    if request.param == 'csv':
+        return request.getfixturevalue('csv_store')
+    return PatientStore.from_frames((df for _, df in frame.groupby('pID')), str(tmp_path / 'store'))
+
+
+def test_partitions_match_the_frame(frame, store):
+    assert store.pIDs == list(frame['pID'].unique())
+    for pID, df in frame.groupby('pID'):
+        assert store.index[pID]['rows'] == len(df)
+        pdt.assert_frame_equal(store.read_partition(pID), df.reset_index(drop=True))
+    pdt.assert_frame_equal(store.read_partition(540, ['Time', 'CGM']),
+                           frame.loc[frame['pID'] == 540, ['Time', 'CGM']].reset_index(drop=True))
+
+
+def test_iter_patients(frame, store):
+    for data in (frame, store):
+        assert [pID for pID, _ in iter_patients(data)] == [540, 541, 542]
+        selected = list(iter_patients(data, [542, 540], ['Time', 'CGM']))
+        assert [pID for pID, _ in selected] == [542, 540]
+        for pID, df in selected:
+            pdt.assert_frame_equal(df.reset_index(drop=True),
+                                   frame.loc[frame['pID'] == pID, ['Time', 'CGM']].reset_index(drop=True))
+        assert [pID for pID, _ in iter_patients(data, [999, 541], skip_missing=True)] == [541]
+        with pytest.raises(KeyError):
+            list(iter_patients(data, [999, 541]))
+
+
+def test_csv_store_is_split_into_parts(csv_store):
+    assert all(entry['parts'] > 1 for entry in csv_store.index.values())
+
+
+def test_glycaemic_table_matches_the_frame(frame, store):
+    pIDs = [542, 540, 541]
+    pdt.assert_frame_equal(get_glycaemic_table(store, pIDs, GLYCAEMIC_MEASURES, 1, 3),
+                           get_glycaemic_table(frame, pIDs, GLYCAEMIC_MEASURES, 1, 3))
+    pdt.assert_frame_equal(get_glycaemic_table(store, pIDs, ['SD', 'TIR'], daily=True),
+                           get_glycaemic_table(frame, pIDs, ['SD', 'TIR'], daily=True))
+
+
+@pytest.mark.parametrize('interval', ['sparse', 'dense'])
+def test_daily_profile_matches_the_frame(frame, store, interval):
+    pIDs = [540, 541, 542, 999] # Subjects without data are skipped
+    expected = get_daily_profile(frame, pIDs, interval)
+    result = get_daily_profile(store, pIDs, interval)
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_allclose(result[1], expected[1], rtol=1e-12)
+    np.testing.assert_allclose(result[2], expected[2], rtol=1e-12)
+
+
+def test_reopen_from_index(csv_store):
+    reopened = PatientStore(csv_store.path)
+    assert reopened.pIDs == csv_store.pIDs and len(reopened) == len(csv_store)
+    assert reopened.index == csv_store.index and reopened.nbytes == csv_store.nbytes
+    assert 541 in reopened and 999 not in reopened
+    for pID in csv_store.pIDs:
+        pdt.assert_frame_equal(reopened.read_partition(pID), csv_store.read_partition(pID))
+
+
+def test_memory_budget(csv_store):
+    largest = max(entry['nbytes'] for entry in csv_store.index.values())
+    store = PatientStore(csv_store.path, memory_budget=largest - 1)
+    with pytest.raises(MemoryError):
+        list(store.iter_partitions())
+    assert store.max_parallel() == 1
+
+    store = PatientStore(csv_store.path, memory_budget=2 * largest)
+    assert len(list(store.iter_partitions())) == len(csv_store)
+    assert store.max_parallel() == 2
+    assert PatientStore(csv_store.path).max_parallel() == len(csv_store)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from src.dataset.parse_dataset import prepare_data
+from src.dataset.schema import compact_dtypes
+from src.dataset.store import PatientStore
+from src.dataset.transforms import MAX_SCALES, AffineTransform, MaxScale, ZScore
+
+
+@pytest.fixture
+def frame(glucose_frame):
+    return compact_dtypes(glucose_frame)
+
+
+def _write_replace_raw(root):
+    """A two-patient Replace_BG export in the pipe-separated layout read by iter_REPLACE_data."""
+    rng = np.random.default_rng(5)
+    cgm, bgm, bolus, wizard = [], [], [], []
+    for pID in (1, 2):
+        for k in range(60):
+            minutes = 8 * 60 + 5 * k
+            cgm.append([pID, 1, f'{minutes // 60:02d}:{minutes % 60:02d}:00', 'CGM', int(rng.integers(60, 300))])
+        bgm.append([pID, 1, '09:00:00', 'BGM', 143])
+        bolus.append([pID, 1, '09:30:00', 2.5 * pID])
+        wizard.append([pID, 1, '09:30:00', 45])
+    columns = ['PtID', 'DeviceDtTmDaysFromEnroll', 'DeviceTm']
+    pd.DataFrame(cgm, columns=columns + ['RecordType', 'GlucoseValue']).to_csv(root / 'HDeviceCGM.csv', sep='|', index=False)
+    pd.DataFrame(bgm, columns=columns + ['RecordType', 'GlucoseValue']).to_csv(root / 'HDeviceBGM.txt', sep='|', index=False)
+    pd.DataFrame(bolus, columns=columns + ['Normal']).to_csv(root / 'HDeviceBolus.txt', sep='|', index=False)
+    pd.DataFrame(wizard, columns=['PtId', 'DeviceDtTmDaysFromEnroll', 'DeviceTm', 'CarbInput']) \
+        .to_csv(root / 'HDeviceWizard.txt', sep='|', index=False)
+
+
+def test_affine_transform_is_abstract():
+    with pytest.raises(TypeError):
+        AffineTransform()
+
+
+def test_max_scale():
+    transform = MaxScale()
+    assert transform.columns == tuple(MAX_SCALES)
+    values = np.array([[200., 40., 7.], [100., 0., 3.5]], dtype=np.float32)
+    scaled = transform.apply(values, ['CGM', 'CRB', 'INS'])
+    assert scaled.dtype == np.float32
+    np.testing.assert_allclose(scaled, values / [400, 400, 35])
+    np.testing.assert_allclose(transform.invert(scaled, ['CGM', 'CRB', 'INS']), values, rtol=1e-6)
+    # Columns without parameters are left unchanged
+    np.testing.assert_array_equal(transform.apply(values, ['CGM', 'sleep', 'INS'])[:, 1], values[:, 1])
+
+
+@pytest.mark.parametrize('per_patient', [True, False])
+def test_zscore_fit(frame, per_patient):
+    transform = ZScore(columns=('CGM', 'INS'), per_patient=per_patient).fit(frame)
+    groups = frame.groupby('pID') if per_patient else [(None, frame)]
+    for pID, df in groups:
+        params = transform.params(pID)
+        for column in ('CGM', 'INS'):
+            values = df[column].to_numpy(dtype=float)
+            mean, std = params[column]
+            assert mean == pytest.approx(np.nanmean(values), rel=1e-9)
+            assert std == pytest.approx(np.nanstd(values), rel=1e-6)
+
+
+def test_zscore_constant_column_is_only_centred():
+    df = pd.DataFrame({'pID': [1, 1, 1], 'CGM': [120., 120., np.nan], 'BGM': [np.nan] * 3})
+    transform = ZScore().fit(df)
+    assert transform.params(1) == {'CGM': (120, 1), 'BGM': (0, 1)}
+
+
+@pytest.mark.parametrize('transform', [MaxScale(), ZScore(columns=('CGM', 'BGM', 'INS'))])
+def test_transform_frame_round_trip(frame, transform):
+    transform.fit(frame)
+    scaled = transform.transform_frame(frame)
+    assert list(scaled.dtypes) == list(frame.dtypes)
+    pdt.assert_frame_equal(transform.transform_frame(scaled, inverse=True), frame, rtol=1e-5, atol=1e-4)
+
+    # apply on one patient's array gives the rows transform_frame gives
+    columns = list(transform.columns)
+    df = frame[frame['pID'] == 541]
+    values = df[columns].to_numpy(dtype=np.float32)
+    np.testing.assert_allclose(transform.apply(values, columns, 541), scaled.loc[df.index, columns].to_numpy(),
+                               rtol=1e-6)
+    np.testing.assert_allclose(transform.invert(transform.apply(values, columns, 541), columns, 541), values,
+                               rtol=1e-5, atol=1e-4)
+
+
+def test_zscore_fit_on_a_store(frame, tmp_path):
+    store = PatientStore.from_frames((df for _, df in frame.groupby('pID')), str(tmp_path / 'store'))
+    for per_patient in (True, False):
+        columns = ('CGM', 'BGM', 'CRB')
+        expected = ZScore(columns, per_patient).fit(frame).stats
+        result = ZScore(columns, per_patient).fit(store).stats
+        assert result.keys() == expected.keys()
+        for key in expected:
+            for column in columns:
+                np.testing.assert_allclose(result[key][column], expected[key][column], rtol=1e-12)
+
+
+def test_prepare_data_scales_as_before(tmp_path):
+    root = tmp_path / 'datasets' / 'Replace_BG' / 'raw'
+    root.mkdir(parents=True)
+    _write_replace_raw(root)
+    path = str(root) + '/'
+
+    raw = prepare_data(path, [1, 2], viz=True)
+    scaled = prepare_data(path, [1, 2], viz=False)
+    # The division prepare_data did before the transforms existed, on the unscaled values
+    old = raw.astype({c: float for c in ['CGM', 'BGM', 'CRB', 'INS']})
+    for column, scale in {'CGM': 400, 'BGM': 400, 'CRB': 400, 'INS': 35}.items():
+        old[column] = old[column] / scale
+    pdt.assert_frame_equal(scaled, compact_dtypes(old))
+    assert scaled['CRB'].max() == np.float32(45 / 400) and scaled['INS'].max() == np.float32(5 / 35)
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dataset.windows import FEATURES, get_window_index, get_windows, write_window_arrays
+
+
+def _scan_windows(array, history, horizon, target, stride):
+    """Reference: check every candidate start for a missing target reading."""
+    length = history + horizon
+    return np.array([start for start in range(0, len(array) - length + 1, stride)
+                     if not np.isnan(array[start:start + length, target]).any()], dtype=np.int64)
+
+
+@pytest.fixture
+def arrays(glucose_frame, tmp_path):
+    meta = write_window_arrays(glucose_frame, str(tmp_path))
+    return meta, {pID: np.load(tmp_path / f'{pID}.npy', mmap_mode='r') for pID in meta['pIDs']}
+
+
+def test_write_window_arrays(glucose_frame, tmp_path, arrays):
+    meta, grids = arrays
+    assert meta == {'pIDs': [540, 541, 542], 'features': FEATURES, 'target': 'CGM', 'res': 5}
+    with open(tmp_path / 'meta.json') as f:
+        assert json.load(f) == meta
+    for pID, df in glucose_frame.groupby('pID'):
+        grid = grids[pID]
+        steps = ((df['Time'] - df['Time'].min()) / pd.Timedelta(minutes=5)).round().astype(int).values
+        assert grid.dtype == np.float32 and grid.shape == (steps.max() + 1, len(FEATURES))
+        np.testing.assert_array_equal(grid[steps, 0], df['CGM'].values.astype(np.float32))
+        np.testing.assert_array_equal(grid[steps, 1:], df[['CRB', 'INS']].fillna(0).values.astype(np.float32))
+        # Steps without a row (the synthetic gap) are missing in every feature
+        missing = np.setdiff1d(np.arange(len(grid)), steps)
+        assert np.isnan(grid[missing]).all()
+
+
+@pytest.mark.parametrize('history, horizon, stride', [(12, 6, 1), (6, 1, 3), (48, 12, 7), (1, 1, 1)])
+def test_window_index_matches_a_scan(arrays, history, horizon, stride):
+    _, grids = arrays
+    for grid in grids.values():
+        np.testing.assert_array_equal(get_window_index(grid, history, horizon, 0, stride),
+                                      _scan_windows(grid, history, horizon, 0, stride))
+
+
+def test_window_index_short_array():
+    array = np.ones((5, 3), dtype=np.float32)
+    assert len(get_window_index(array, 4, 2)) == 0
+    np.testing.assert_array_equal(get_window_index(array, 3, 2), [0])
+
+
+def test_get_windows_matches_slicing(arrays):
+    _, grids = arrays
+    grid = grids[541]
+    starts = get_window_index(grid, 12, 6)[::37]
+    windows = get_windows(grid, starts, 18)
+    assert windows.shape == (len(starts), 18, len(FEATURES)) and windows.dtype == np.float32
+    for window, start in zip(windows, starts):
+        np.testing.assert_array_equal(window, grid[start:start + 18])